@@ -333,7 +333,7 @@ _lazy_import('callable', ['Callable', 'WeakCallable'])
 # Async programming classes, namely InProgress
 _lazy_import('async', [
     'InProgress', 'InProgressCallable', 'InProgressAny', 'InProgressAll',
-    'InProgressStatus', 'inprogress',
+    'InProgressStatus', 'inprogress', 'finished', 'as_completed',
     # Constants for InProgressAny/All finish argument.
     'FINISH_IDX', 'FINISH_RESULT', 'FINISH_SELF', 'FINISH_IDX_RESULT'
 ])
@@ -361,7 +361,8 @@ _lazy_import('event', ['Event', 'EventHandler', 'WeakEventHandler'])
 
 # coroutine decorator and helper classes
 _lazy_import('coroutine', [
-    'NotFinished', 'coroutine', 'CoroutineInProgress',
+    'NotFinished', 'coroutine', 'CoroutineInProgress', 'CoroutineScheduler',
+    'enable_coroutine_stats', 'get_coroutine_stats',
     # Constants for coroutine() policy argument
     'POLICY_SYNCHRONIZED', 'POLICY_SINGLETON', 'POLICY_PASS_LAST'
 ])
@@ -371,6 +372,10 @@ _lazy_import('generator', ['Generator', 'generator'])
 
 # process management
 _lazy_import('process', ['Process'])
+_lazy_import('processpool', [
+    'ProcessPool', 'ProcessInProgress', 'processed', 'register_process_pool',
+    'get_process_pool'
+])
 
 # special gobject thread support
 _lazy_import('gobject', ['GOBJECT', 'gobject_set_threaded'])
@@ -26,7 +26,8 @@ from __future__ import absolute_import
 
 __all__ = [
     'InProgress', 'InProgressCallable', 'InProgressAny', 'InProgressAll', 'inprogress',
-    'InProgressStatus', 'FINISH_RESULT', 'FINISH_SELF', 'FINISH_IDX_RESULT'
+    'InProgressStatus', 'FINISH_RESULT', 'FINISH_SELF', 'FINISH_IDX_RESULT', 'finished',
+    'as_completed'
 ]
 
 # python imports
@@ -37,6 +38,7 @@ import time
 import _weakref
 import threading
 import types
+import collections
 
 # kaa.base imports
 from .errors import AsyncException, AsyncExceptionBase, InProgressAborted, TimeoutException
@@ -208,6 +210,18 @@ class InProgress(Signal, Object):
     # optimization, saving about 7% of total instance creation time.  See
     # _finished_event_poke() for more details.
     _finished_event_lock = threading.Lock()
+    # Similarly, the exception signal and the signals attribute (holding the
+    # abort signal) are only created when first accessed, as most InProgress
+    # objects never use them.  This class-wide lock protects their creation.
+    _lazy_signals_lock = threading.Lock()
+    _kaasignals_lazy = True
+
+    # Most InProgress objects are short-lived, and many are created, so
+    # avoid the instance dict.  Subclasses without __slots__ have one as
+    # usual.
+    __slots__ = ('_exception_signal', '_signals', '_finished', '_finished_event', '_exception',
+                 '_unhandled_exception', '_result', '_abortable', '_stack', '_name', 'progress',
+                 '_waiters')
 
     def __init__(self, abortable=None, frame=0):
         """
@@ -215,11 +229,14 @@ class InProgress(Signal, Object):
         :type abortable: bool
         """
         super(InProgress, self).__init__()
-        self._exception_signal = Signal()
+        self._exception_signal = None
+        self._signals = None
         self._finished = False
         self._finished_event = None
         self._exception = None
         self._unhandled_exception = None
+        # Internal callbacks invoked once we are finished; see _add_waiter()
+        self._waiters = None
         # TODO: make progress a property so we can document it.
         self.progress = None
         # True: always abortable, False: never abortable, None: abortable if
@@ -258,6 +275,15 @@ class InProgress(Signal, Object):
         """
         return self
 
+
+    def __await__(self):
+        """
+        Allows asyncio coroutines to await InProgress objects (Python 3 only).
+        See :func:`kaa.asyncio.to_future`.
+        """
+        from .asyncio import to_future
+        return to_future(self).__await__()
+
     @property
     def exception(self):
         """
@@ -267,9 +293,42 @@ class InProgress(Signal, Object):
         Callbacks connected to this signal receive three arguments: exception class,
         exception instance, traceback.
         """
+        if self._exception_signal is None:
+            with self._lazy_signals_lock:
+                if self._exception_signal is None:
+                    self._exception_signal = Signal()
         return self._exception_signal
 
 
+    @property
+    def signals(self):
+        """
+        :class:`~kaa.Signals` object holding the signals listed below.  It is
+        created when first accessed.
+        """
+        if self._signals is None:
+            with self._lazy_signals_lock:
+                if self._signals is None:
+                    self._signals = self._create_signals()
+        return self._signals
+
+
+    @signals.setter
+    def signals(self, signals):
+        self._signals = signals
+
+
+    def _cleanup_signals(self):
+        """
+        Disconnects all callbacks once the InProgress is finished.
+        """
+        self.disconnect_all()
+        if self._exception_signal is not None:
+            self._exception_signal.disconnect_all()
+        if self._signals is not None:
+            self._signals['abort'].disconnect_all()
+
+
     @property
     def finished(self):
         """
@@ -287,13 +346,7 @@ class InProgress(Signal, Object):
         if not self._finished:
             raise RuntimeError('operation not finished')
         if self._exception:
-            # _unhandled_exception could be True if the InProgress exception
-            # is being handled synchronously (via the exception callback).  So
-            # check that it's actually a weakref instance before trying to
-            # remove it from the global unhandled exceptions set.
-            if isinstance(self._unhandled_exception, _weakref.ref):
-                _unhandled_exceptions.remove(self._unhandled_exception)
-                self._unhandled_exception = None
+            self._exception_handled()
             if self._exception[2]:
                 # We have the traceback, so we can raise using it.
                 exc_type, exc_value, exc_tb_or_stack = self._exception
@@ -306,6 +359,20 @@ class InProgress(Signal, Object):
         return self._result
 
 
+    def _exception_handled(self):
+        """
+        Marks the exception thrown to the InProgress as handled, so it won't
+        be logged.
+        """
+        # _unhandled_exception could be True if the InProgress exception
+        # is being handled synchronously (via the exception callback).  So
+        # check that it's actually a weakref instance before trying to
+        # remove it from the global unhandled exceptions set.
+        if isinstance(self._unhandled_exception, _weakref.ref):
+            _unhandled_exceptions.discard(self._unhandled_exception)
+        self._unhandled_exception = None
+
+
     @property
     def failed(self):
         """
@@ -335,7 +402,9 @@ class InProgress(Signal, Object):
         This is useful when constructing an InProgress object that corresponds
         to an asynchronous task that can be safely aborted with no explicit action.
         """
-        return self._abortable or (self._abortable is None and self.signals['abort'].count() > 0)
+        if self._abortable is None:
+            return self._signals is not None and self._signals['abort'].count() > 0
+        return self._abortable
 
 
     @abortable.setter
@@ -405,10 +474,9 @@ class InProgress(Signal, Object):
 
         # emit signal
         self.emit_when_handled(result)
-        # cleanup
-        self.disconnect_all()
-        self._exception_signal.disconnect_all()
-        self.signals['abort'].disconnect_all()
+        self._cleanup_signals()
+        if self._waiters is not None:
+            self._notify_waiters()
         return self
 
 
@@ -476,13 +544,14 @@ class InProgress(Signal, Object):
         # get the live traceback.
         self._finished_event_poke(set=True)
 
-        if self._exception_signal.count() == 0:
+        exception_signal = self.exception
+        if exception_signal.count() == 0:
             # There are no exception handlers, so we know we will end up
             # queuing the traceback in the exception signal.  Set it to None
             # to prevent that.
             tb = None
 
-        if self._exception_signal.emit_when_handled(type, value, tb) == False:
+        if exception_signal.emit_when_handled(type, value, tb) == False:
             # A handler has acknowledged handling this exception by returning
             # False.  So we won't log it.
             self._unhandled_exception = None
@@ -492,9 +561,10 @@ class InProgress(Signal, Object):
         # emit the abort signal and clear _unhandled_exception, provided there
         # are callbacks connected to the abort signal.  Otherwise, do not
         # clear _unhandled_exception so that it gets logged.
-        if isinstance(value, InProgressAborted) and len(self.signals['abort']):
+        if isinstance(value, InProgressAborted) and self._signals is not None and \
+           len(self._signals['abort']):
             if not aborted:
-                self.signals['abort'].emit(value)
+                self._signals['abort'].emit(value)
             self._unhandled_exception = None
 
         if self._unhandled_exception:
@@ -511,6 +581,11 @@ class InProgress(Signal, Object):
             self._unhandled_exception = _weakref.ref(self, cb)
             _unhandled_exceptions.add(self._unhandled_exception)
 
+        # Waiters get to see the exception as thrown, traceback included,
+        # just like the callbacks connected to the exception signal.
+        if self._waiters is not None:
+            self._notify_waiters()
+
         # Remove traceback from stored exception.  If any waiting threads
         # haven't gotten it by now, it's too late.
         if not isinstance(value, AsyncExceptionBase):
@@ -520,10 +595,7 @@ class InProgress(Signal, Object):
             value = value.with_traceback(None)
         self._exception = value.__class__, value, None
 
-        # cleanup
-        self.disconnect_all()
-        self._exception_signal.disconnect_all()
-        self.signals['abort'].disconnect_all()
+        self._cleanup_signals()
 
         # We return False here so that if we've received a thrown exception
         # from another InProgress we're waiting on, we essentially inherit
@@ -532,6 +604,51 @@ class InProgress(Signal, Object):
         # nobody handled it and would dump out an unhandled async exception.)
         return False
 
+    def _add_waiter(self, callback):
+        """
+        Adds a callback which is invoked with the InProgress as its only
+        argument once it is finished, either by finish() or throw(), after
+        the connected callbacks.  If the InProgress is already finished, the
+        callback is invoked immediately.
+
+        Unlike connecting to both the InProgress and its exception signal,
+        this neither creates Callable objects nor the exception signal, which
+        matters for InProgressAny and friends waiting on many InProgress
+        objects.  Waiters do not count as handling an exception.
+
+        Waiters notified by throw() find the exception as it was thrown in
+        _exception, which only holds the traceback-less AsyncException once
+        they have returned.
+        """
+        if self._finished:
+            callback(self)
+        elif self._waiters is None:
+            self._waiters = [callback]
+        else:
+            self._waiters.append(callback)
+
+
+    def _remove_waiter(self, callback):
+        """
+        Removes a callback added with _add_waiter().  Returns False if the
+        callback was not waiting (any more), and True otherwise.
+        """
+        try:
+            self._waiters.remove(callback)
+        except (AttributeError, ValueError):
+            return False
+        return True
+
+
+    def _notify_waiters(self):
+        waiters, self._waiters = self._waiters, None
+        for callback in waiters:
+            try:
+                callback(self)
+            except Exception:
+                log.exception('Exception while notifying InProgress waiter')
+
+
     @classmethod
     def _log_exception(cls, weakref, trace, exc, create_stack):
         """
@@ -588,7 +705,8 @@ class InProgress(Signal, Object):
         elif not isinstance(exc, InProgressAborted):
             raise ValueError('Exception must be instance of InProgressAborted (or subclass thereof)')
 
-        if not self.abortable or self.signals['abort'].emit(exc) == False:
+        if not self.abortable or \
+           (self._signals is not None and self._signals['abort'].emit(exc) == False):
             raise RuntimeError('%s cannot be aborted.' % self)
 
         if exc.inprogress != self:
@@ -648,7 +766,7 @@ class InProgress(Signal, Object):
         async = InProgress()
         def trigger():
             self.disconnect(async.finish)
-            self._exception_signal.disconnect(async.throw)
+            self.exception.disconnect(async.throw)
             if not async._finished:
                 if callback:
                     callback()
@@ -678,7 +796,7 @@ class InProgress(Signal, Object):
         # cleanup, and if abort=True then abort self.
         def handle_abort(exc):
             self.disconnect(async.finish)
-            self._exception_signal.disconnect(async.throw)
+            self.exception.disconnect(async.throw)
             timer.stop()
             if abort and not self.finished:
                 self.abort(exc)
@@ -818,7 +936,74 @@ class InProgress(Signal, Object):
         if exception is None:
             exception = finished
         self.connect(finished)
-        self._exception_signal.connect_once(exception)
+        self.exception.connect_once(exception)
+
+
+
+class _FinishedInProgress(InProgress):
+    """
+    An InProgress that is finished from the start, as returned by
+    :func:`kaa.finished`.
+
+    Because instances may be shared, callbacks are never stored: callbacks
+    connected to the InProgress are invoked immediately with the result, and
+    callbacks connected to the exception signal are discarded.
+    """
+    __slots__ = ()
+
+    def __init__(self, result):
+        super(_FinishedInProgress, self).__init__()
+        self._result = result
+        self._finished = True
+
+
+    @property
+    def exception(self):
+        # A new Signal each time, as it will never be emitted.
+        return Signal()
+
+
+    def _connect(self, callback, args = (), kwargs = {}, once = False,
+                 weak = False, pos = -1):
+        if not callable(callback):
+            raise TypeError('callback must be callable, got %s instead.' % callback)
+        callback = Callable(callback, *args, **kwargs)
+        try:
+            callback(self._result)
+        except Exception:
+            log.exception('Exception while emitting signal')
+        return callback
+
+
+# Shared finished InProgress objects for the most common results.
+_finished_none = _FinishedInProgress(None)
+_finished_true = _FinishedInProgress(True)
+_finished_false = _FinishedInProgress(False)
+
+
+def finished(result=None):
+    """
+    Returns an InProgress that is already finished with the given result.
+
+    :param result: the result of the InProgress
+    :return: a finished :class:`~kaa.InProgress`, or *result* itself if it is
+             an InProgress
+
+    This is a cheaper alternative to ``InProgress().finish(result)`` for
+    functions that must return an InProgress but have the result at hand.
+    For None, True and False, the same InProgress object is returned every
+    time, so the returned object must not be modified.  Callbacks connected to
+    it are invoked immediately, and it cannot be aborted.
+    """
+    if result is None:
+        return _finished_none
+    elif result is True:
+        return _finished_true
+    elif result is False:
+        return _finished_false
+    elif isinstance(result, InProgress):
+        return result
+    return _FinishedInProgress(result)
 
 
 
@@ -903,7 +1088,8 @@ class InProgressAny(InProgress):
        Callbacks aren't attached to the supplied InProgress objects to monitor
        their state until a callback is attached to the InProgressAny object.
        This means an InProgressAny with nothing connected will not actually
-       finish even when one of its constituent InProgresses finishes.
+       finish even when one of its constituent InProgresses finishes.  This
+       does not apply if *limit* is given.
 
     :param finish: controls what values the InProgressAny is finished with
     :type finish: ``FINISH_IDX_RESULT`` (default), ``FINISH_IDX``, or
@@ -914,6 +1100,10 @@ class InProgressAny(InProgress):
         InProgressAny iff there are other InProgress objects that could
         yet finish.
     :type filter: callable
+    :param limit: if given, at most this many of the supplied InProgress
+        objects are unfinished at any time, as explained for
+        :class:`~kaa.InProgressAll`.
+    :type limit: int
 
     The possible ``finish`` values are:
 
@@ -942,6 +1132,7 @@ class InProgressAny(InProgress):
     def __init__(self, *objects, **kwargs):
         self._finish_args = kwargs.pop('finish', None) or self._default_finish_args
         self._filter = kwargs.pop('filter', None)
+        self._limit = kwargs.pop('limit', None)
 
         if 'pass_index' in kwargs:
             # Legacy behaviour.
@@ -950,15 +1141,45 @@ class InProgressAny(InProgress):
 
         if self._finish_args not in (FINISH_RESULT, FINISH_SELF, FINISH_IDX_RESULT, FINISH_IDX):
             raise ValueError('invalid finish kwarg')
+        if self._limit is not None and self._limit < 1:
+            raise ValueError('limit must be at least 1')
 
         super(InProgressAny, self).__init__(**kwargs)
+        # Number of underlying InProgress objects that have not yet finished.
+        self._counter = 0
+        # True while we are waiting on the underlying InProgress objects.
+        self._monitoring = False
+        self._filling = False
+        # The most recent InProgress whose result was filtered, and the
+        # exception it was thrown, if any.
+        self._last = None
+
+        if self._limit:
+            # The underlying InProgress objects are taken from the given
+            # iterables as the earlier ones finish, so we wait on them
+            # regardless of anyone waiting on us.
+            self._source = self._flatten(objects)
+            self._objects = self._pending = []
+            self._monitoring = True
+            self._fill()
+            return
+
         # Generate InProgress objects for anything that was passed, including
         # InProgress objects nested within sequences and generators.
+        self._source = None
         self._objects = [inprogress(o) for o in self._flatten(objects)]
-        self._counter = len(self._objects) or 1
-
-        self._prefinished_visited = set()
-        self._check_prefinished()
+        self._counter = len(self._objects)
+        # The InProgress objects we will wait on once someone waits on us.
+        # Those already finished may finish us immediately.
+        self._pending = [ip for ip in self._objects if not ip._finished]
+        if len(self._pending) < self._counter:
+            for ip in self._objects:
+                if ip._finished:
+                    self._child_finished(ip)
+                    if self._finished:
+                        return
+        if self._counter == 0:
+            self._exhausted()
 
 
     def _flatten(self, v):
@@ -967,94 +1188,141 @@ class InProgressAny(InProgress):
             v = v.values()
         if isinstance(v, (list, tuple, types.GeneratorType)):
             for item in iter(v):
+                if isinstance(item, InProgress):
+                    yield item
+                    continue
                 for sub in self._flatten(item):
                     yield sub
         else:
             yield v
 
 
-    def _get_connect_args(self, ip, n):
+    def _start_monitoring(self):
         """
-        Called for each InProgress we connect to, and returns arguments to be
-        passed to self.finish if that InProgress finishes.
+        Starts waiting on the underlying InProgress objects.  This happens once
+        someone waits on us.
         """
-        return (n,)
+        if self._monitoring or self._finished:
+            return
+        self._monitoring = True
+        callback = self._child_finished
+        for ip in self._pending:
+            # If ip has finished in the meantime, this calls back immediately.
+            ip._add_waiter(callback)
+            if self._finished:
+                break
 
 
-    def _check_prefinished(self):
+    def _stop_monitoring(self):
         """
-        Determine if any of the given IP objects were passed to us already finished,
-        which may in turn finish us immediately.
+        Stops waiting on the underlying InProgress objects.
         """
-        prefinished = []
-        for n, ip in enumerate(self._objects):
-            if ip.finished and id(ip) not in self._prefinished_visited:
-                prefinished.append(n)
-                self._prefinished_visited.add(id(ip))
-        self._finalize_prefinished(prefinished)
+        if not self._monitoring:
+            return
+        self._monitoring = False
+        callback = self._child_finished
+        # Keep those still unfinished, as we need to wait on them again if
+        # someone waits on us again.
+        self._pending = [ip for ip in self._pending if ip._remove_waiter(callback)]
 
 
-    def _finalize_prefinished(self, prefinished):
+    def _fill(self):
         """
-        Called from _check_prefinished.  prefinished is a list of indexes
-        (relative to self._objects) that were already finished when we tried to
-        connect to them.
-
-        This logic is done in a separate method (instead of in _check_prefinished)
-        so that subclasses can override this behaviour (without duplicating the
-        common code in _check_prefinished).
+        With a limit, takes InProgress objects from the given iterables until
+        as many as allowed by the limit are unfinished.
         """
-        if not prefinished:
+        if self._filling or self._source is None:
             return
-
-        # One or more IP was already finished.  We pass each one to
-        # self.finish until we're actually finished (because the prefinished
-        # IP may get filtered).
-        while not self.finished and prefinished:
-            idx = prefinished.pop(0)
-            ip = self._objects[idx]
-            if ip.failed:
-                self.finish(True, idx, ip._exception)
-            else:
-                self.finish(False, idx, ip.result)
+        self._filling = True
+        try:
+            callback = self._child_finished
+            while self._counter < self._limit and not self._finished:
+                try:
+                    ip = inprogress(next(self._source))
+                except StopIteration:
+                    self._source = None
+                    break
+                except Exception:
+                    # The iterable is broken, so we are, too.
+                    self._source = None
+                    self._stop_monitoring()
+                    self.throw(*sys.exc_info())
+                    return
+                self._objects.append(ip)
+                self._counter += 1
+                # If ip is finished already, this calls back immediately.
+                # Nested calls to _fill() return immediately, and we
+                # continue here instead.
+                ip._add_waiter(callback)
+        finally:
+            self._filling = False
+        if self._source is None and self._counter == 0 and not self._finished:
+            self._exhausted()
 
 
     def _changed(self, action):
         """
         Called when a callback connects or disconnects from us.
         """
-        if not self._objects:
-            # Already finished.  This can happen when IPAny finishes, and
-            # then wait() is called on it.  One possible normal scenario for
-            # this is when wait() is called in another thread.  If the IP is
-            # finished by the mainthread before wait() is called, then we
-            # don't want to attempt to iterate over _objects, which was set
-            # to None in finish().
-            return super(InProgressAny, self)._changed(action)
-
-        if len(self) == 1 and action == Signal.CONNECTED and not self.finished:
-            # Someone wants to know when we finish, so now we connect to the
+        if action == Signal.CONNECTED and len(self) == 1:
+            # Someone wants to know when we finish, so now we wait on the
             # underlying InProgress objects to find out when they finish.
-            self._check_prefinished()
-            # _check_prefinished() could have implicitly called finish(),
-            # setting self._objects to None.
-            if self._objects:
-                for n, ip in enumerate(self._objects):
-                    if ip.finished:
-                        # This one is finished already, no need to connect to it.
-                        continue
-                    args = self._get_connect_args(ip, n)
-                    ip.connect(self.finish, False, *args).init_args_first = True
-                    ip.exception.connect(self.finish, True, *args).init_args_first = True
-
-        elif len(self) == 0 and action == Signal.DISCONNECTED:
-            for ip in self._objects:
-                ip.disconnect(self.finish)
-                ip.exception.disconnect(self.finish)
-
+            self._start_monitoring()
+        elif action == Signal.DISCONNECTED and len(self) == 0 and not self._waiters and not self._limit:
+            self._stop_monitoring()
         return super(InProgressAny, self)._changed(action)
 
 
+    def _add_waiter(self, callback):
+        super(InProgressAny, self)._add_waiter(callback)
+        self._start_monitoring()
+
+
+    def _remove_waiter(self, callback):
+        removed = super(InProgressAny, self)._remove_waiter(callback)
+        if removed and len(self) == 0 and not self._waiters and not self._limit:
+            self._stop_monitoring()
+        return removed
+
+
+    def _child_finished(self, ip):
+        """
+        Called when one of the underlying InProgress objects has finished.
+        """
+        if self._finished:
+            return
+        self._counter -= 1
+        # Keep the exception as thrown (see _add_waiter()), not what ip
+        # holds on to once we return.
+        exc_info = ip._exception
+        if self._filter and self._filter(exc_info if exc_info else ip._result):
+            # Result is filtered, so we'll wait for the other InProgress
+            # candidates, if there are any.
+            self._last = ip, exc_info
+            self._fill()
+            if self._finished or self._counter > 0 or self._source is not None:
+                return
+        self._finish_with(ip, exc_info)
+
+
+    def _exhausted(self):
+        """
+        Called when all underlying InProgress objects have finished without
+        finishing us.
+        """
+        if self._last is not None:
+            self._finish_with(*self._last)
+
+
+    def _finish_with(self, ip, exc_info):
+        # The index is only needed once, so a linear search is fine.
+        index = next(n for n, o in enumerate(self._objects) if o is ip)
+        if exc_info:
+            self.finish(True, index, *exc_info)
+        else:
+            self.finish(False, index, ip._result)
+
+
     def finish(self, is_exception, index, *result):
         """
         Invoked when any one of the InProgress objects passed to the
@@ -1063,12 +1331,6 @@ class InProgressAny(InProgress):
         # FIXME: rethink how we handle prerequisites that finish
         # by exception.  Should we throw too?
         result = result[0] if not is_exception else result
-        self._counter -= 1
-        if self._filter and self._filter(result) and self._counter > 0:
-            # Result is filtered and there are other InProgress candidates,
-            # so we'll wait for them.
-            return
-
         if self._finish_args == FINISH_IDX_RESULT:
             finish_result = index, result
         elif self._finish_args == FINISH_RESULT:
@@ -1080,16 +1342,18 @@ class InProgressAny(InProgress):
             # but included for completeness.
             finish_result = self
 
-        # We're done with the underlying IP objects so unref them.  In the
-        # case of InProgressCallable connected weakly to signals (which
-        # happens when signals are given to us on the constructor), they'll
-        # get deleted and disconnected from the signals.
+        # We're done with the underlying IP objects, so stop waiting on those
+        # that are still unfinished and unref them.  In the case of
+        # InProgressCallable connected weakly to signals (which happens when
+        # signals are given to us on the constructor), they'll get deleted and
+        # disconnected from the signals.
         #
         # Small nicety: if we clear out _objects before calling
         # InProgress.finish() then we force the disconnection of
         # inprogress()ed Signal objects before (potentially) resuming any
         # coroutine that yielded this InProgressAny.
-        self._objects = None
+        self._stop_monitoring()
+        self._objects = self._pending = self._source = self._last = None
 
         super(InProgressAny, self).finish(finish_result)
 
@@ -1106,35 +1370,39 @@ class InProgressAll(InProgressAny):
 
         for ip in (yield kaa.InProgressAll(sock1.read(), sock2.read())):
             print(ip.result)
+
+    With the *limit* keyword argument, at most that many of the supplied
+    InProgress objects are unfinished at any time.  For this to be useful,
+    they must be supplied by an iterable which starts the asynchronous
+    tasks lazily, such as a generator expression::
+
+        # Fetch all pages, but at most 10 at a time.
+        yield kaa.InProgressAll((fetch(url) for url in urls), limit=10)
+
+    The next object is taken from the iterable whenever an earlier one
+    finishes, regardless of anyone waiting on the InProgressAll.  Iterating or
+    indexing the InProgressAll gives the InProgress objects taken so far.
     """
     _default_finish_args = FINISH_SELF
 
-    def _get_connect_args(self, ip, n):
-        return ()
+    def _child_finished(self, ip):
+        if self._finished:
+            return
+        self._counter -= 1
+        if self._source is not None:
+            # Start the next one(s), finishing us if there are no more.
+            self._fill()
+        elif self._counter == 0:
+            self.finish(False)
 
 
-    def _finalize_prefinished(self, prefinished):
-        if len(prefinished) == len(self._objects):
-            # All underlying InProgress objects are already finished so we're
-            # done.  Prime counter to 1 to force finish() to actually finish
-            # when we call it next.
-            self._counter = 1
-            self.finish(False, None)
-        elif len(prefinished):
-            # Some underlying InProgress objects are already finished so we
-            # need to subtract them from the number of objects we are still
-            # waiting for.
-            self._counter -= len(prefinished)
+    def _exhausted(self):
+        self.finish(False)
 
 
     def finish(self, is_exception, *result):
         # FIXME: rethink how we handle prerequisites that finish
         # by exception.  Should we throw too?
-        self._counter -= 1
-        if self._counter > 0:
-            # Still more prerequisites to finish before we can finish.
-            return
-
         if self._finish_args == FINISH_SELF:
             finish_result = self
         else:
@@ -1148,6 +1416,8 @@ class InProgressAll(InProgressAny):
                 # Hardly useful, but added for completeness.
                 finish_result = [idx for idx, result in all_results]
 
+        self._monitoring = False
+        self._pending = None
         # Note that this calls InProgress.finish(), not InProgressAny.finish().
         super(InProgressAny, self).finish(finish_result)
         # Unlike InProgressAny, we don't unref _objects because the caller
@@ -1164,3 +1434,90 @@ class InProgressAll(InProgressAny):
 
     def __getitem__(self, idx):
         return self._objects[idx]
+
+
+
+class _InProgressCompleted(InProgressAll):
+    """
+    InProgressAll that additionally hands out the underlying InProgress
+    objects in the order they finish, for as_completed().
+    """
+    def __init__(self, *objects, **kwargs):
+        # Underlying InProgress objects finished before being asked for
+        self._done = collections.deque()
+        # InProgress objects handed out, waiting for the next finished one
+        self._slots = collections.deque()
+        super(_InProgressCompleted, self).__init__(*objects, **kwargs)
+        self._start_monitoring()
+
+
+    def _child_finished(self, ip):
+        if self._slots:
+            self._forward(ip, self._slots.popleft())
+        else:
+            self._done.append(ip)
+        super(_InProgressCompleted, self)._child_finished(ip)
+
+
+    def _forward(self, ip, slot):
+        if ip._exception:
+            # Handling the exception is now up to whoever waits on slot.
+            ip._exception_handled()
+            slot.throw(*ip._exception)
+        else:
+            slot.finish(ip._result)
+
+
+    def __iter__(self):
+        n = 0
+        while True:
+            if n == len(self._objects):
+                if self._source is None:
+                    return
+                raise RuntimeError('as_completed() with a limit must not be advanced before '
+                                   'the previous InProgress has finished')
+            n += 1
+            if self._done and not self._done[0]._exception:
+                yield finished(self._done.popleft()._result)
+                continue
+            slot = InProgress()
+            if self._done:
+                self._forward(self._done.popleft(), slot)
+            else:
+                self._slots.append(slot)
+            yield slot
+
+
+
+def as_completed(*objects, **kwargs):
+    """
+    Iterates over the given InProgress objects in the order they finish.
+
+    :param objects: InProgress objects, or anything accepted by
+                    :class:`~kaa.InProgressAll`
+    :param limit: if given, at most this many of the supplied InProgress
+                  objects are unfinished at any time, as explained for
+                  :class:`~kaa.InProgressAll`
+    :type limit: int
+    :return: an iterator of :class:`~kaa.InProgress` objects, where the *n*-th
+             one finishes with the result (or exception) of the *n*-th of the
+             given objects to finish
+
+    This allows a coroutine to process results as soon as they are
+    available::
+
+        for ip in kaa.as_completed(fetch(url) for url in urls):
+            try:
+                page = yield ip
+            except IOError:
+                continue
+            process(page)
+
+    With a *limit*, the next InProgress must not be taken from the iterator
+    before the previous one has finished, as it is not known whether there
+    will be one.  Otherwise, ``RuntimeError`` is raised.
+    """
+    limit = kwargs.pop('limit', None)
+    if kwargs:
+        raise TypeError('as_completed() got an unexpected keyword argument %r' % kwargs.keys()[0])
+    return iter(_InProgressCompleted(*objects, limit=limit))
@@ -0,0 +1,182 @@
+# -*- coding: iso-8859-1 -*-
+# -----------------------------------------------------------------------------
+# asyncio.py - bridge between InProgress objects and asyncio futures
+# -----------------------------------------------------------------------------
+# This module connects kaa's asynchronous programming model with asyncio (or
+# trollius, the asyncio backport for Python 2).  It is meant to be used
+# together with the asyncio notifier (kaa.main.init('asyncio')), in which
+# case kaa and asyncio share one loop and no thread handoffs are needed.
+#
+# Loading the asyncio notifier imports this module, which allows kaa
+# coroutines to yield asyncio futures.  In the other direction, asyncio
+# coroutines can wait for InProgress objects using to_future(), or with
+# Python 3 simply by awaiting them.
+#
+# -----------------------------------------------------------------------------
+# kaa.base - The Kaa Application Framework
+# Copyright 2006-2012 Dirk Meyer, Jason Tackaberry, et al.
+#
+# Please see the file AUTHORS for a complete list of authors.
+#
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License version
+# 2.1 as published by the Free Software Foundation.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301 USA
+#
+# -----------------------------------------------------------------------------
+
+from __future__ import absolute_import
+
+__all__ = [ 'to_future', 'from_future', 'get_event_loop' ]
+
+try:
+    import asyncio
+except ImportError:
+    import trollius as asyncio
+
+from .async import InProgress, InProgressAborted
+from .core import CoreThreading
+from .coroutine import _future_adapters
+from . import nf_wrapper as notifier
+
+
+def get_event_loop():
+    """
+    Returns the asyncio event loop kaa runs on.
+
+    If the main loop was initialized with the ``asyncio`` notifier, this is the
+    loop used by the notifier, otherwise asyncio's current event loop.
+    """
+    if notifier.loaded == 'asyncio':
+        from .pynotifier import nf_asyncio
+        return nf_asyncio.get_loop()
+    return asyncio.get_event_loop()
+
+
+def _wakeup():
+    """
+    Ends the current main loop step so callers of InProgress.wait() notice
+    that an InProgress was finished from an asyncio callback.
+    """
+    if notifier.loaded == 'asyncio':
+        from .pynotifier import nf_asyncio
+        nf_asyncio.wakeup()
+    else:
+        CoreThreading.wakeup()
+
+
+def to_future(inprogress, loop=None):
+    """
+    Returns an asyncio future representing the given InProgress.
+
+    :param inprogress: the InProgress (or any object :func:`kaa.inprogress`
+                       accepts) to wrap.
+    :param loop: the asyncio event loop of the future; defaults to
+                 :func:`get_event_loop`.
+    :return: an ``asyncio.Future`` that is resolved with the result or exception
+             of the InProgress.
+
+    Cancelling the future aborts the InProgress if it is abortable.  This allows
+    asyncio coroutines to wait for kaa's asynchronous tasks::
+
+        @asyncio.coroutine
+        def fetch(channel):
+            data = yield From(kaa.asyncio.to_future(channel.read()))
+
+    With Python 3, InProgress objects can also be awaited directly.
+    """
+    inprogress = inprogress.__inprogress__()
+    if loop is None:
+        loop = get_event_loop()
+    future = asyncio.Future(loop=loop)
+
+    def resolve(method, arg):
+        if not future.done():
+            method(arg)
+
+    def deliver(method, arg):
+        # InProgress objects may be finished from a thread, but futures
+        # must only be resolved from the thread running the loop.
+        if CoreThreading.is_mainthread():
+            resolve(method, arg)
+        else:
+            loop.call_soon_threadsafe(resolve, method, arg)
+
+    def finished(result):
+        deliver(future.set_result, result)
+
+    def exception(tp, exc, tb):
+        deliver(future.set_exception, exc)
+        # The exception is handed over to the future, which asyncio will
+        # log if it is never retrieved.
+        return False
+
+    def cancelled(f):
+        if f.cancelled() and not inprogress.finished and inprogress.abortable:
+            inprogress.abort()
+
+    if inprogress.finished:
+        try:
+            future.set_result(inprogress.result)
+        except Exception, e:
+            future.set_exception(e)
+        return future
+
+    inprogress.connect_both(finished, exception)
+    future.add_done_callback(cancelled)
+    return future
+
+
+def from_future(future):
+    """
+    Returns an InProgress representing the given asyncio future.
+
+    :param future: an ``asyncio.Future`` (or ``asyncio.Task``)
+    :return: an :class:`~kaa.InProgress` that is finished when the future is
+             done.
+
+    If the future is cancelled, the InProgress throws
+    :class:`~kaa.InProgressAborted`; aborting the InProgress cancels the
+    future.
+
+    It is normally not necessary to call this function explicitly:
+    with the ``asyncio`` notifier, kaa coroutines can yield asyncio futures
+    directly.
+    """
+    ip = InProgress(abortable=True)
+
+    def done(f):
+        if ip.finished:
+            return
+        if f.cancelled():
+            exc = InProgressAborted('asyncio future cancelled', inprogress=ip, origin=ip)
+            ip.throw(InProgressAborted, exc, None, aborted=True)
+        elif f.exception() is not None:
+            exc = f.exception()
+            ip.throw(exc.__class__, exc, getattr(exc, '__traceback__', None))
+        else:
+            ip.finish(f.result())
+        _wakeup()
+
+    def abort(exc):
+        future.cancel()
+
+    ip.signals['abort'].connect(abort)
+    if future.done():
+        done(future)
+    else:
+        future.add_done_callback(done)
+    return ip
+
+
+# Allow coroutines to yield asyncio futures.
+_future_adapters.append((asyncio.Future, from_future))
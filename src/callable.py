@@ -47,6 +47,18 @@ log = logging.getLogger('kaa.base.core.callable')
 # is None.
 _python_shutting_down = False
 
+# Strategies for combining invocation arguments with the arguments given at
+# construction time.  Callable._merge holds the strategy for the current
+# arguments and properties, so the common cases don't need to inspect them
+# on every invocation.
+#
+# Pass the invocation arguments only (there are no init arguments)
+_MERGE_CALLER = 0
+# Pass the init arguments only (ignore_caller_args is True)
+_MERGE_INIT = 1
+# Combine both according to init_args_first
+_MERGE_BOTH = 2
+
 
 def weakref_data(data, destroy_cb = None):
     if type(data) in (str, int, long, types.NoneType, types.FunctionType):
@@ -112,6 +124,12 @@ class Callable(object):
     are combined with the arguments specified at construction time and the
     underlying callable is invoked with those arguments.
     """
+    # Callables are created for every signal connection, so keep them small.
+    # Subclasses that don't define __slots__ get a __dict__ as usual.
+    # _signal_once is used by kaa.Signal.
+    __slots__ = ('_func', '_args', '_kwargs', '_ignore_caller_args', '_init_args_first',
+                 '_merge', '_signal_once', '__weakref__')
+
     def __init__(self, func, *args, **kwargs):
         """
         :param func: callable function or object
@@ -124,6 +142,21 @@ class Callable(object):
         self._kwargs = kwargs
         self._ignore_caller_args = False
         self._init_args_first = False
+        self._merge = _MERGE_BOTH if args or kwargs else _MERGE_CALLER
+        self._signal_once = False
+
+
+    def _update_merge(self):
+        """
+        Selects the argument merging strategy.  Must be called whenever the
+        init arguments or the properties affecting them change.
+        """
+        if self._ignore_caller_args:
+            self._merge = _MERGE_INIT
+        elif self._args or self._kwargs:
+            self._merge = _MERGE_BOTH
+        else:
+            self._merge = _MERGE_CALLER
 
 
     @property
@@ -139,6 +172,7 @@ class Callable(object):
     @ignore_caller_args.setter
     def ignore_caller_args(self, value):
         self._ignore_caller_args = value
+        self._update_merge()
 
 
     @property
@@ -225,7 +259,13 @@ class Callable(object):
         if cb is None:
             raise CallableError('attempting to invoke an invalid callable')
 
-        cb_args, cb_kwargs = self._merge_args(args, kwargs)
+        merge = self._merge
+        if merge == _MERGE_CALLER:
+            return cb(*args, **kwargs)
+        elif merge == _MERGE_INIT:
+            cb_args, cb_kwargs = self._get_init_args()
+        else:
+            cb_args, cb_kwargs = self._merge_args(args, kwargs)
         return cb(*cb_args, **cb_kwargs)
 
 
@@ -255,6 +295,7 @@ class WeakCallable(Callable):
     This also works recursively, so if there are nested data structures, for example 
     ``kwarg=[1, [2, [3, my_object]]]``, only a weak reference is held for my_object.
     """
+    __slots__ = ('_instance', '_weakref_destroyed_user_cb')
 
     def __init__(self, func, *args, **kwargs):
         super(WeakCallable, self).__init__(func, *args, **kwargs)
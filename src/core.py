@@ -35,7 +35,8 @@ import fcntl
 import signal
 import time
 import errno
-import Queue
+import struct
+import collections
 
 # kaa imports
 from .callable import Callable, WeakCallable, CallableError
@@ -67,11 +68,13 @@ class CoreThreading:
 
     # Internal only attributes.
     #
-    # The thread pipe, which is created by CoreThreading.init(), is used
+    # The thread notifier, which is created by CoreThreading.init(), is used
     # to awaken the main loop.  This happens in CoreThreading.queue_callback()
-    # and CoreThreading.wakeup().  XXX: this pipe must not be carried through
-    # to forked children, or ugly behaviour will ensue.  kaa.utils.fork() and
-    # .daemonize() will ensure a new pipe is created in the child process.
+    # and CoreThreading.wakeup().  It is a tuple of (read fd, write fd): on
+    # Linux both refer to the same eventfd, otherwise it is a pipe.  XXX: this
+    # pipe must not be carried through to forked children, or ugly behaviour
+    # will ensue.  kaa.utils.fork() and .daemonize() will ensure a new pipe
+    # is created in the child process.
     _pipe = None
     # The signal wake pipe.  We pass the write side of the pipe to Python's
     # signal.set_wakeup_fd(), and any time there is a unix signal received
@@ -85,16 +88,32 @@ class CoreThreading:
     _signal_wake_pipe = None
     # Holds a queue of callbacks and their arguments that need to be executed
     # from the main loop (by CoreThreading.run_queue, which is called by the
-    # notifier when there is activity on the pipe.)  The queue has some fairly
-    # large upper limit to prevent suicide-by-queuing.  See run_queue() for
-    # more details.
-    _queue = Queue.Queue(10000)
-    # Mutex to ensure put/qsize is atomic in queue_callback()
-    _queue_put_lock = threading.Lock()
+    # notifier when there is activity on the pipe.)  append() and popleft()
+    # on a deque are atomic, so producers don't need to take a lock.  The
+    # queue has some fairly large upper limit to prevent suicide-by-queuing.
+    # See run_queue() for more details.
+    _queue = collections.deque()
+    _queue_max = 10000
+    # Set by the consumer whenever the queue has room again, so producers
+    # blocked on a full queue can continue.
+    _queue_not_full = threading.Event()
+    # True while a wakeup was written to the thread notifier that run_queue()
+    # has not yet consumed.  Producers only write to the notifier if this is
+    # False, so any number of callbacks queued before the main loop gets
+    # around to run_queue() cost a single wakeup.
+    _wakeup_pending = False
+    # Number of queued callbacks invoked between checks of
+    # mainthread_callback_max_time in run_queue().
+    _queue_batch = 64
     _mainthread = threading.currentThread()
-    # Create a one byte dummy token for writing to the pipe.  Normally we'd
-    # just use b'1' but Python 2.5 can't parse it.
+    # The token written to the thread notifier: eventfd requires an 8 byte
+    # counter increment, a pipe just needs any byte.  Normally we'd use
+    # b'1' for the pipe but Python 2.5 can't parse it.
     _PIPE_NOTIFY_TOKEN = bl('1')
+    _EVENTFD_NOTIFY_TOKEN = struct.pack('=Q', 1)
+    _notify_token = _PIPE_NOTIFY_TOKEN
+    # EFD_CLOEXEC is O_CLOEXEC, which Python 2 doesn't expose in os.
+    _EFD_CLOEXEC = getattr(os, 'O_CLOEXEC', 0x80000)
 
 
     @staticmethod
@@ -119,13 +138,24 @@ class CoreThreading:
         if CoreThreading._pipe:
             # There is an existing pipe already, so stop monitoring it.
             notifier.socket_remove(CoreThreading._pipe[0])
-        CoreThreading._pipe = CoreThreading._create_nonblocking_pipe()
+        fd = CoreThreading._create_eventfd()
+        if fd is not None:
+            CoreThreading._pipe = fd, fd
+            CoreThreading._notify_token = CoreThreading._EVENTFD_NOTIFY_TOKEN
+        else:
+            CoreThreading._pipe = CoreThreading._create_nonblocking_pipe()
+            CoreThreading._notify_token = CoreThreading._PIPE_NOTIFY_TOKEN
+        # Whatever was written to the old notifier is lost.
+        CoreThreading._wakeup_pending = False
         notifier.socket_add(CoreThreading._pipe[0], CoreThreading.run_queue)
+        # Event driven notifier dispatchers wake up the main loop through the
+        # thread pipe when they become pending.
+        notifier.dispatcher_set_wakeup(CoreThreading._wakeup)
 
         if purge:
-            while not CoreThreading._queue.empty():
-                CoreThreading._queue.get()
-        elif not CoreThreading._queue.empty():
+            CoreThreading._queue.clear()
+            CoreThreading._queue_not_full.set()
+        elif CoreThreading._queue:
             # A thread is already running and wanted to run something in the
             # mainloop before the mainloop is started. In that case we need
             # to wakeup the loop ASAP to handle the requests.
@@ -180,6 +210,33 @@ class CoreThreading:
         return pipe
 
 
+    @staticmethod
+    def _create_eventfd():
+        """
+        Returns a non-blocking eventfd, or None if eventfd(2) is not available
+        on this platform.
+        """
+        flags = os.O_NONBLOCK | CoreThreading._EFD_CLOEXEC
+        if hasattr(os, 'eventfd'):
+            # Python 3.10+
+            try:
+                return os.eventfd(0, flags)
+            except OSError:
+                return None
+        if not sys.platform.startswith('linux'):
+            return None
+        try:
+            import ctypes
+            libc = ctypes.CDLL(None, use_errno=True)
+            fd = libc.eventfd(0, flags)
+        except (ImportError, OSError, AttributeError):
+            return None
+        if fd < 0:
+            log.debug('eventfd() failed: [%d], falling back to pipe', ctypes.get_errno())
+            return None
+        return fd
+
+
     @staticmethod
     def _purge_pipe(fd):
         """
@@ -202,17 +259,34 @@ class CoreThreading:
 
     @staticmethod
     def queue_callback(callback, args, kwargs, in_progress):
-        # We need to synchronize the put and qsize calls or we might not
-        # realize we need to wakeup. (e.g. two threads can do put() one after
-        # the other, and then the call to qsize() would be 2.)  We don't care
-        # if the get() in run_queue() means we miss wakeup() because if
-        # run_queue() is running then clearly we're already woken up. :)
-        with CoreThreading._queue_put_lock:
-            CoreThreading._queue.put((callback, args, kwargs, in_progress))
-            if CoreThreading._queue.qsize() == 1:
-                # We just added the first callback to the queue, so notify the
-                # mainthread.
+        """
+        Queues a callback for invocation from the main loop.  The result (or
+        exception) of the callback is delivered to the given InProgress.
+        """
+        CoreThreading.queue_callbacks(((callback, args, kwargs, in_progress),))
+
+
+    @staticmethod
+    def queue_callbacks(callbacks):
+        """
+        Queues a sequence of (callback, args, kwargs, in_progress) tuples for
+        invocation from the main loop, waking up the main loop at most once.
+        """
+        queue = CoreThreading._queue
+        if len(queue) >= CoreThreading._queue_max and not CoreThreading.is_mainthread():
+            # The main loop can't keep up with the producers.  Block until
+            # run_queue() has made some room.
+            while len(queue) >= CoreThreading._queue_max:
+                CoreThreading._queue_not_full.clear()
                 CoreThreading._wakeup()
+                CoreThreading._queue_not_full.wait(0.1)
+        queue.extend(callbacks)
+        # run_queue() resets _wakeup_pending before it drains the queue, so
+        # either the callbacks we just added are picked up by a run_queue()
+        # that is already in progress, or we see False here.  Two producers
+        # may both see False and write, which just costs a spurious wakeup.
+        if not CoreThreading._wakeup_pending:
+            CoreThreading._wakeup()
 
 
     @staticmethod
@@ -227,6 +301,11 @@ class CoreThreading:
             # warning instead.
             log.warning('Problem reading from thread notifier pipe: [%d] %s', err, msg)
 
+        # Only reset after purging the pipe: a producer that wrote its token
+        # in between would otherwise have it swallowed with the flag left
+        # set, and no producer would ever wake us up again.
+        CoreThreading._wakeup_pending = False
+
 
         # It's possible that a thread is actively enqueuing callbacks faster
         # than we can dequeue and invoke them.  207fc3af77 tried to fix this by
@@ -238,6 +317,8 @@ class CoreThreading:
         # So we don't lock the whole loop to avoid the deadlock, and we stop
         # invoking callbacks after mainthread_callback_max_time seconds
         # has elapsed in order to solve the problem 207fc3af77 tried to fix.
+        # To keep the overhead per callback low, the time is only checked
+        # after each batch of _queue_batch callbacks.
         #
         # Now, there is a large upper bound on the queue to prevent memory
         # exhaustion, which means a producer will block if it's adding
@@ -248,8 +329,11 @@ class CoreThreading:
         # hopefully we have pushed that to an extreme corner case -- although
         # probably at the expense of making that corner case harder to
         # find/debug. :(
+        queue = CoreThreading._queue
+        popleft = queue.popleft
+        stats = notifier.stats
         t0 = time.time()
-        while not CoreThreading._queue.empty():
+        while queue:
             if time.time() - t0 > CoreThreading.mainthread_callback_max_time:
                 # We've spent too much time blocking the main loop invoking the
                 # queued callbacks, but we still have more.  Poke the thread
@@ -258,28 +342,42 @@ class CoreThreading:
                 CoreThreading._wakeup()
                 break
 
-            callback, args, kwargs, in_progress = CoreThreading._queue.get()
-            try:
-                in_progress.finish(callback(*args, **kwargs))
-            except BaseException, e:
-                # All exceptions, including SystemExit and KeyboardInterrupt,
-                # are caught and thrown to the InProgress, because it may be
-                # waiting in another thread.  However SE and KI are reraised
-                # in here the main thread so they can be propagated back up
-                # the mainloop.
-                in_progress.throw()
-                if isinstance(e, (KeyboardInterrupt, SystemExit)):
-                    raise
+            for i in xrange(min(len(queue), CoreThreading._queue_batch)):
+                callback, args, kwargs, in_progress = popleft()
+                if stats is not None:
+                    t1 = time.time()
+                try:
+                    in_progress.finish(callback(*args, **kwargs))
+                except BaseException, e:
+                    # All exceptions, including SystemExit and KeyboardInterrupt,
+                    # are caught and thrown to the InProgress, because it may be
+                    # waiting in another thread.  However SE and KI are reraised
+                    # in here the main thread so they can be propagated back up
+                    # the mainloop.
+                    in_progress.throw()
+                    if isinstance(e, (KeyboardInterrupt, SystemExit)):
+                        CoreThreading._queue_not_full.set()
+                        raise
+                finally:
+                    if stats is not None:
+                        stats.add('queue', time.time() - t1, lambda: notifier.callback_label(callback))
+            CoreThreading._queue_not_full.set()
         return True
 
     @staticmethod
     def _wakeup():
         """
         Wakes up the mainloop.  This is the private interface, which always
-        writes a byte to the notifier pipe.
+        writes to the thread notifier.
         """
         if CoreThreading._pipe:
-            os.write(CoreThreading._pipe[1], CoreThreading._PIPE_NOTIFY_TOKEN)
+            CoreThreading._wakeup_pending = True
+            try:
+                os.write(CoreThreading._pipe[1], CoreThreading._notify_token)
+            except (IOError, OSError), (err, msg):
+                # A full pipe will wake up the main loop just as well.
+                if err != errno.EAGAIN:
+                    raise
 
 
     @staticmethod
@@ -292,10 +390,10 @@ class CoreThreading:
         by another thread to wake up the mainloop.  For example, when a
         :class:`~kaa.MainThreadCallable` is invoked, it calls ``wakeup()``.
         """
-        # Only need to write to the pipe if the queue is empty; if it's not
-        # empty, then queue_callback() would have called _wakeup().
-        if CoreThreading._queue.empty():
-            os.write(CoreThreading._pipe[1], CoreThreading._PIPE_NOTIFY_TOKEN)
+        # Only need to write to the notifier if there is no pending wakeup
+        # that the main loop hasn't consumed yet.
+        if not CoreThreading._wakeup_pending:
+            CoreThreading._wakeup()
 
 
     @staticmethod
@@ -396,21 +494,40 @@ class Object(object):
         return signals
 
 
+    # If True, the constructor does not create the signals attribute.  The
+    # subclass must then provide it itself, using _create_signals().  This is
+    # for classes with many short-lived instances whose signals are rarely
+    # used, such as InProgress.
+    _kaasignals_lazy = False
+
     def __init__(self, *args, **kwargs):
         # Accept all args, and pass to superclass.  Necessary for kaa.Object
         # descendants to be involved in inheritance diamonds.
         super(Object, self).__init__(*args, **kwargs)
 
+        if not self._kaasignals_lazy:
+            signals = self._create_signals()
+            if signals is not None:
+                self.signals = signals
+
+
+    def _create_signals(self):
+        """
+        Returns a new kaa.Signals object for the signals defined by
+        __kaasignals__, or None if there are none.
+        """
         signals = self._get_all_signals(self.__class__)
-        if signals:
-            # Construct the kaa.Signals object and attach the docstrings to
-            # each signal in the Signal object's __doc__ attribute.
-            self.signals = Signals(*signals.keys())
-            if 'sphinx.builders' in sys.modules:
-                # Tiny optimization: only add docstring if we're doing doc
-                # generation.
-                for name in signals:
-                    self.signals[name].__doc__ = signals[name]
+        if not signals:
+            return None
+        # Construct the kaa.Signals object and attach the docstrings to
+        # each signal in the Signal object's __doc__ attribute.
+        obj = Signals(*signals.keys())
+        if 'sphinx.builders' in sys.modules:
+            # Tiny optimization: only add docstring if we're doing doc
+            # generation.
+            for name in signals:
+                obj[name].__doc__ = signals[name]
+        return obj
 
 
 class Signal(object):
@@ -424,6 +541,11 @@ class Signal(object):
     # Constants used for the action parameter for changed_cb.
     CONNECTED = 1
     DISCONNECTED = 2
+    # There can be many signals (every InProgress is one), so use slots for
+    # the attributes we know about.  The __dict__ is only created when some
+    # other attribute is set.
+    __slots__ = ('_callbacks', '_changed_cb', '_deferred_args', '_coalesce_timer',
+                 '_coalesce_args', '_throttle_last', '__dict__', '__weakref__')
 
     def __init__(self, changed_cb=None):
         """
@@ -431,9 +553,19 @@ class Signal(object):
         :type changed_cb: callable
         """
         super(Signal, self).__init__()
+        # The list of callbacks is never modified in place: connecting or
+        # disconnecting replaces it with a new list.  So emit() can iterate
+        # over the list without copying it, even if callbacks connect or
+        # disconnect during the emission.
         self._callbacks = []
         self.changed_cb = changed_cb
         self._deferred_args = []
+        # State for emit_throttled() and emit_debounced(): the OneShotTimer
+        # for a pending emission (created on first use), the arguments it
+        # will be emitted with, and when the last throttled emission happened.
+        self._coalesce_timer = None
+        self._coalesce_args = None
+        self._throttle_last = 0
 
 
     @property
@@ -518,9 +650,9 @@ class Signal(object):
         callback._signal_once = once
 
         if pos == -1:
-            pos = len(self._callbacks)
-
-        self._callbacks.insert(pos, callback)
+            self._callbacks = self._callbacks + [callback]
+        else:
+            self._callbacks = self._callbacks[:pos] + [callback] + self._callbacks[pos:]
         self._changed(Signal.CONNECTED)
 
         if self._deferred_args:
@@ -605,7 +737,7 @@ class Signal(object):
     def _disconnect(self, callback, args, kwargs):
         assert(callable(callback))
         new_callbacks = []
-        for cb in self._callbacks[:]:
+        for cb in self._callbacks:
             if cb == callback and (len(args) == len(kwargs) == 0 or (args, kwargs) == cb._get_init_args()):
                 # This matches what we want to disconnect.
                 continue
@@ -664,11 +796,12 @@ class Signal(object):
 
         :return: False if any of the callbacks returned False, and True otherwise.
         """
-        if len(self._callbacks) == 0:
+        callbacks = self._callbacks
+        if not callbacks:
             return True
 
         retval = True
-        for cb in self._callbacks[:]:
+        for cb in callbacks:
             if cb._signal_once:
                 self.disconnect(cb)
 
@@ -712,6 +845,99 @@ class Signal(object):
             self.emit_deferred(*args, **kwargs)
 
 
+    def _coalesce(self, args, kwargs, delay):
+        """
+        Stores the arguments for a pending emission and (re)starts the timer
+        to emit them after *delay* seconds.
+        """
+        self._coalesce_args = args, kwargs
+        if not self._coalesce_timer:
+            # Avoid a circular import; timer depends on core.
+            from .timer import OneShotTimer
+            self._coalesce_timer = OneShotTimer(self._emit_coalesced)
+        self._coalesce_timer.start(delay)
+
+
+    def _emit_coalesced(self):
+        if self._coalesce_args is None:
+            # Cancelled via emit_pending() in the meantime.
+            return
+        args, kwargs = self._coalesce_args
+        self._coalesce_args = None
+        self._throttle_last = time.time()
+        self.emit(*args, **kwargs)
+
+
+    def emit_throttled(self, interval, *args, **kwargs):
+        """
+        Emits the signal at most once every *interval* seconds.
+
+        If the last throttled emission was at least *interval* seconds ago, the
+        signal is emitted immediately.  Otherwise the emission is postponed
+        until the interval has elapsed, and is then done with the arguments of
+        the most recent call (latest value wins): intermediate values are
+        dropped.
+
+        :param interval: minimum number of seconds between emissions
+        :type interval: float
+        :return: the return value of :meth:`~kaa.Signal.emit` if the signal
+                 was emitted immediately, or None if it was postponed.
+
+        This is useful for producers that report progress or state changes
+        much faster than any consumer needs to see them.  The postponed
+        emission happens from the main loop, so it requires the main loop
+        to be running.
+        """
+        if self._coalesce_args is not None:
+            # An emission is already pending; it will use these arguments.
+            self._coalesce_args = args, kwargs
+            return
+        elapsed = time.time() - self._throttle_last
+        if elapsed >= interval or elapsed < 0:
+            self._throttle_last = time.time()
+            return self.emit(*args, **kwargs)
+        self._coalesce(args, kwargs, interval - elapsed)
+
+
+    def emit_debounced(self, delay, *args, **kwargs):
+        """
+        Emits the signal once no further calls have been made for *delay*
+        seconds.
+
+        Each call postpones the emission, which is done with the arguments
+        of the most recent call (latest value wins).  So a burst of calls
+        results in a single emission *delay* seconds after the burst ended.
+
+        :param delay: number of seconds without calls before the signal is
+                      emitted
+        :type delay: float
+
+        Like :meth:`~kaa.Signal.emit_throttled`, this requires the main loop
+        to be running.  Both methods share the pending emission, so for any
+        given signal, using one or the other is recommended.
+        """
+        self._coalesce(args, kwargs, delay)
+
+
+    def emit_pending(self, cancel=False):
+        """
+        Immediately emits the emission postponed by
+        :meth:`~kaa.Signal.emit_throttled` or :meth:`~kaa.Signal.emit_debounced`.
+
+        :param cancel: if True, the pending emission is discarded instead.
+        :type cancel: bool
+        :return: True if there was a pending emission, and False otherwise.
+        """
+        if self._coalesce_args is None:
+            return False
+        self._coalesce_timer.stop()
+        if cancel:
+            self._coalesce_args = None
+        else:
+            self._emit_coalesced()
+        return True
+
+
     def _weakref_destroyed(self, weakref, callback):
         if CoreThreading.python_shutting_down == False:
             self._disconnect(callback, (), {})
@@ -49,7 +49,8 @@
 from __future__ import absolute_import
 
 __all__ = [
-    'NotFinished', 'coroutine', 'CoroutineInProgress',
+    'NotFinished', 'coroutine', 'CoroutineInProgress', 'CoroutineScheduler',
+    'enable_coroutine_stats', 'get_coroutine_stats',
     'POLICY_SYNCHRONIZED', 'POLICY_SINGLETON', 'POLICY_PASS_LAST'
 ]
 
@@ -57,9 +58,14 @@ __all__ = [
 import sys
 import logging
 import types
+import time
+import collections
+import traceback
 
 # kaa.base imports
 from .utils import property, wraps, DecoratorDataStore
+from .core import CoreThreading
+from . import nf_wrapper as notifier
 from .timer import Timer
 from .async import InProgress, InProgressAborted, InProgressStatus
 from .thread import threaded, MAINTHREAD
@@ -80,6 +86,15 @@ POLICY_PASS_LAST = 'passlast'
 # CoroutineInProgress.__init__ for rational.
 _active_coroutines = set()
 
+# (type, adapter) pairs for foreign future objects which coroutines may yield
+# in addition to InProgress objects.  The adapter returns an InProgress for
+# the future.  kaa.asyncio registers asyncio futures here.
+_future_adapters = []
+
+# _CoroutineStats object collecting the duration of coroutine steps while
+# enabled (see enable_coroutine_stats()), otherwise None.
+_stats = None
+
 def coroutine(interval=0, policy=None, progress=False, group=None):
     """
     Decorated functions (which must be generators) may yield control
@@ -209,9 +224,9 @@ def coroutine(interval=0, policy=None, progress=False, group=None):
                 # executions, so chain onto the last invocation.
                 last[-1].connect_both(ip._continue)
             # Perform as much as we can of the coroutine now.
-            elif ip._step() == True:
-                # Generator yielded NotFinished, so start the CoroutineInProgress timer.
-                ip._timer.start(interval)
+            elif CoroutineScheduler._step(ip) == True:
+                # Generator yielded NotFinished, so schedule the next step.
+                ip._schedule()
             elif ip.failed:
                 # Coroutine raised an exception immediately.  Here we just
                 # reference the result attribute, which will reraise back to
@@ -229,6 +244,98 @@ def coroutine(interval=0, policy=None, progress=False, group=None):
 
     return decorator
 
+class _CoroutineStats(dict):
+    """
+    Dict mapping the (name, filename, line) tuple of coroutine functions to
+    histograms of the duration of their steps.
+    """
+    def __init__(self, slow_step=None):
+        super(_CoroutineStats, self).__init__()
+        self.slow_step = slow_step
+
+
+    def add(self, info, seconds, gen, start):
+        """
+        Adds the duration of a step of the given generator, which started at
+        line start.
+        """
+        histogram = self.get(info)
+        if histogram is None:
+            histogram = self[info] = notifier.Histogram()
+        frame = gen.gi_frame
+        end = frame.f_lineno if frame else None
+        histogram.add(seconds, lambda: 'line %s to %s' % (start, end or 'end'))
+        if self.slow_step is not None and seconds >= self.slow_step:
+            if frame:
+                where = 'now at:\n' + ''.join(traceback.format_stack(frame)).rstrip()
+            else:
+                where = 'which finished the coroutine'
+            log.warning('Slow step of coroutine %s() at %s:%d: %.3fs from line %s, %s',
+                        info[0], info[1], info[2], seconds, start, where)
+
+
+
+def enable_coroutine_stats(enabled=True, slow_step=None):
+    """
+    Enables or disables the accounting of the time spent in coroutines.
+
+    While enabled, the wall time of each step of a coroutine (that is, from
+    the time the generator is entered until it yields) is recorded per
+    coroutine function.  Use :func:`get_coroutine_stats` to fetch the results.
+
+    :param enabled: True to enable the accounting, False to disable it and
+                    discard the collected samples.
+    :param slow_step: if not None, a warning is logged for every step taking at
+                      least this many seconds, showing where the coroutine
+                      yielded at the end of the step.
+    :type slow_step: float
+
+    The accounting is also enabled if the ``KAA_STATS`` environment variable
+    is set.  When disabled, it adds next to no overhead.  Enabling it while
+    it is already enabled keeps the collected samples.
+    """
+    global _stats
+    if not enabled:
+        _stats = None
+    elif _stats is None:
+        _stats = _CoroutineStats(slow_step)
+    else:
+        _stats.slow_step = slow_step
+
+
+def get_coroutine_stats(reset=False):
+    """
+    Returns the statistics collected by :func:`enable_coroutine_stats`.
+
+    :param reset: if True, the collected samples are discarded afterwards.
+    :return: None if the accounting is disabled, otherwise a dict mapping a
+             description of each coroutine function (its name, file name and
+             line number) to a dict as returned by :func:`kaa.main.get_stats`,
+             where ``count`` is the number of steps and ``max_label`` tells
+             which lines the slowest step ran between.  Additionally, ``live``
+             is the number of currently active instances of the coroutine.
+
+    Coroutine functions which have active instances but have not been
+    stepped since the accounting was enabled are included as well.
+    """
+    stats = _stats
+    if stats is None:
+        return None
+    live = {}
+    for ip in list(_active_coroutines):
+        live[ip._coroutine_info] = live.get(ip._coroutine_info, 0) + 1
+    result = {}
+    for info in set(stats.keys()) | set(live.keys()):
+        histogram = stats.get(info) or notifier.Histogram()
+        summary = histogram.summary()
+        summary['live'] = live.get(info, 0)
+        result['%s() at %s:%d' % info] = summary
+    if reset:
+        stats.clear()
+    return result
+
+
+
 @generator.register(coroutine)
 def _generator_coroutine(generator, func, args, kwargs):
     """
@@ -252,6 +359,174 @@ def _generator_coroutine(generator, func, args, kwargs):
 # Internal classes
 # -----------------------------------------------------------------------------
 
+class CoroutineScheduler:
+    """
+    CoroutineScheduler is a namespace (not intended to be instantiated) holding
+    the run queues for coroutines.
+
+    Coroutines with an interval of 0 (the default) that yield
+    ``kaa.NotFinished`` are put in a run queue, which a single timer processes
+    once per main loop iteration, instead of each coroutine starting a timer
+    of its own.
+
+    Coroutines that are resumed while another coroutine is being stepped (for
+    example because that coroutine finished an InProgress they are waiting
+    on) are not entered recursively.  They are stepped as soon as the current
+    step returns, before control goes back to the main loop.  So long chains
+    of coroutines do not grow the stack.
+    """
+    # The amount of time (in seconds) coroutines in the run queue may take per
+    # main loop iteration.  Once it is used up, the remaining coroutines have
+    # to wait for the next iteration, so that CPU-heavy coroutines yielding
+    # kaa.NotFinished can't starve I/O and timers.  Regardless of this, each
+    # coroutine is stepped at most once per iteration.
+    time_slice = 0.05
+
+    # Internal only attributes.
+    #
+    # Coroutines that were resumed while a coroutine was being stepped, and
+    # are to be stepped once the outermost step returns.
+    _ready = collections.deque()
+    # Coroutines that yielded kaa.NotFinished, to be stepped by the timer in
+    # the next main loop iteration.
+    _runnable = collections.deque()
+    # Number of coroutine steps on the stack of the main thread.
+    _depth = 0
+    # The timer processing the run queue, created on first use.
+    _timer = None
+    # True while the timer callback is executing.
+    _running = False
+
+    @staticmethod
+    def _step(ip):
+        """
+        Steps the given CoroutineInProgress, and afterwards the coroutines
+        that were resumed meanwhile.  Returns True if it yielded NotFinished.
+        """
+        if not CoreThreading.is_mainthread():
+            return ip._step()
+        CoroutineScheduler._depth += 1
+        try:
+            result = ip._step()
+        except BaseException:
+            CoroutineScheduler._depth -= 1
+            if CoroutineScheduler._ready and not CoroutineScheduler._depth:
+                # Leave the rest to the timer.
+                CoroutineScheduler._start()
+            raise
+        CoroutineScheduler._depth -= 1
+        if CoroutineScheduler._ready and not CoroutineScheduler._depth:
+            CoroutineScheduler._run_ready()
+        return result
+
+
+    @staticmethod
+    def _resume(ip):
+        """
+        Resumes the given CoroutineInProgress whose prerequisite InProgress
+        has finished, deferring it if a coroutine is being stepped.
+        """
+        if CoroutineScheduler._depth and CoreThreading.is_mainthread():
+            CoroutineScheduler._ready.append(ip)
+        elif CoroutineScheduler._step(ip):
+            ip._schedule()
+
+
+    @staticmethod
+    def _run_ready():
+        """
+        Steps all deferred coroutines, including those deferred meanwhile.
+        """
+        ready = CoroutineScheduler._ready
+        CoroutineScheduler._depth += 1
+        try:
+            while ready:
+                ip = ready.popleft()
+                if ip._coroutine is not None and ip._step():
+                    ip._schedule()
+        finally:
+            CoroutineScheduler._depth -= 1
+            if ready:
+                CoroutineScheduler._start()
+
+
+    @staticmethod
+    def _start():
+        """
+        Starts the timer processing the run queue, if it isn't running.
+        """
+        if not CoroutineScheduler._timer:
+            CoroutineScheduler._timer = Timer(CoroutineScheduler._run)
+        if not CoroutineScheduler._timer.active:
+            CoroutineScheduler._timer.start(0)
+
+
+    @staticmethod
+    def _run():
+        """
+        Timer callback stepping the coroutines in the run queue.
+        """
+        if CoroutineScheduler._ready:
+            CoroutineScheduler._run_ready()
+        runnable = CoroutineScheduler._runnable
+        deadline = time.time() + CoroutineScheduler.time_slice
+        CoroutineScheduler._running = True
+        try:
+            # Only those coroutines that were in the run queue when we started,
+            # so that a coroutine yielding NotFinished is stepped once per
+            # iteration.
+            for i in xrange(len(runnable)):
+                if not runnable:
+                    # Emptied by a nested main loop.
+                    break
+                ip = runnable.popleft()
+                if ip._coroutine is not None and CoroutineScheduler._step(ip):
+                    ip._schedule()
+                if time.time() >= deadline:
+                    break
+        finally:
+            CoroutineScheduler._running = False
+        return len(runnable) > 0
+
+
+    @staticmethod
+    def _enter_loop():
+        """
+        Called by kaa.main before running the main loop, which may happen
+        from within a coroutine step (e.g. by InProgress.wait()).  Coroutines
+        deferred so far, and those resumed by the loop, must not wait for that
+        step to return.  Returns the state to pass to _leave_loop().
+        """
+        state = CoroutineScheduler._depth, CoroutineScheduler._running, CoroutineScheduler._timer
+        if CoroutineScheduler._running:
+            # We're inside the timer callback, so the notifier won't invoke
+            # the timer again until we return.  Use another one meanwhile.
+            CoroutineScheduler._running = False
+            CoroutineScheduler._timer = None
+        if CoroutineScheduler._depth:
+            CoroutineScheduler._depth = 0
+            if CoroutineScheduler._ready:
+                CoroutineScheduler._run_ready()
+        return state
+
+
+    @staticmethod
+    def _leave_loop(state):
+        depth, running, timer = state
+        if running:
+            # _enter_loop() replaced the timer whose callback we return to;
+            # that one will handle what's left in the run queue.
+            if CoroutineScheduler._timer and CoroutineScheduler._timer.active:
+                CoroutineScheduler._timer.stop()
+            CoroutineScheduler._timer = timer
+        CoroutineScheduler._depth = depth
+        CoroutineScheduler._running = running
+        if CoroutineScheduler._runnable or CoroutineScheduler._ready:
+            # Coroutines scheduled within the loop must not stall until
+            # something else kicks the scheduler.
+            CoroutineScheduler._start()
+
+
 class CoroutineInProgress(InProgress):
     """
     An :class:`~kaa.InProgress` object returned by the :func:`coroutine` decorator.
@@ -266,7 +541,8 @@ class CoroutineInProgress(InProgress):
         super(CoroutineInProgress, self).__init__(frame=-1)
         self._coroutine = function
         self._coroutine_info = function_info
-        self._timer = Timer(self._step)
+        # Only used for a non-zero interval, see _schedule().
+        self._timer = None
         self._interval = interval
         self._prerequisite_ip = None
         self._valid = True
@@ -275,8 +551,8 @@ class CoroutineInProgress(InProgress):
         self._abortable = True
 
         if progress is NotFinished:
-            # coroutine was stopped NotFinished, start the step timer
-            self._timer.start(interval)
+            # coroutine was stopped NotFinished, schedule the next step
+            self._schedule()
         elif isinstance(progress, InProgress):
             # continue when InProgress is done
             self._prerequisite_ip = progress
@@ -372,13 +648,27 @@ class CoroutineInProgress(InProgress):
             # with a 0 timeout to reenter the coroutine.  When you're
             # transferring a lot of data from a socket, halving the number of
             # syscalls is not a trivial optimization.
-            if self._step():
-                # If _step() returns True it means the coroutine yielded
-                # NotFinished so we must start the timer now.
-                self._timer.start(self._interval)
-        elif self._timer:
+            #
+            # If we're called from within the step of another coroutine, the
+            # CoroutineScheduler defers reentry until that step returns.
+            CoroutineScheduler._resume(self)
+        elif self._coroutine:
             # Non-zero coroutine interval, so we start the timer which will
             # call _step() after the interval.
+            self._schedule()
+
+
+    def _schedule(self):
+        """
+        Schedules the next step of the coroutine after its interval, which is
+        the next main loop iteration for an interval of 0.
+        """
+        if self._interval == 0:
+            CoroutineScheduler._runnable.append(self)
+            CoroutineScheduler._start()
+        else:
+            if not self._timer:
+                self._timer = Timer(CoroutineScheduler._step, self)
             self._timer.start(self._interval)
 
 
@@ -388,13 +678,21 @@ class CoroutineInProgress(InProgress):
         """
         try:
             while True:
-                result = self._step_generator()
+                if _stats is None:
+                    result = self._step_generator()
+                else:
+                    result = self._step_generator_timed()
                 if result is NotFinished:
                     # Schedule next iteration with the timer
                     return True
                 elif not isinstance(result, InProgress):
-                    # Coroutine is done.
-                    break
+                    for cls, adapter in _future_adapters:
+                        if isinstance(result, cls):
+                            result = adapter(result)
+                            break
+                    else:
+                        # Coroutine is done.
+                        break
 
                 # Result is an InProgress, so there's more work to do.
                 self._prerequisite_ip = result
@@ -629,7 +927,7 @@ class CoroutineInProgress(InProgress):
             self._prerequisite_ip = None
             if prereq._exception:
                 tp, exc, tb = prereq._exception
-                prereq._unhandled_exception = None
+                prereq._exception_handled()
                 if isinstance(exc, InProgressAborted):
                     # Exception being raised inside the generator is an InProgressAborted.
                     # Replace the inprogress attribute with the prerequisite InProgress
@@ -639,3 +937,17 @@ class CoroutineInProgress(InProgress):
                 return self._coroutine.throw(tp, exc, tb)
             return self._coroutine.send(prereq._result)
         return self._coroutine.next()
+
+
+    def _step_generator_timed(self):
+        """
+        Variant of _step_generator() used while the accounting is enabled.
+        """
+        stats = _stats
+        gen = self._coroutine
+        start = gen.gi_frame.f_lineno if gen.gi_frame else None
+        t0 = time.time()
+        try:
+            return self._step_generator()
+        finally:
+            stats.add(self._coroutine_info, time.time() - t0, gen, start)
@@ -36,6 +36,7 @@ import inspect
 # kaa.base imports
 from .utils import tempfile
 from . import nf_wrapper as notifier
+from .coroutine import enable_coroutine_stats, get_coroutine_stats
 
 
 socket_listen = None
@@ -92,6 +93,42 @@ def socket_trace_send(frame, event, arg):
             return
     return socket_trace_send
 
+def format_stats():
+    """
+    Return the main loop instrumentation histograms as text
+    """
+    if notifier.stats is None:
+        return 'main loop instrumentation is disabled\n'
+    lines = []
+    for name in ('lag', 'select', 'io', 'timer', 'queue'):
+        h = notifier.stats[name].summary()
+        lines.append('%-6s count=%d total=%.3fs mean=%.6fs p50<%.6fs p90<%.6fs p99<%.6fs max=%.6fs' % \
+            (name, h['count'], h['total'], h['mean'], h['p50'], h['p90'], h['p99'], h['max']))
+        if h['max_label']:
+            lines.append('       slowest: %s' % h['max_label'])
+        for bound, count in h['buckets']:
+            lines.append('       < %10.6fs %8d %s' % (bound, count, '#' * (count * 50 / h['count'])))
+    return '\n'.join(lines) + '\n'
+
+def format_coroutine_stats(limit=20):
+    """
+    Return the coroutine accounting as text, busiest coroutines first
+    """
+    stats = get_coroutine_stats()
+    if stats is None:
+        return 'coroutine accounting is disabled\n'
+    lines = []
+    ranked = sorted(stats.items(), key=lambda (name, h): h['total'], reverse=True)
+    for name, h in ranked[:limit]:
+        lines.append('%s' % name)
+        lines.append('       count=%d total=%.3fs mean=%.6fs max=%.6fs live=%d' % \
+            (h['count'], h['total'], h['mean'], h['max'], h['live']))
+        if h['max_label']:
+            lines.append('       slowest: %s' % h['max_label'])
+    if len(ranked) > limit:
+        lines.append('(%d more)' % (len(ranked) - limit))
+    return '\n'.join(lines) + '\n'
+
 def new_command(s):
     """
     New command from the debugging socket
@@ -105,6 +142,22 @@ def new_command(s):
         socket_trace = s
         print '=== START TRACE ==='
         sys.settrace(socket_trace_send)
+    if cmd[0] == 'stats':
+        if len(cmd) > 1 and cmd[1] in ('enable', 'disable'):
+            notifier.set_stats(cmd[1] == 'enable')
+        s.send(format_stats())
+        if len(cmd) > 1 and cmd[1] == 'reset':
+            notifier.set_stats(False)
+            notifier.set_stats(True)
+        s.close()
+    if cmd[0] == 'coroutines':
+        if len(cmd) > 1 and cmd[1] in ('enable', 'disable'):
+            slow_step = float(cmd[2]) if len(cmd) > 2 else None
+            enable_coroutine_stats(cmd[1] == 'enable', slow_step)
+        s.send(format_coroutine_stats())
+        if len(cmd) > 1 and cmd[1] == 'reset':
+            get_coroutine_stats(reset=True)
+        s.close()
     if cmd[0] == 'winpdb':
         s.send('ok\n')
         s.close()
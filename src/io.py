@@ -30,23 +30,19 @@ import sys
 import os
 import socket
 import logging
-import time
 import fcntl
 import re
 import errno
 import threading
-try:
-    from io import BytesIO
-except ImportError:
-    from cStringIO import StringIO as BytesIO
-
+import collections
+import itertools
 from .utils import property
 from .strutils import BYTES_TYPE, UNICODE_TYPE, py3_b, bl
 from . import nf_wrapper as notifier
 from .callable import WeakCallable
 from .core import Object, Signal, CoreThreading
 from .thread import MainThreadCallable, threaded, MAINTHREAD
-from .async import InProgress, inprogress
+from .async import InProgress, InProgressStatus, inprogress, finished
 from . import main
 
 # get logging object
@@ -56,7 +52,15 @@ IO_READ   = 1
 IO_WRITE  = 2
 IO_EXCEPT = 3
 
+# Maximum number of buffers written with a single writev() or sendmsg().
+try:
+    IOV_MAX = os.sysconf('SC_IOV_MAX')
+except (AttributeError, ValueError, OSError):
+    IOV_MAX = 16
+
 class IOMonitor(notifier.NotifierCallback):
+    _stats_name = 'io'
+
     def __init__(self, callback, *args, **kwargs):
         """
         Creates an IOMonitor to monitor IO activity via the mainloop.
@@ -120,6 +124,308 @@ class WeakIOMonitor(notifier.WeakNotifierCallback, IOMonitor):
     pass
 
 
+class _ReadQueue(object):
+    """
+    Read queue of an IOChannel.
+
+    The queued data lives in a bytearray between a start and an end offset.
+    Data is consumed from the start without moving the rest, and the
+    channel can read directly into the free space at the end (see
+    reserve()).  When the end of the buffer is reached, the queued data is
+    moved to the front, and the buffer is grown if it is still too small.
+    The queued data is thus always contiguous, so delimiters can be searched
+    for in place.
+    """
+    __slots__ = ('_buf', '_start', '_end', '_scanned', '_scanned_delim')
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._start = self._end = 0
+        # Offset up to which the queue was searched for _scanned_delim
+        # without success, so find() can continue from there.
+        self._scanned = 0
+        self._scanned_delim = None
+
+
+    def __len__(self):
+        return self._end - self._start
+
+
+    def clear(self, release=False):
+        """
+        Empties the queue.  If release is True, the buffer is freed, too.
+        """
+        self._start = self._end = self._scanned = 0
+        if release:
+            self._buf = bytearray()
+
+
+    def _make_room(self, size):
+        """
+        Ensures there are at least size bytes of free space at the end.
+        """
+        buf, start, used = self._buf, self._start, self._end - self._start
+        if self._end + size <= len(buf):
+            return
+        if used + size <= len(buf) and start >= used:
+            # Enough space once the queued data is moved to the front.  Only
+            # doing so if the queued data is smaller than the consumed space
+            # keeps this amortized linear, and the two don't overlap.
+            buf[:used] = memoryview(buf)[start:self._end]
+        else:
+            new = bytearray(max(used + size, len(buf) * 2))
+            new[:used] = memoryview(buf)[start:self._end]
+            self._buf = new
+        self._scanned -= start
+        self._start, self._end = 0, used
+
+
+    def write(self, data):
+        """
+        Appends data to the queue.
+        """
+        self._make_room(len(data))
+        end = self._end + len(data)
+        self._buf[self._end:end] = data
+        self._end = end
+
+
+    def reserve(self, size):
+        """
+        Returns a writable memoryview of size bytes of free space at the end
+        of the queue.  After reading into it, commit() must be called with
+        the number of bytes read.
+        """
+        self._make_room(size)
+        return memoryview(self._buf)[self._end:self._end + size]
+
+
+    def commit(self, size):
+        self._end += size
+
+
+    def find(self, delim, overlap):
+        """
+        Returns the number of bytes up to and including the first delimiter,
+        or None if the delimiter is not found.
+
+        delim is either a bytes object or a compiled regexp, and overlap is
+        the maximum length of a delimiter minus 1.  Data searched previously
+        for the same delimiter is not searched again.
+        """
+        start = self._start
+        if delim is self._scanned_delim and self._scanned > start:
+            start = self._scanned
+        if type(delim) == BYTES_TYPE:
+            idx = self._buf.find(delim, start, self._end)
+            end = idx + len(delim) if idx >= 0 else None
+        else:
+            m = delim.search(self._buf, start, self._end)
+            end = m.end() if m else None
+        if end is None:
+            # The next search must not miss a delimiter which is partly
+            # received.
+            self._scanned = max(self._start, self._end - overlap)
+            self._scanned_delim = delim
+            return None
+        return end - self._start
+
+
+    def pop_lines(self, delim, overlap):
+        """
+        Removes and returns a list of all complete lines (including the
+        delimiter) in the queue.  The arguments are as with find().
+        """
+        start, end = self._start, self._end
+        pos = self._scanned if delim is self._scanned_delim and self._scanned > start else start
+        if type(delim) == BYTES_TYPE:
+            idx = self._buf.rfind(delim, pos, end)
+            last = idx + len(delim) if idx >= 0 else None
+        else:
+            last = None
+            for m in delim.finditer(self._buf, pos, end):
+                last = m.end()
+        if last is None:
+            self._scanned = max(start, end - overlap)
+            self._scanned_delim = delim
+            return []
+
+        # Pop the complete lines at once and split them afterwards.  When
+        # there's just one, slicing returns the chunk itself.
+        chunk = self.pop(last - start)
+        lines, pos = [], 0
+        if type(delim) == BYTES_TYPE:
+            find, size = chunk.find, len(delim)
+            while pos < len(chunk):
+                end = find(delim, pos) + size
+                lines.append(chunk[pos:end])
+                pos = end
+        else:
+            for m in delim.finditer(chunk):
+                lines.append(chunk[pos:m.end()])
+                pos = m.end()
+        return lines
+
+
+    def peek(self, size):
+        """
+        Returns a memoryview of the first size bytes without removing them.
+        It is only valid until the queue is next written to.
+        """
+        return memoryview(self._buf)[self._start:self._start + size]
+
+
+    def skip(self, size):
+        """
+        Removes size bytes from the front.
+        """
+        if self._start + size >= self._end:
+            self.clear()
+        else:
+            self._start += size
+
+
+    def pop(self, size=None):
+        """
+        Removes and returns size bytes (or everything) from the front.
+        """
+        start = self._start
+        end = self._end if size is None else start + size
+        data = memoryview(self._buf)[start:end].tobytes()
+        if end == self._end:
+            self.clear()
+        else:
+            self._start = end
+        return data
+
+
+class _WriteQueue(collections.deque):
+    """
+    Write queue of an IOChannel, holding (data, InProgress) tuples.
+
+    Keeps count of the queued bytes, and of the bytes of the data at the
+    head of the queue which have been written already (offset).
+    """
+    def __init__(self):
+        super(_WriteQueue, self).__init__()
+        # Number of queued bytes not written yet.
+        self.used = 0
+        self.offset = 0
+
+
+    def append(self, item):
+        super(_WriteQueue, self).append(item)
+        self.used += len(item[0])
+
+
+    def remove(self, item):
+        super(_WriteQueue, self).remove(item)
+        self.used -= len(item[0])
+
+
+    def popleft(self):
+        item = super(_WriteQueue, self).popleft()
+        self.used -= len(item[0]) - self.offset
+        self.offset = 0
+        return item
+
+
+    def clear(self):
+        super(_WriteQueue, self).clear()
+        self.used = self.offset = 0
+
+
+    def buffers(self, limit):
+        """
+        Returns a list of at most IOV_MAX buffers from the head of the queue
+        whose total size doesn't exceed limit, unless the first one does.
+        Data at the head which is partially written is sliced without
+        copying.
+        """
+        buffers, size = [], 0
+        for data, inprogress in itertools.islice(self, IOV_MAX):
+            if isinstance(data, _FileWrite) or (buffers and size + len(data) > limit):
+                break
+            buffers.append(data)
+            size += len(data)
+        if self.offset:
+            buffers[0] = memoryview(buffers[0])[self.offset:]
+        return buffers
+
+
+    def consume(self, size):
+        """
+        Accounts for size bytes having been written.  Returns a list of
+        (InProgress, bytes written) for the data fully written, which is
+        removed from the queue.
+        """
+        done = []
+        while self and not isinstance(self[0][0], _FileWrite) and \
+              self.offset + size >= len(self[0][0]):
+            written = len(self[0][0]) - self.offset
+            data, inprogress = self.popleft()
+            done.append((inprogress, written))
+            size -= written
+        self.offset += size
+        self.used -= size
+        return done
+
+
+
+class _FileWrite(object):
+    """
+    A file queued in the write queue by IOChannel.write_file().
+    """
+    def __init__(self, fd, offset, count, progress):
+        self.fd = fd
+        self.offset = offset
+        # Number of bytes left to write, or None to write up to the end of
+        # the file.
+        self.remaining = count
+        self.progress = progress
+        self.written = 0
+        self.eof = False
+        # Whether to try sending straight from the file, and the data read
+        # from the file but not written yet when that's not possible.
+        self.sendfile = True
+        self.data = None
+
+
+    def __len__(self):
+        # The data isn't held in memory, so it doesn't count towards the
+        # size of the write queue.
+        return 0
+
+
+    @property
+    def done(self):
+        return self.eof or self.remaining == 0
+
+
+    def read(self, size):
+        """
+        Reads size bytes from the current offset without changing the file
+        position.
+        """
+        if hasattr(os, 'pread'):
+            return os.pread(self.fd, size, self.offset)
+        pos = os.lseek(self.fd, 0, os.SEEK_CUR)
+        try:
+            os.lseek(self.fd, self.offset, os.SEEK_SET)
+            return os.read(self.fd, size)
+        finally:
+            os.lseek(self.fd, pos, os.SEEK_SET)
+
+
+    def advance(self, size):
+        self.offset += size
+        self.written += size
+        if self.remaining is not None:
+            self.remaining -= size
+        self.progress.set(self.written)
+
+
+
 class IOChannel(Object):
     """
     Base class for read-only, write-only or read-write stream-based
@@ -145,6 +451,12 @@ class IOChannel(Object):
     exception will be raised.  The write queue will be written to the channel
     once it becomes writable.
 
+    Producers of large amounts of data should apply flow control using the
+    :attr:`~kaa.IOChannel.write_watermarks`: once the write queue grows above
+    the high watermark, they should wait for the
+    :attr:`~kaa.IOChannel.signals.writable` signal, or pass ``wait=True`` to
+    :meth:`~kaa.IOChannel.write` to have data held back until then.
+
     Reads are asynchronous and non-blocking, and may be performed using two
     possible approaches:
 
@@ -225,15 +537,37 @@ class IOChannel(Object):
                :param expected: True if the channel is closed because
                                 :meth:`~kaa.IOChannel.close` was called.
                :type expected: bool
+            ''',
+
+        'writable':
+            '''
+            Emitted when the write queue, having grown above the high
+            watermark, has drained to the low watermark.
+
+            .. describe:: def callback(...)
+
+            See :attr:`~kaa.IOChannel.write_watermarks`.
+            ''',
+
+        'drained':
+            '''
+            Emitted when all queued data has been written to the channel.
+
+            .. describe:: def callback(...)
             '''
     }
 
     def __init__(self, channel=None, mode=IO_READ|IO_WRITE, chunk_size=1024*1024, delimiter='\n'):
         super(IOChannel, self).__init__()
         self.delimiter = delimiter
-        self._write_queue = []
+        self._write_queue = _WriteQueue()
+        # Writes held back by write(wait=True) until the write queue has
+        # drained, and whether it is above the high watermark.
+        self._write_held = collections.deque()
+        self._write_paused = False
+        self._write_watermarks = 64*1024, 16*1024
         # Read queue used for read() and readline(), and 'readline' signal.
-        self._read_queue = BytesIO()
+        self._read_queue = _ReadQueue()
         self._read_queue_lock = threading.RLock()
         # Number of bytes each queue (read and write) are limited to.
         self._queue_size = 1024*1024
@@ -309,7 +643,7 @@ class IOChannel(Object):
            readable property will subsequently be False).
         """
         return self._mode & IO_READ and \
-               ((self.alive and not self._eof) or self._read_queue.tell() > 0)
+               ((self.alive and not self._eof) or len(self._read_queue) > 0)
 
 
     @property
@@ -373,14 +707,38 @@ class IOChannel(Object):
         self._queue_size = value
 
 
+    @property
+    def write_watermarks(self):
+        """
+        The (high, low) watermarks in bytes used for flow control of writes.
+
+        Once the write queue grows above the high watermark, writes passing
+        ``wait=True`` to :meth:`write` are held back, until enough is written
+        to the channel for the queue to drain to the low watermark, when the
+        :attr:`~kaa.IOChannel.signals.writable` signal is emitted.  The
+        default is (65536, 16384).
+        """
+        return self._write_watermarks
+
+
+    @write_watermarks.setter
+    def write_watermarks(self, value):
+        high, low = value
+        if low > high:
+            raise ValueError('low watermark must not exceed the high watermark')
+        self._write_watermarks = high, low
+        if self._write_queue.used > high:
+            self._write_paused = True
+        elif self._write_queue.used <= low:
+            self._resume_writes()
+
+
     @property
     def write_queue_used(self):
         """
         The number of bytes queued in memory to be written to the channel.
         """
-        # XXX: this is not terribly efficient when the write queue has
-        # many elements.  We may decide to keep a separate counter.
-        return sum(len(data) for data, inprogress in self._write_queue)
+        return self._write_queue.used
 
 
     @property
@@ -391,7 +749,7 @@ class IOChannel(Object):
         The read queue is only used if either readline() or the readline signal
         is.
         """
-        return self._read_queue.tell()
+        return len(self._read_queue)
 
     @property
     def delimiter(self):
@@ -410,9 +768,11 @@ class IOChannel(Object):
         self._delimiter = value
         if isinstance(value, (UNICODE_TYPE, BYTES_TYPE)):
             self._delimiter_encoded = py3_b(value)
+            self._delimiter_overlap = len(self._delimiter_encoded) - 1
         elif isinstance(value, (list, tuple)):
             regexp = bl('|').join(py3_b(x) for x in value)
             self._delimiter_encoded = re.compile(regexp)
+            self._delimiter_overlap = max(len(py3_b(x)) for x in value) - 1
         else:
             raise ValueError('delimiter must be a string, bytes, or sequence of strings or bytes')
 
@@ -481,10 +841,8 @@ class IOChannel(Object):
             # First signal connected to the global read.  If there is anything
             # in the read queue (data accumulated from a readline) emit it
             # now.
-            #
-            # FIXME: corner case: if the callback is removed and readded, the
-            # same data could get emitted.
-            data = self._read_queue.getvalue()
+            with self._read_queue_lock:
+                data = self._read_queue.pop()
             if data:
                 self.signals['read'].emit(data)
         if not (self._mode & IO_READ) or not self._rmon:
@@ -585,23 +943,7 @@ class IOChannel(Object):
 
     def _clear_read_queue(self):
         with self._read_queue_lock:
-            self._read_queue.seek(0)
-            self._read_queue.truncate()
-
-
-    def _find_delim(self, buf, start=0):
-        """
-        Returns the position in the buffer where the first delimiter is found.
-        The index position includes the delimiter.  If the delimiter is not
-        found, None is returned.
-        """
-        if type(self._delimiter_encoded) == BYTES_TYPE:
-            idx = buf.find(self._delimiter_encoded, start)
-            return idx + len(self._delimiter_encoded) if idx >= 0 else None
-
-        # Delimiter is a list, so find any one of them.
-        m = self._delimiter_encoded.search(buf, start)
-        return m.end() if m else None
+            self._read_queue.clear(release=True)
 
 
     def _pop_line_from_read_queue(self):
@@ -610,21 +952,17 @@ class IOChannel(Object):
         is not found in the queue, returns None.
         """
         with self._read_queue_lock:
-            s = self._read_queue.getvalue()
-            idx = self._find_delim(s)
+            queue = self._read_queue
+            idx = queue.find(self._delimiter_encoded, self._delimiter_overlap)
             if idx is None:
-                if (not self._channel or self._eof) and s:
+                if (not self._channel or self._eof) and len(queue):
                     # Channel is closed or EOF and there's data left in the read
                     # queue. Just return what's left.
-                    self._clear_read_queue()
-                    return s
+                    return queue.pop()
                 else:
                     # Wait for more data that contains the delimiter
                     return
-
-            self._clear_read_queue()
-            self._read_queue.write(s[idx:])
-            return s[:idx]
+            return queue.pop(idx)
 
 
     def _abort_read_inprogress(self, exc, signal, ip):
@@ -643,7 +981,7 @@ class IOChannel(Object):
         elif not self.readable:
             # channel is not readable.  Return an InProgress pre-finished
             # with None
-            return InProgress().finish(None)
+            return finished(None)
 
         ip = inprogress(signal)
         # If this InProgress is aborted, we need to disconnect it from the
@@ -679,10 +1017,8 @@ class IOChannel(Object):
 
         """
         with self._read_queue_lock:
-            if self._read_queue.tell() > 0:
-                s = self._read_queue.getvalue()
-                self._clear_read_queue()
-                return InProgress().finish(s)
+            if len(self._read_queue) > 0:
+                return finished(self._read_queue.pop())
 
         return self._async_read(self._read_signal)
 
@@ -717,7 +1053,7 @@ class IOChannel(Object):
 
         line = self._pop_line_from_read_queue()
         if line:
-            return InProgress().finish(line)
+            return finished(line)
         return self._async_read(self._readline_signal)
 
 
@@ -733,6 +1069,21 @@ class IOChannel(Object):
             return os.read(self.fileno, size)
 
 
+    def _read_into(self, queue, size):
+        """
+        Low-level call to read at most size bytes from the channel into the
+        given read queue.  Must return the number of bytes read, which is 0
+        if no data is available.  The default implementation uses _read(),
+        and subclasses able to read into a buffer may override it to read
+        into the memory returned by queue.reserve() instead.
+        """
+        data = self._read(size)
+        if not data:
+            return 0
+        queue.write(data)
+        return len(data)
+
+
     def _handle_read(self):
         """
         IOMonitor callback when there is data to be read from the channel.
@@ -742,8 +1093,19 @@ class IOChannel(Object):
         read() or readline()).  This is necessary for flow control.
         """
         exc = None
+        # If the data is only wanted line by line, it is read straight into
+        # the read queue.
+        direct = not self._is_read_connected()
         try:
-            data = self._read(self._chunk_size)
+            if direct:
+                with self._read_queue_lock:
+                    # The queue only needs to grow beyond 64k for long lines.
+                    size = min(self._chunk_size, max(65536, len(self._read_queue)))
+                    eof = self._read_into(self._read_queue, size) == 0
+                data = None
+            else:
+                data = self._read(self._chunk_size)
+                eof = not data
         except (IOError, socket.error) as e:
             exc = sys.exc_info()
             if len(e.args) != 2:
@@ -758,15 +1120,13 @@ class IOChannel(Object):
                 return
             # If we're here, then the socket is likely disconnected.
             log.exception('some error')
-            data = ''
+            data, eof = '', True
         except Exception:
             exc = sys.exc_info()
             log.exception('%s._handle_read failed, closing socket', self.__class__.__name__)
-            data = ''
-
-        #log.debug2('IOChannel read data: channel=%s fd=%s len=%d', self._channel, self.fileno, len(data))
+            data, eof = '', True
 
-        if not data:
+        if eof:
             self._eof = True
             if self._close_on_eof:
                 # No data, channel is closed.  IOChannel.close will emit signals
@@ -784,20 +1144,16 @@ class IOChannel(Object):
             self.signals['read'].emit(data)
 
         with self._read_queue_lock:
+            queue = self._read_queue
             if len(self._readline_signal):
                 # Handle a readline() call
-                if self.read_queue_used + len(data) > self._queue_size:
-                    # This data chunk would exceed the read queue limit.  We
-                    # instead emit whatever's in the read queue, and then start
-                    # it over with this chunk.
-                    # TODO: it's possible this chunk contains the delimiter we've
-                    # been waiting for.  If so, we could salvage things.
-                    line = self._read_queue.getvalue()
-                    self._clear_read_queue()
-                    self._read_queue.write(data)
-                else:
-                    self._read_queue.write(data)
-                    line = self._pop_line_from_read_queue()
+                if data:
+                    queue.write(data)
+                line = self._pop_line_from_read_queue()
+                if line is None and len(queue) > self._queue_size:
+                    # The read queue limit is exceeded without a delimiter.
+                    # We instead emit whatever's in the read queue.
+                    line = queue.pop()
 
                 if line is not None:
                     self._readline_signal.emit(line)
@@ -808,24 +1164,12 @@ class IOChannel(Object):
                         # EOF with a readline() waiting.  Send it the empty string.
                         self._readline_signal.emit('')
             elif len(self.signals['readline']):
-                # Handle global readline signal by looping through read queue and
-                # emit all lines individually.
-                queue = self._read_queue.getvalue() + data
-                self._clear_read_queue()
-
-                lines, last, idx = [], 0, self._find_delim(queue)
-                while True:
-                    # If idx is None, it will slice to the end.
-                    lines.append(queue[last:idx])
-                    if idx is None:
-                        break
-                    last = idx
-                    idx = self._find_delim(queue, last)
-
-                if self._find_delim(lines[-1]) is None:
-                    # Queue did not end with delimiter, so push the remainder back.
-                    self._read_queue.write(lines.pop())
-
+                # Handle global readline signal by emitting all lines in the
+                # read queue individually.  The remainder stays queued, and
+                # the next search continues where this one stopped.
+                if data:
+                    queue.write(data)
+                lines = queue.pop_lines(self._delimiter_encoded, self._delimiter_overlap)
                 for line in lines:
                     self.signals['readline'].emit(line)
 
@@ -841,25 +1185,107 @@ class IOChannel(Object):
     def _write(self, data):
         """
         Low-level call to write to the channel  Can be overridden by subclasses.
-        Must return number of bytes written to the channel.
+        Must return number of bytes written to the channel.  The data may
+        be a memoryview.
         """
         return os.write(self.fileno, data)
 
 
+    def _writev(self, buffers):
+        """
+        Low-level call to write a list of buffers to the channel in order.
+        Must return the number of bytes written to the channel.
+
+        os.writev() is used where available, unless a subclass overrides
+        _write().  Otherwise, small buffers are joined and written with a
+        single _write().
+        """
+        if len(buffers) == 1:
+            return self._write(buffers[0])
+        if hasattr(os, 'writev') and type(self)._write == IOChannel._write:
+            return os.writev(self.fileno, buffers)
+        data = bytearray()
+        for buf in buffers:
+            if data and len(data) + len(buf) > 65536:
+                break
+            data += buf
+        return self._write(bytes(data))
+
+
+    def _sendfile(self, fd, offset, count):
+        """
+        Low-level call to write count bytes from the given file descriptor,
+        starting at offset, to the channel without passing through Python.
+        Must return the number of bytes written, or None if the channel
+        doesn't support this, in which case the data is read from the file
+        and written with _write().
+        """
+        if not hasattr(os, 'sendfile') or type(self)._write != IOChannel._write:
+            return None
+        return os.sendfile(self.fileno, fd, offset, count)
+
+
+    def _write_from_file(self, entry):
+        """
+        Writes the next chunk of the given queued file to the channel.
+        Returns a (attempted, written) tuple of byte counts.
+        """
+        size = self._chunk_size
+        if entry.remaining is not None:
+            size = min(size, entry.remaining)
+        if entry.sendfile and not entry.data:
+            try:
+                sent = self._sendfile(entry.fd, entry.offset, size)
+            except (OSError, IOError), e:
+                # EINVAL or ENOSYS if the file or channel don't support it.
+                if e.args[0] not in (errno.EINVAL, errno.ENOSYS):
+                    raise
+                sent = None
+            if sent is not None:
+                if sent == 0:
+                    entry.eof = True
+                return size, sent
+            entry.sendfile = False
+
+        if not entry.data:
+            data = entry.read(size)
+            if not data:
+                entry.eof = True
+                return 0, 0
+            entry.data = memoryview(data)
+        size = len(entry.data)
+        sent = max(self._write(entry.data) or 0, 0)
+        entry.data = entry.data[sent:]
+        return size, sent
+
+
     def _abort_write_inprogress(self, exc, data, ip):
+        queue = self._write_queue
+        if queue and queue[0][1] is ip and \
+           (queue.offset or (isinstance(data, _FileWrite) and data.written)):
+            # Partially written already, too late to abort.
+            return False
         try:
             self._write_queue.remove((data, ip))
         except ValueError:
-            # Too late to abort.
-            return False
+            try:
+                self._write_held.remove((data, ip))
+            except ValueError:
+                # Too late to abort.
+                return False
 
 
-    def write(self, data):
+    def write(self, data, wait=False):
         """
         Writes the given data to the channel.
 
         :param data: the data to be written to the channel.
         :type data: string
+        :param wait: if True and the write queue is above the high
+                     :attr:`watermark <write_watermarks>`, the data is held
+                     back until the queue has drained to the low watermark,
+                     rather than being queued right away.
+        :type wait: bool
 
         :returns: An :class:`~kaa.InProgress` object which is finished when the
                   given data is fully written to the channel.  The InProgress
@@ -874,8 +1300,11 @@ class IOChannel(Object):
         Written data is queued until the channel open and then flushed.  As
         writes are asynchronous, all written data is queued.  It is the
         caller's responsibility to ensure the internal write queue does not
-        exceed the desired size by waiting for past write() InProgress to
-        finish before writing more data.
+        exceed the desired size, either by waiting for the
+        :attr:`~kaa.IOChannel.signals.writable` signal once the queue is above
+        the high watermark, or by passing ``wait=True``.  Held back data
+        doesn't count towards :attr:`queue_size`, and any writes following it
+        are held back as well to keep them in order.
 
         If a write does not complete because the channel was closed
         prematurely, an IOError is thrown to the InProgress.
@@ -884,9 +1313,9 @@ class IOChannel(Object):
             raise IOError(errno.EBADF, 'I/O operation on closed file')
         elif not (self._mode & IO_WRITE):
             raise IOError(9, 'Cannot write to a read-only channel')
-        elif not self.writable:
+        elif not wait and not self.writable:
             raise IOError(9, 'Channel is not writable')
-        elif self.write_queue_used + len(data) > self._queue_size:
+        elif not wait and self.write_queue_used + len(data) > self._queue_size:
             raise ValueError('Data would exceed write queue limit')
         elif not isinstance(data, BYTES_TYPE):
             raise ValueError('data must be bytes, not unicode')
@@ -894,9 +1323,10 @@ class IOChannel(Object):
         ip = InProgress()
         if data:
             ip.signals['abort'].connect(self._abort_write_inprogress, data, ip)
-            self._write_queue.append((data, ip))
-            if self._channel and self._wmon and not self._wmon.active:
-                self._wmon.register(self.fileno, IO_WRITE)
+            if self._write_held or (wait and self._write_paused):
+                self._write_held.append((data, ip))
+            else:
+                self._queue_write(data, ip)
         else:
             # We're writing the null string, nothing really to do.  We're
             # implicitly done.
@@ -904,50 +1334,115 @@ class IOChannel(Object):
         return ip
 
 
+    def write_file(self, fileobj, offset=None, count=None):
+        """
+        Writes the contents of a file to the channel.
+
+        :param fileobj: the file to write, which must be seekable.
+        :type fileobj: file object or file descriptor
+        :param offset: the position in the file to start from, or None to
+                       start from the current position.
+        :type offset: int
+        :param count: the number of bytes to write, or None to write up to
+                      the end of the file.
+        :type count: int
+
+        :returns: An :class:`~kaa.InProgress` object which is finished with
+                  the number of bytes written when done, which is less than
+                  count if the end of the file was reached first.  Its
+                  ``progress`` attribute is an :class:`~kaa.InProgressStatus`
+                  updated as the data is written.
+
+        Like data passed to :meth:`write`, the file is written in order with
+        other writes.  Where the OS and the channel support it, the data is
+        sent with ``sendfile()`` without being read into memory, and it
+        doesn't count towards :attr:`queue_size`.  Otherwise it is read and
+        written in chunks of :attr:`chunk_size` bytes.
+
+        The file must be kept open until the InProgress is finished.  Its
+        position is not changed.
+        """
+        if not self._channel:
+            raise IOError(errno.EBADF, 'I/O operation on closed file')
+        elif not (self._mode & IO_WRITE):
+            raise IOError(9, 'Cannot write to a read-only channel')
+        elif not self.writable:
+            raise IOError(9, 'Channel is not writable')
+
+        fd = fileobj if isinstance(fileobj, int) else fileobj.fileno()
+        if offset is None:
+            offset = fileobj.tell() if hasattr(fileobj, 'tell') else os.lseek(fd, 0, os.SEEK_CUR)
+        size = max(os.fstat(fd).st_size - offset, 0)
+
+        ip = InProgress()
+        ip.progress = InProgressStatus(size if count is None else count)
+        if count == 0:
+            ip.finish(0)
+            return ip
+        entry = _FileWrite(fd, offset, count, ip.progress)
+        ip.signals['abort'].connect(self._abort_write_inprogress, entry, ip)
+        if self._write_held:
+            self._write_held.append((entry, ip))
+        else:
+            self._queue_write(entry, ip)
+        return ip
+
+
+    def _queue_write(self, data, ip):
+        """
+        Appends to the write queue and makes sure it is being flushed.
+        """
+        self._write_queue.append((data, ip))
+        if self._write_queue.used > self._write_watermarks[0]:
+            self._write_paused = True
+        if self._channel and self._wmon and not self._wmon.active:
+            self._wmon.register(self.fileno, IO_WRITE)
+
+
+    def _resume_writes(self):
+        """
+        Called when the write queue has drained to the low watermark.  Queues
+        held back writes up to the high watermark, and emits the writable
+        signal if the queue is still below it.
+        """
+        if not self._write_paused:
+            return
+        self._write_paused = False
+        while self._write_held and not self._write_paused:
+            data, ip = self._write_held.popleft()
+            self._queue_write(data, ip)
+        if not self._write_paused:
+            self.signals['writable'].emit()
+
+
     def _handle_write(self):
         """
         IOMonitor callback when the channel is writable.  This callback is not
         registered then the write queue is empty, so we only get called when
         there is something to write.
         """
-        if not self._write_queue:
-            # Can happen if a write was aborted.
-            return
-
-        try:
-            while self._write_queue:
-                data, inprogress = self._write_queue.pop(0)
-                sent = self._write(data)
-                log.debug2('IOChannel write data: channel=%s fd=%s len=%d (of %d)',
-                           self._channel, self.fileno, sent, len(data))
-                if sent != len(data):
-                    # Not all data was able to be sent; push remaining data
-                    # back onto the write buffer.
-                    self._write_queue.insert(0, (data[(sent if sent >= 0 else 0):], inprogress))
-                    break
+        while self._write_queue:
+            queue = self._write_queue
+            entry = queue[0][0]
+            try:
+                if isinstance(entry, _FileWrite):
+                    size, sent = self._write_from_file(entry)
                 else:
-                    # All data is written, finish the InProgress associated
-                    # with this write.
-                    inprogress.finish(sent)
-
-            if not self._write_queue:
-                if self._queue_close:
-                    return self.close(immediate=True)
-                self._wmon.unregister()
-
-        except Exception, e:
-            tp, exc, tb = sys.exc_info()
-            if tp in (OSError, IOError, socket.error):
-                if e.args[0] == 11:
-                    # Resource temporarily unavailable -- we are trying to write
-                    # data to a socket which is not ready.  To prevent a busy loop
-                    # (mainloop will keep calling us back) we sleep a tiny
-                    # bit.  It's admittedly a bit kludgy, but it's a simple
-                    # solution to a condition which should not occur often.
-                    self._write_queue.insert(0, (data, inprogress))
-                    time.sleep(0.001)
+                    buffers = queue.buffers(self._chunk_size)
+                    size = sum(len(buf) for buf in buffers)
+                    sent = max(self._writev(buffers) or 0, 0)
+            except Exception, e:
+                tp, exc, tb = sys.exc_info()
+                if tp in (OSError, IOError, socket.error) and e.args[0] == errno.EAGAIN:
+                    # Resource temporarily unavailable -- the channel is not
+                    # ready after all.  The write monitor stays registered, so
+                    # we get called again once it is.
                     return
-                else:
+
+                # The data at the head of the queue is dropped and the
+                # exception goes to its InProgress.
+                data, inprogress = queue.popleft()
+                if tp in (OSError, IOError, socket.error):
                     if self._close_on_eof:
                         # Close, which also throws to any other pending
                         # InProgress writes.
@@ -955,14 +1450,47 @@ class IOChannel(Object):
                     # Normalize exception into an IOError.
                     tp, exc = IOError, IOError(*e.args)
 
-            # Throw the current exception to the InProgress for this write.
-            # If nobody is listening for it, it will eventually get logged
-            # as unhandled.
-            inprogress.throw(tp, exc, tb)
+                # Throw the current exception to the InProgress for this write.
+                # If nobody is listening for it, it will eventually get logged
+                # as unhandled.
+                inprogress.throw(tp, exc, tb)
 
-            # XXX: this seems to be necessary in order to get the unhandled
-            # InProgress to log, but I've no idea why.
-            del inprogress
+                # XXX: this seems to be necessary in order to get the unhandled
+                # InProgress to log, but I've no idea why.
+                del inprogress
+                return
+
+            log.debug2('IOChannel write data: channel=%s fd=%s len=%d (of %d)',
+                       self._channel, self.fileno, sent, size)
+
+            blocked = sent < size
+            if isinstance(entry, _FileWrite):
+                entry.advance(sent)
+                if entry.done:
+                    # Less than attempted if at the end of the file.
+                    blocked = False
+                    data, inprogress = queue.popleft()
+                    inprogress.finish(entry.written)
+            else:
+                # All data fully written is removed from the queue before the
+                # InProgress objects are finished, as their callbacks may write
+                # more or close the channel.
+                for inprogress, nbytes in queue.consume(sent):
+                    inprogress.finish(nbytes)
+
+            if self._write_paused and self._write_queue.used <= self._write_watermarks[1]:
+                self._resume_writes()
+            if blocked or not self._channel:
+                # Channel can't take more for now, or a callback closed it.
+                break
+
+        if not self._write_queue and self._wmon:
+            self.signals['drained'].emit()
+        # Callbacks may have written more or closed the channel.
+        if not self._write_queue and self._wmon:
+            if self._queue_close:
+                return self.close(immediate=True)
+            self._wmon.unregister()
 
 
     def _close(self):
@@ -1021,20 +1549,24 @@ class IOChannel(Object):
         # is left in the read queue.
         with self._read_queue_lock:
             if len(self._read_signal):
-                s = self._read_queue.getvalue()
-                self._read_signal.emit(s)
+                self._read_signal.emit(self._read_queue.pop())
             if len(self._readline_signal):
                 line = self._pop_line_from_read_queue()
-                if line:
-                    self._readline_signal.emit(line)
+                if line is None:
+                    # No delimiter, so this is whatever is left, possibly
+                    # nothing.
+                    line = self._read_queue.pop()
+                self._readline_signal.emit(line)
 
         # Throw IOError to any pending InProgress in the write queue
-        for data, inprogress in self._write_queue:
+        for data, inprogress in itertools.chain(self._write_queue, self._write_held):
             if len(inprogress):
                 # Somebody cares about this InProgress, so we need to finish
                 # it.
                 inprogress.throw(IOError, IOError(9, 'Channel closed prematurely'), None)
-        del self._write_queue[:]
+        self._write_queue.clear()
+        self._write_held.clear()
+        self._write_paused = False
 
         try:
             self._close()
@@ -1091,6 +1623,9 @@ class IOChannel(Object):
 
         self._delimiter = channel.delimiter
         self._write_queue = channel._write_queue
+        self._write_held = channel._write_held
+        self._write_paused = channel._write_paused
+        self._write_watermarks = channel._write_watermarks
         self._read_queue = channel._read_queue
         self._queue_size = channel._queue_size
         self._chunk_size = channel._chunk_size
@@ -1098,8 +1633,10 @@ class IOChannel(Object):
 
         # Generate new queues on the channel object whose fd we are stealing, since
         # we stole its queues too.
-        channel._write_queue = []
-        channel._read_queue = BytesIO()
+        channel._write_queue = _WriteQueue()
+        channel._write_held = collections.deque()
+        channel._write_paused = False
+        channel._read_queue = _ReadQueue()
         channel._channel = None
 
         def clone(src, dst):
@@ -32,7 +32,7 @@ from __future__ import absolute_import
 
 __all__ = [ 'run', 'stop', 'step', 'select_notifier', 'is_running', 'wakeup',
             'set_as_mainthread', 'is_shutting_down', 'loop', 'signals', 'init',
-            'is_initialized' ]
+            'is_initialized', 'enable_stats', 'get_stats' ]
 
 # python imports
 import sys
@@ -45,6 +45,7 @@ import atexit
 
 from . import nf_wrapper as notifier
 from .core import Signals, CoreThreading
+from .coroutine import CoroutineScheduler, enable_coroutine_stats
 from . import timer
 from . import thread
 
@@ -94,6 +95,15 @@ def init(module=None, reset=False, **options):
     :param module: the main loop implementation to use.
 
                    * ``generic``: Native python-based main loop (default),
+                   * ``epoll``: generic main loop using Linux epoll(7) instead
+                     of select(2), which scales to many thousands of file
+                     descriptors (falls back to ``poll`` if unavailable);
+                   * ``poll``: generic main loop using poll(2), which is not
+                     limited to FD_SETSIZE descriptors;
+                   * ``asyncio``: run on an asyncio event loop, which is
+                     shared with asyncio code (the ``loop`` kwarg selects
+                     the loop, default is the current event loop); see
+                     :mod:`kaa.asyncio`;
                    * ``gtk``: use pygtk's main loop (automatically selected if
                      the gtk module is imported);
                    * ``twisted``: Twisted main loop;
@@ -148,6 +158,9 @@ def init(module=None, reset=False, **options):
     CoreThreading.init(signals, reset)
     if os.environ.get('KAA_DEBUG', ''):
         debug.init()
+    if os.environ.get('KAA_STATS', ''):
+        enable_stats()
+        enable_coroutine_stats()
     signals['init'].emit()
     _initialized = True
 
@@ -181,6 +194,11 @@ def loop(condition, timeout=None):
         initial_mainloop = False
         if not _initialized:
             init()
+        if not notifier.step_nestable():
+            # Fail now rather than in every step, which would spin forever if
+            # an exception handler keeps the loop alive.
+            raise RuntimeError('the %s main loop is not reentrant; yield the InProgress from a '
+                               'coroutine instead of calling wait() in callbacks' % notifier.loaded)
         if not is_running():
             # no mainloop is running, set this thread as mainloop and
             # set the internal running state.
@@ -200,6 +218,9 @@ def loop(condition, timeout=None):
         timeout = timer.OneShotTimer(lambda: abort.append(True))
         timeout.start(sec)
 
+    # We may be called from within a coroutine (e.g. by InProgress.wait()),
+    # whose step won't return before this loop does.
+    state = CoroutineScheduler._enter_loop()
     try:
         while condition() and not abort:
             try:
@@ -213,6 +234,7 @@ def loop(condition, timeout=None):
                     type, value, tb = sys.exc_info()
                     raise type, value, tb
     finally:
+        CoroutineScheduler._leave_loop(state)
         # make sure we set mainloop status
         if timeout is not None:
             timeout.stop()
@@ -392,10 +414,60 @@ def step(*args, **kwargs):
         # Sleep for epsilon to prevent busy loops.
         time.sleep(0.001)
         return
-    notifier.step(*args, **kwargs)
+    state = CoroutineScheduler._enter_loop()
+    try:
+        notifier.step(*args, **kwargs)
+    finally:
+        CoroutineScheduler._leave_loop(state)
     signals['step'].emit()
 
 
+def enable_stats(enabled=True):
+    """
+    Enables or disables the main loop instrumentation.
+
+    While enabled, the main loop records the timer lag (the delay between
+    the scheduled and the actual expiration of timers), the time spent
+    waiting for events, and the wall time of :class:`~kaa.IOMonitor`,
+    :class:`~kaa.Timer` and main thread callbacks queued by other threads.
+    Use :func:`get_stats` to fetch the results.
+
+    The instrumentation is also enabled if the ``KAA_STATS`` environment
+    variable is set, and it can be controlled by ``kaa-debugger`` if
+    ``KAA_DEBUG`` is set.  When disabled, it adds next to no overhead.
+
+    :param enabled: True to enable the instrumentation, False to disable it
+                    and discard the collected samples.
+    """
+    notifier.set_stats(enabled)
+
+
+def get_stats(reset=False):
+    """
+    Returns the histograms collected by the main loop instrumentation.
+
+    :param reset: if True, the collected samples are discarded afterwards.
+    :return: None if the instrumentation is disabled, otherwise a dict
+             mapping ``lag``, ``select``, ``io``, ``timer`` and ``queue``
+             to dicts with the keys ``count``, ``total``, ``mean``, ``max``,
+             ``max_label`` (the slowest callback), ``p50``, ``p90``, ``p99``
+             and ``buckets`` (a list of (upper bound, count) tuples).  All
+             durations are in seconds.
+
+    Not all notifiers support all histograms.  The time spent waiting for
+    events is only recorded by the generic notifiers, the timer lag by the
+    generic and asyncio notifiers.
+    """
+    stats = notifier.stats
+    if stats is None:
+        return None
+    result = dict((name, histogram.summary()) for name, histogram in stats.items())
+    if reset:
+        notifier.set_stats(False)
+        notifier.set_stats(True)
+    return result
+
+
 def is_initialized():
     """
     Return True if init() was called.
@@ -40,6 +40,7 @@ except ImportError:
 
 # kaa imports
 import kaa
+from ...io import _WriteQueue
 from .common import TLSError, TLSProtocolError, TLSVerificationError, TLSSocketBase
 
 # get logging object
@@ -166,7 +167,7 @@ class TLSLiteSocket(TLSSocketBase):
         self._handshake = True
         # Store current write queue and create a new one
         self._pre_handshake_write_queue = self._write_queue
-        self._write_queue = []
+        self._write_queue = _WriteQueue()
         if self._pre_handshake_write_queue:
             # flush pre handshake write data
             yield self._pre_handshake_write_queue[-1][1]
@@ -27,6 +27,7 @@ from __future__ import absolute_import
 # Python imports
 import logging
 import sys
+import time
 import atexit
 
 # notifier import
@@ -48,7 +49,133 @@ _python_shutting_down = False
 # been called yet.
 loaded = None
 
+# LoopStats object collecting timing samples while instrumentation is enabled
+# (see set_stats()), otherwise None.  Instrumented code paths only test this
+# for None when instrumentation is disabled.
+stats = None
+
+
+class Histogram(object):
+    """
+    Histogram of durations with logarithmic buckets.  Bucket n counts
+    durations of less than 2**n microseconds (and at least 2**(n-1)).
+    """
+    BUCKETS = 32
+
+    def __init__(self):
+        self.buckets = [0] * Histogram.BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.max_label = None
+
+
+    def add(self, seconds, label=None):
+        """
+        Adds a sample.  The label is a callable returning a description of
+        the sample, which is only invoked if the sample is the new maximum.
+        """
+        usec = int(seconds * 1000000)
+        if usec > 0:
+            self.buckets[min(usec.bit_length(), Histogram.BUCKETS - 1)] += 1
+        else:
+            self.buckets[0] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+            self.max_label = label() if label else None
+
+
+    def percentile(self, percent):
+        """
+        Returns the upper bound in seconds of the bucket containing the given
+        percentile, or 0 if there are no samples.
+        """
+        if not self.count:
+            return 0
+        remaining = self.count * percent / 100.0
+        for n, count in enumerate(self.buckets):
+            remaining -= count
+            if remaining <= 0:
+                break
+        return min((1 << n) / 1000000.0, self.max)
+
+
+    def summary(self):
+        """
+        Returns a dict with count, total, mean, max, max_label, the 50th, 90th
+        and 99th percentile (p50, p90, p99) and the non-empty buckets as a
+        list of (upper bound in seconds, count) tuples.
+        """
+        return {
+            'count': self.count,
+            'total': self.total,
+            'mean': self.total / self.count if self.count else 0,
+            'max': self.max,
+            'max_label': self.max_label,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'buckets': [((1 << n) / 1000000.0, count) for n, count in enumerate(self.buckets) if count]
+        }
+
+
+
+class LoopStats(dict):
+    """
+    Dict of histograms for the instrumented main loop activities:
+
+        * lag: delay between scheduled and actual expiration of timers
+        * select: time spent waiting for events
+        * io: wall time of IOMonitor callbacks
+        * timer: wall time of Timer callbacks
+        * queue: wall time of callbacks queued by other threads
+    """
+    def __init__(self):
+        super(LoopStats, self).__init__()
+        for name in ('lag', 'select', 'io', 'timer', 'queue'):
+            self[name] = Histogram()
+
+
+    def add(self, name, seconds, label=None):
+        self[name].add(max(seconds, 0), label)
+
+
+
+def callback_label(func):
+    """
+    Returns a label for the given callback function used for histogram maxima.
+    """
+    if isinstance(getattr(func, 'im_self', None), Callable):
+        # bound method of a Callable, e.g. queued by MainThreadCallable
+        func = func.im_self
+    if isinstance(func, Callable):
+        func = func._get_func()
+    func = getattr(func, 'im_func', func)
+    code = getattr(func, 'func_code', None)
+    if code is None:
+        return repr(func)
+    return '%s() at %s:%d' % (func.__name__, code.co_filename, code.co_firstlineno)
+
+
+def set_stats(enabled):
+    """
+    Enables or disables the main loop instrumentation.  Enabling it while it
+    is already enabled keeps the collected samples.
+    """
+    global stats
+    if enabled and stats is None:
+        stats = LoopStats()
+    elif not enabled:
+        stats = None
+    if nf_stats_set:
+        nf_stats_set(stats)
+
+
 class NotifierCallback(Callable):
+    # Name of the histogram the wall time of the callback is added to.
+    _stats_name = None
 
     def __init__(self, callback, *args, **kwargs):
         super(NotifierCallback, self).__init__(callback, *args, **kwargs)
@@ -77,7 +204,14 @@ class NotifierCallback(Callable):
             return False
 
         try:
-            ret = super(NotifierCallback, self).__call__(*args, **kwargs)
+            if stats is None or not self._stats_name:
+                ret = super(NotifierCallback, self).__call__(*args, **kwargs)
+            else:
+                t0 = time.time()
+                try:
+                    ret = super(NotifierCallback, self).__call__(*args, **kwargs)
+                finally:
+                    stats.add(self._stats_name, time.time() - t0, lambda: callback_label(self._get_func()))
         except CallableError:
             # A WeakCallable that's no longer valid.  Unregister.
             ret = False
@@ -107,6 +241,8 @@ class _Wrapper(object):
 
 dispatcher_add = _Wrapper('dispatcher_add')
 dispatcher_remove = _Wrapper('dispatcher_remove')
+dispatcher_pending = _Wrapper('dispatcher_pending')
+dispatcher_set_wakeup = _Wrapper('dispatcher_set_wakeup')
 step = _Wrapper('step')
 timer_remove = _Wrapper('timer_remove')
 timer_add = _Wrapper('timer_add')
@@ -120,6 +256,28 @@ def shutdown():
 # socket wrapper
 
 nf_conditions = []
+nf_timer_wakeups_saved = None
+nf_stats_set = None
+nf_in_loop = None
+
+def step_nestable():
+    """
+    False if the notifier is executing a step that can't be nested, e.g.
+    because the asyncio loop is running the current callback.
+    """
+    return nf_in_loop is None or not nf_in_loop()
+
+
+def timer_wakeups_saved():
+    """
+    Number of main loop wakeups saved by coalescing timers that were started
+    with slack.  Always 0 if the notifier does not coalesce timers.
+    """
+    if nf_timer_wakeups_saved is None:
+        return 0
+    return nf_timer_wakeups_saved()
+
+
 def _socket_add(id, method, condition = 0):
     return nf_socket_add(id, method, nf_conditions[condition])
 
@@ -135,10 +293,15 @@ def init( module = None, force_internal=False, **options ):
     global timer_remove
     global socket_remove
     global dispatcher_remove
+    global dispatcher_pending
+    global dispatcher_set_wakeup
     global step
     global nf_socket_remove
     global nf_socket_add
     global nf_conditions
+    global nf_timer_wakeups_saved
+    global nf_stats_set
+    global nf_in_loop
     global shutdown
     global loaded
 
@@ -150,8 +313,9 @@ def init( module = None, force_internal=False, **options ):
         options['recursive_depth'] = 5
 
     try:
-        if force_internal:
-            # pynotifier is not allowed
+        if force_internal or module in ('poll', 'epoll', 'asyncio'):
+            # pynotifier is not allowed, or the requested notifier is only
+            # supported by our copy of pynotifier
             raise ImportError()
         import notifier
         if notifier.loop:
@@ -169,7 +333,7 @@ def init( module = None, force_internal=False, **options ):
             module = 'gtk'
             log.info('Implicitly using gtk integration for the notifier')
 
-    if not module in ('generic', 'gtk', 'twisted_experimental'):
+    if not module in ('generic', 'poll', 'epoll', 'asyncio', 'gtk', 'twisted_experimental'):
         raise AttributeError('unsupported notifier %s' % module)
 
     if module == 'twisted_experimental':
@@ -185,6 +349,15 @@ def init( module = None, force_internal=False, **options ):
 
     timer_remove = notifier.timer_remove
     timer_add = notifier.timer_add
+    nf_timer_wakeups_saved = getattr(notifier, 'timer_wakeups_saved', None)
+    if not hasattr(notifier, 'timer_wakeups_saved'):
+        # A system-wide pynotifier does not know about timer slack.
+        timer_add = lambda interval, method, slack=0: notifier.timer_add(interval, method)
+    nf_in_loop = getattr(notifier, 'in_loop', None)
+    nf_stats_set = getattr(notifier, 'stats_set', None)
+    if nf_stats_set and stats is not None:
+        # instrumentation was enabled before init()
+        nf_stats_set(stats)
 
     nf_socket_remove = notifier.socket_remove
     nf_socket_add = notifier.socket_add
@@ -194,6 +367,14 @@ def init( module = None, force_internal=False, **options ):
 
     dispatcher_add = notifier.dispatcher_add
     dispatcher_remove = notifier.dispatcher_remove
+    if hasattr(notifier, 'dispatcher_pending'):
+        dispatcher_pending = notifier.dispatcher_pending
+        dispatcher_set_wakeup = notifier.dispatcher_set_wakeup
+    else:
+        # A system-wide pynotifier only supports polled dispatchers.
+        dispatcher_add = lambda method, event_driven=False: notifier.dispatcher_add(method)
+        dispatcher_pending = lambda method: None
+        dispatcher_set_wakeup = lambda method: None
 
     step = notifier.step
 
@@ -202,6 +383,10 @@ def init( module = None, force_internal=False, **options ):
         from twisted.internet import reactor
         shutdown = reactor.stop
 
+    if module == 'asyncio':
+        # registers asyncio futures with coroutines, so they can be yielded
+        from .asyncio import from_future
+
     loaded = module
 
 
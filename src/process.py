@@ -44,7 +44,7 @@ from .callable import Callable, WeakCallable, CallableError
 from .core import Object, Signals
 from .timer import delay, timed, Timer, OneShotTimer, POLICY_ONCE
 from .thread import MainThreadCallable, threaded, MAINTHREAD
-from .async import InProgress, InProgressAny, InProgressAll, inprogress, FINISH_RESULT
+from .async import InProgress, InProgressAny, InProgressAll, inprogress, finished, FINISH_RESULT
 from .coroutine import coroutine, POLICY_SINGLETON
 from .io import IOChannel, IO_WRITE, IO_READ
 from . import main
@@ -714,7 +714,7 @@ class Process(Object):
         Common implementation for read() and readline().
         """
         if not self._stdout.readable and not self._stderr.readable:
-            return InProgress().finish(None)
+            return finished(None)
 
         # TODO: if child is dead, attach handler to this IP and if len data <
         # chunk size, can close the channel.  (What makes this more complicated
@@ -789,7 +789,7 @@ class Process(Object):
         return self._async_read(self._stdout.readline, self._stderr.readline)
 
 
-    def write(self, data):
+    def write(self, data, wait=False):
         """
         Write data to child's stdin.
         
@@ -798,6 +798,9 @@ class Process(Object):
 
         :param data: the data to be written to the channel.
         :type data: string
+        :param wait: hold back the data while the write queue is full, as
+                     described in :meth:`kaa.IOChannel.write`.
+        :type wait: bool
 
         :returns: An :class:`~kaa.InProgress` object, which is finished when the
                   data has actually been written to the child's stdin.
@@ -810,7 +813,7 @@ class Process(Object):
         """
         if not self._stdin.alive:
             raise IOError(9, 'Cannot write to closed child stdin')
-        return self._stdin.write(data)
+        return self._stdin.write(data, wait)
 
 
     @coroutine()
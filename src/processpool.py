@@ -0,0 +1,544 @@
+# -*- coding: iso-8859-1 -*-
+# -----------------------------------------------------------------------------
+# processpool.py - execute CPU bound functions in a pool of worker processes
+# -----------------------------------------------------------------------------
+# Functions decorated with @kaa.processed() are executed in persistent worker
+# processes.  Workers are kaa.Process objects (and therefore monitored by the
+# process supervisor), jobs and results are exchanged as pickles over the
+# workers' stdin and stdout.  Functions are referenced by module and name, so
+# only module level functions can be executed.
+#
+# -----------------------------------------------------------------------------
+# kaa.base - The Kaa Application Framework
+# Copyright 2012 Dirk Meyer, Jason Tackaberry, et al.
+#
+# Please see the file AUTHORS for a complete list of authors.
+#
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License version
+# 2.1 as published by the Free Software Foundation.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301 USA
+#
+# -----------------------------------------------------------------------------
+from __future__ import absolute_import
+
+__all__ = [
+    'ProcessPool', 'ProcessInProgress', 'ProcessException', 'processed',
+    'register_process_pool', 'get_process_pool'
+]
+
+# python imports
+import sys
+import os
+import struct
+import signal
+import heapq
+import itertools
+import logging
+import traceback
+import cPickle
+try:
+    from io import BytesIO
+except ImportError:
+    from cStringIO import StringIO as BytesIO
+
+# kaa imports
+from .errors import AsyncExceptionBase, make_exception_class
+from .utils import wraps, property
+from .async import InProgress
+from .process import Process
+from .io import _ReadQueue
+from . import main
+
+# get logging object
+log = logging.getLogger('kaa.base.processpool')
+
+# Process pool name -> ProcessPool object
+_process_pools = {}
+
+# Pool used by @kaa.processed() if no pool is given; created on first use.
+_default_pool = None
+
+# Header of jobs and results: payload size and job id
+_HEADER = struct.Struct('!II')
+
+# Command line argument for python -c to start a worker.  The worker gets the
+# same module search path as the parent.
+_BOOTSTRAP = 'import sys; sys.path[:0] = %r; from %s import _worker_main; _worker_main()'
+
+
+class ProcessException(AsyncExceptionBase):
+    """
+    Raised when a function executed in a worker process raises an exception.
+    Instances of this class inherit the actual exception class, and when
+    printed they include the traceback of the worker process.
+    """
+    __metaclass__ = make_exception_class
+    def _kaa_get_header(self):
+        return "Exception in process pool job '%s'; remote traceback follows:" % self._kaa_exc_args[0]
+
+
+def register_process_pool(name, pool):
+    """
+    Registers a :class:`~kaa.ProcessPool` under the given name.
+
+    :param name: the name under which to register this process pool
+    :type name: str
+    :param pool: the process pool object
+    :type pool: :class:`~kaa.ProcessPool`
+    :returns: the supplied :class:`~kaa.ProcessPool` object
+
+    Once registered, the process pool may be referenced by name when using the
+    :func:`@kaa.processed() <kaa.processed>` decorator.  The naming convention
+    is the same as for :func:`kaa.register_thread_pool`.
+    """
+    if name in _process_pools:
+        raise ValueError('A registered pool already exists with name "%s"' % name)
+    assert(isinstance(pool, ProcessPool))
+    _process_pools[name] = pool
+    pool._name = name
+    return pool
+
+
+def get_process_pool(name):
+    """
+    Returns the :class:`~kaa.ProcessPool` previously registered with the given
+    name, or None if no :class:`~kaa.ProcessPool` was registered with that name.
+    """
+    return _process_pools.get(name)
+
+
+def _cpu_count():
+    try:
+        return max(1, os.sysconf('SC_NPROCESSORS_ONLN'))
+    except (AttributeError, ValueError, OSError):
+        return 1
+
+
+def _resolve(module, name, mainfile):
+    """
+    Returns the function with the given name from the given module.  This
+    is called in the worker process.
+    """
+    if module == '__main__':
+        # The main script of the parent is loaded under its own name and
+        # installed as __main__, so objects defined in it can be unpickled.
+        mod = sys.modules.get('__kaa_processpool_main__')
+        if mod is None:
+            import imp
+            mod = imp.load_source('__kaa_processpool_main__', mainfile)
+            sys.modules['__main__'] = mod
+    else:
+        __import__(module)
+        mod = sys.modules[module]
+    func = getattr(mod, name)
+    # Undecorate @kaa.processed() functions
+    return getattr(func, 'origfunc', func)
+
+
+def _worker_main():
+    """
+    Main function of a worker process: reads jobs from stdin and writes the
+    results to stdout until stdin is closed.
+    """
+    # Keep the real stdout for results; anything the jobs print goes to stderr.
+    output = os.fdopen(os.dup(1), 'wb')
+    os.dup2(2, 1)
+    input = os.fdopen(os.dup(0), 'rb')
+    # SIGINT is sent to the whole process group when ctrl-c is pressed.  The
+    # parent stops the workers when it shuts down.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    while True:
+        header = input.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            break
+        size, job_id = _HEADER.unpack(header)
+        request = BytesIO(input.read(size))
+        try:
+            # The function is resolved before the arguments are unpickled,
+            # which may require the module defining it.
+            func = _resolve(*cPickle.load(request))
+            args, kwargs = cPickle.load(request)
+            payload = cPickle.dumps((True, func(*args, **kwargs)), cPickle.HIGHEST_PROTOCOL)
+        except Exception, e:
+            stack = traceback.extract_tb(sys.exc_info()[2])
+            try:
+                payload = cPickle.dumps((False, (e, stack)), cPickle.HIGHEST_PROTOCOL)
+            except Exception:
+                payload = cPickle.dumps((False, (Exception(str(e)), stack)), cPickle.HIGHEST_PROTOCOL)
+        output.write(_HEADER.pack(len(payload), job_id) + payload)
+        output.flush()
+
+
+class ProcessInProgress(InProgress):
+    """
+    An :class:`~kaa.InProgress` class that represents a job executed by a
+    :class:`~kaa.ProcessPool`.  ``ProcessInProgress`` objects are returned when
+    invoking functions decorated with :func:`@kaa.processed() <kaa.processed>`.
+
+    The job can be aborted with :meth:`~kaa.InProgress.abort`.  A job that is
+    still queued is simply removed from the queue; if it is already executing,
+    the worker process is killed and replaced.
+    """
+    def __init__(self, pool, name, request, priority):
+        super(ProcessInProgress, self).__init__(abortable=True)
+        self.priority = priority
+        self._pool = pool
+        # Function name for exceptions, and the pickled job.
+        self._name = name
+        self._request = request
+        # The worker executing the job, and the id of the job for the worker.
+        self._worker = None
+        self._id = None
+        self.signals['abort'].connect(lambda exc: self._pool._abort(self))
+
+
+    @property
+    def active(self):
+        """
+        True if the job is still waiting to be processed or being processed.
+        """
+        return self._request is not None
+
+
+class _ProcessPoolWorker(object):
+    """
+    Worker process of a process pool.  This class dips its fingers into
+    ProcessPool private members.
+    """
+    def __init__(self, pool, name):
+        self.pool = pool
+        self.name = name
+        self.job = None
+        self._read_queue = _ReadQueue()
+        cmd = [sys.executable, '-c', _BOOTSTRAP % (sys.path, __name__)]
+        self.process = Process(cmd)
+        self.process.stdout.signals['read'].connect(self._read)
+        self.process.stderr.signals['readline'].connect(self._log)
+        self.process.signals['exited'].connect(self._exited)
+        self.process.start()
+        log.debug('process pool member "%s" started, pid=%d', name, self.process.pid)
+
+
+    def run(self, job):
+        job._worker = self
+        self.job = job
+        self.process.write(_HEADER.pack(len(job._request), job._id) + job._request)
+
+
+    def stop(self):
+        """
+        Stop the worker process.  A job being executed is discarded.
+        """
+        self.job = None
+        if self.process.running:
+            self.process.stop()
+
+
+    def _log(self, line):
+        log.warning('[%s] %s', self.name, line.rstrip())
+
+
+    def _read(self, data):
+        queue = self._read_queue
+        queue.write(data)
+        while len(queue) >= _HEADER.size:
+            size, job_id = _HEADER.unpack_from(queue.peek(_HEADER.size))
+            if len(queue) < _HEADER.size + size:
+                # Make room for the rest of the result now, so that the
+                # queue doesn't need to grow repeatedly while it arrives.
+                queue.reserve(_HEADER.size + size - len(queue))
+                break
+            queue.skip(_HEADER.size)
+            payload = queue.pop(size)
+            if size > 65536 and not len(queue):
+                # Don't hold on to the memory needed for a large result.
+                queue.clear(release=True)
+            job, self.job = self.job, None
+            if job is not None and job._id == job_id:
+                self.pool._finished(self, job, payload)
+
+
+    def _exited(self, exitcode):
+        log.debug('process pool member "%s" exited with %s', self.name, exitcode)
+        job, self.job = self.job, None
+        self.pool._exited(self, job, exitcode)
+
+
+
+class ProcessPool(object):
+    """
+    Manages a pool of one or more worker processes for use with the
+    :func:`@kaa.processed() <kaa.processed>` decorator.
+
+    Worker processes are started on demand, up to the pool size, and are
+    kept running for subsequent jobs.  They are stopped when the main loop
+    shuts down.
+    """
+    def __init__(self, size=None):
+        """
+        :param size: maximum number of worker processes; defaults to the number
+                     of CPUs.
+        :type size: int
+        """
+        self._size = size or _cpu_count()
+        # List of _ProcessPoolWorker objects for this pool, and the subset of
+        # them that is waiting for a job.
+        self._members = []
+        self._idle = []
+        # Heap of (-priority, sequence, job).  Removed jobs remain in the
+        # heap until they are popped.
+        self._queue = []
+        self._sequence = itertools.count()
+        self._name = None
+
+
+    def __repr__(self):
+        if not self._name:
+            return '<Anonymous ProcessPool object at 0x%x>' % id(self)
+        else:
+            return '<ProcessPool "%s" object at 0x%x>' % (self._name, id(self))
+
+
+    def enqueue(self, func, args=(), kwargs={}, priority=0):
+        """
+        Creates a job for the given function and adds it to the work queue.
+
+        :param func: a module level function which will be invoked inside one
+                     of the worker processes.
+        :type func: callable
+        :param args: positional arguments for the function
+        :param kwargs: keyword arguments for the function
+        :param priority: determines the relative priority of the job; higher
+                         values are higher priority.
+        :type priority: int
+        :returns: a :class:`~kaa.ProcessInProgress` object for this job.
+
+        The function, its arguments and its return value must be picklable.
+        If the function is defined in the main script, the script is imported
+        by the worker processes, so it must not start the main loop unless
+        ``__name__ == '__main__'``.
+
+        It should generally not be necessary to call this method directly.
+        It is called implicitly when using the
+        :func:`@kaa.processed() <kaa.processed>` decorator.
+        """
+        module, name = func.__module__, func.__name__
+        target = getattr(sys.modules.get(module), name, None)
+        if target is not func and getattr(target, 'origfunc', None) is not func:
+            raise ValueError('%s is not a module level function' % func)
+        mainfile = None
+        if module == '__main__':
+            mainfile = os.path.abspath(sys.modules['__main__'].__file__)
+        request = cPickle.dumps((module, name, mainfile), cPickle.HIGHEST_PROTOCOL) + \
+                  cPickle.dumps((args, kwargs), cPickle.HIGHEST_PROTOCOL)
+        job = ProcessInProgress(self, name, request, priority)
+        job._id = next(self._sequence) & 0xffffffff
+        heapq.heappush(self._queue, (-priority, job._id, job))
+        self._dispatch()
+        return job
+
+
+    def dequeue(self, job):
+        """
+        Removes the given job from the work queue.
+
+        :param job: the job as returned by :meth:`~kaa.ProcessPool.enqueue`
+        :type job: :class:`~kaa.ProcessInProgress` object
+        :returns: True if the job was queued and was removed, and False if
+                  the job was not found or is already being executed.
+        """
+        if job._pool is not self or job._worker or job._request is None:
+            return False
+        # The heap entry is skipped by _dispatch()
+        job._request = None
+        return True
+
+
+    def _dispatch(self):
+        """
+        Hands queued jobs to idle workers, and starts new workers if needed.
+        """
+        while self._queue:
+            if not self._idle and len(self._members) >= self._size:
+                break
+            job = heapq.heappop(self._queue)[2]
+            if job._request is None:
+                # Dequeued job, so don't start a worker for it.
+                continue
+            if self._idle:
+                worker = self._idle.pop()
+            else:
+                worker = _ProcessPoolWorker(self, '%s#%d' % (self._name, len(self._members)+1))
+                self._members.append(worker)
+            worker.run(job)
+
+
+    def _finished(self, worker, job, payload):
+        """
+        Called by the worker when it has received the result of the job.
+        """
+        job._request = job._worker = None
+        if len(self._members) > self._size:
+            # The pool was shrunk while the worker was busy.
+            self._members.remove(worker)
+            worker.stop()
+        else:
+            self._idle.append(worker)
+        if not job.finished:
+            try:
+                success, result = cPickle.loads(payload)
+            except Exception:
+                job.throw()
+            else:
+                if success:
+                    job.finish(result)
+                else:
+                    exc = ProcessException(result[0], result[1], job._name)
+                    job.throw(exc.__class__, exc, None)
+        self._dispatch()
+
+
+    def _exited(self, worker, job, exitcode):
+        """
+        Called by the worker when the worker process died.
+        """
+        if worker in self._members:
+            self._members.remove(worker)
+        if worker in self._idle:
+            self._idle.remove(worker)
+        if job is not None:
+            job._request = job._worker = None
+            if not job.finished:
+                msg = 'process pool worker %s exited with %s during job' % (worker.name, exitcode)
+                job.throw(SystemError, SystemError(msg), None)
+        if not main.is_shutting_down():
+            # Replace the worker if there are jobs waiting.
+            self._dispatch()
+
+
+    def _abort(self, job):
+        """
+        Called when a job is aborted.
+        """
+        if self.dequeue(job):
+            return
+        worker = job._worker
+        job._request = job._worker = None
+        if worker is not None and worker.job is job:
+            # The job can't be interrupted, so stop the worker.  A new worker
+            # will be started for the next job.
+            self._members.remove(worker)
+            worker.stop()
+            self._dispatch()
+
+
+    @property
+    def size(self):
+        """
+        The maximum number of worker processes this pool may grow to.
+
+        If this value is increased and jobs are waiting to be processed, new
+        workers will be started as needed.  If it is decreased, idle workers
+        are stopped; busy workers are stopped once their job is complete.
+        """
+        return self._size
+
+    @size.setter
+    def size(self, value):
+        self._size = value
+        while len(self._members) > self._size and self._idle:
+            worker = self._idle.pop()
+            self._members.remove(worker)
+            worker.stop()
+        self._dispatch()
+
+
+    @property
+    def name(self):
+        """
+        The name under which this process pool was registered.
+        """
+        return self._name
+
+
+    def stop(self):
+        """
+        Stops all worker processes.  Jobs being executed are discarded (but
+        not finished), queued jobs remain queued until the next job is
+        enqueued.
+        """
+        for worker in self._members[:]:
+            self._members.remove(worker)
+            worker.stop()
+        del self._idle[:]
+
+
+
+def processed(pool=None, priority=0, async=True):
+    """
+    Decorator causing the decorated function to be executed within a worker
+    process of a :class:`~kaa.ProcessPool` when invoked.
+
+    :param pool: a :class:`~kaa.ProcessPool` object or name of a registered
+                 process pool; if None, a shared pool with one worker per CPU
+                 is used.
+    :type pool: :class:`~kaa.ProcessPool`, str, or None
+    :param priority: priority for the job in the process pool
+    :type priority: int
+    :param async: if False, blocks until the decorated function completes
+    :type async: bool
+    :returns: :class:`~kaa.ProcessInProgress` if ``async=True``, or the return
+              value of the decorated function if ``async=False``
+
+    Unlike :func:`@kaa.threaded() <kaa.threaded>`, which is limited by the
+    GIL, this allows CPU bound functions to run in parallel.  The decorated
+    function must be defined at module level, and its arguments and return
+    value must be picklable.  Exceptions raised in the worker process are
+    thrown to the InProgress as :class:`~kaa.processpool.ProcessException`,
+    which also subclasses the original exception class::
+
+        @kaa.processed()
+        def checksum(path):
+            return hashlib.md5(open(path, 'rb').read()).hexdigest()
+
+        @kaa.coroutine()
+        def scan(paths):
+            sums = yield kaa.InProgressAll(checksum(path) for path in paths)
+    """
+    def decorator(func):
+        @wraps(func)
+        def newfunc(*args, **kwargs):
+            p = pool
+            if p is None:
+                global _default_pool
+                if _default_pool is None:
+                    _default_pool = ProcessPool()
+                p = _default_pool
+            elif not isinstance(p, ProcessPool):
+                try:
+                    p = _process_pools[p]
+                except KeyError:
+                    log.warning('Implicitly registering process pool "%s"; use register_process_pool() instead', p)
+                    p = register_process_pool(p, ProcessPool())
+            in_progress = p.enqueue(func, args, kwargs, priority)
+            if not async:
+                return in_progress.wait()
+            return in_progress
+
+        # Boilerplate for @kaa.generator
+        newfunc.decorator = processed
+        newfunc.origfunc = func
+        newfunc.redecorate = lambda: processed(pool, priority, async)
+        return newfunc
+
+    return decorator
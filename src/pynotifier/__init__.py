@@ -28,6 +28,7 @@ from __future__ import absolute_import
 from select import select
 
 from . import log
+from . import dispatch
 from .version import major_number, minor_number, revision_number, extension, VERSION
 
 
@@ -39,12 +40,22 @@ timer_remove = None
 
 dispatcher_add = None
 dispatcher_remove = None
+dispatcher_pending = None
+dispatcher_set_wakeup = dispatch.dispatcher_set_wakeup
 
 loop = None
 step = None
 
+# number of wakeups saved by coalescing timers, None if not supported
+timer_wakeups_saved = None
+# sets the receiver of timing samples, None if not supported
+stats_set = None
+# True while a step is running that step() must not be nested in, None if
+# steps can always be nested
+in_loop = None
+
 # notifier types
-( GENERIC, QT, GTK, WX, TWISTED ) = range( 5 )
+( GENERIC, QT, GTK, WX, TWISTED, POLL, EPOLL, ASYNCIO ) = range( 8 )
 
 # socket conditions
 IO_READ = None
@@ -58,11 +69,17 @@ def init( model = GENERIC, **kwargs ):
 	global timer_remove
 	global socket_remove
 	global dispatcher_remove
+	global dispatcher_pending
 	global loop, step
+	global timer_wakeups_saved, stats_set, in_loop
 	global IO_READ, IO_WRITE, IO_EXCEPT
 
 	if model == GENERIC:
 		from . import nf_generic as nf_impl
+	elif model in ( POLL, EPOLL ):
+		# generic notifier with a poll(2) or epoll(7) based poller
+		from . import nf_generic as nf_impl
+		kwargs[ 'poller' ] = ( model == EPOLL ) and 'epoll' or 'poll'
 	elif model == QT:
 		from . import nf_qt as nf_impl
 	elif model == GTK:
@@ -73,6 +90,8 @@ def init( model = GENERIC, **kwargs ):
 	elif model == TWISTED:
 		from . import nf_twisted as nf_impl
 		log.info("using nf_twisted")
+	elif model == ASYNCIO:
+		from . import nf_asyncio as nf_impl
 	else:
 		raise Exception( 'unknown notifier model' )
 
@@ -82,8 +101,12 @@ def init( model = GENERIC, **kwargs ):
 	timer_remove = nf_impl.timer_remove
 	dispatcher_add = nf_impl.dispatcher_add
 	dispatcher_remove = nf_impl.dispatcher_remove
+	dispatcher_pending = nf_impl.dispatcher_pending
 	loop = nf_impl.loop
 	step = nf_impl.step
+	timer_wakeups_saved = getattr( nf_impl, 'timer_wakeups_saved', None )
+	stats_set = getattr( nf_impl, 'stats_set', None )
+	in_loop = getattr( nf_impl, 'in_loop', None )
 	IO_READ = nf_impl.IO_READ
 	IO_WRITE = nf_impl.IO_WRITE
 	IO_EXCEPT = nf_impl.IO_EXCEPT
@@ -27,30 +27,77 @@
 """generic implementation of external dispatchers, integratable into
 several notifiers."""
 
+import threading
+
 # required for dispatcher use
 MIN_TIMER = 100
 
+# Polled (legacy) dispatchers, called in every step.
 __dispatchers = []
+# Event driven dispatchers, only called in steps where they are pending.
+__event_dispatchers = []
+__pending = []
+__pending_lock = threading.Lock()
+# Called when an idle event driven dispatcher becomes pending in order to
+# wake up the notifier if it is sleeping.
+__wakeup = None
 
-def dispatcher_add( method ):
+def dispatcher_add( method, event_driven = False ):
     """The notifier supports external dispatcher functions that will be called
     within each scheduler step. This functionality may be usful for
     applications having an own event mechanism that needs to be triggered as
     often as possible. This method registers a new dispatcher function. To
     ensure that the notifier loop does not suspend to long in the sleep state
     during the select a minimal timer MIN_TIMER is set to guarantee that the
-    dispatcher functions are called at least every MIN_TIMER milliseconds."""
+    dispatcher functions are called at least every MIN_TIMER milliseconds.
+
+    If event_driven is True, the dispatcher is not polled.  It is idle until
+    it is declared pending using dispatcher_pending(), which wakes up the
+    notifier, and it is called once in the next step.  Event driven
+    dispatchers do not force the notifier to wake up every MIN_TIMER
+    milliseconds."""
     global __dispatchers
-    __dispatchers.append( method )
+    if event_driven:
+        __event_dispatchers.append( method )
+    else:
+        __dispatchers.append( method )
 
 def dispatcher_remove( method ):
     """Removes an external dispatcher function from the list"""
     global __dispatchers
     if method in __dispatchers:
         __dispatchers.remove( method )
+    if method in __event_dispatchers:
+        __event_dispatchers.remove( method )
+        with __pending_lock:
+            if method in __pending:
+                __pending.remove( method )
+
+def dispatcher_pending( method ):
+    """Declares the event driven dispatcher method as pending, so it will be
+    called in the next notifier step.  May be called from any thread."""
+    with __pending_lock:
+        if method in __pending or method not in __event_dispatchers:
+            return
+        __pending.append( method )
+        wakeup = len( __pending ) == 1 and __wakeup
+    if wakeup:
+        wakeup()
+
+def dispatcher_set_wakeup( method ):
+    """Sets the function called to wake up the notifier when an event driven
+    dispatcher becomes pending."""
+    global __wakeup
+    __wakeup = method
 
 def dispatcher_run():
-    global __dispatchers
+    global __dispatchers, __pending
+    if __pending:
+        with __pending_lock:
+            pending, __pending = __pending, []
+        for disp in pending:
+            if not disp():
+                dispatcher_remove( disp )
     if not __dispatchers:
         return
     for disp in __dispatchers[:]:
@@ -58,4 +105,10 @@ def dispatcher_run():
             dispatcher_remove( disp )
 
 def dispatcher_count():
+    """Returns the number of polled dispatchers.  As long as there is one,
+    the notifier must wake up at least every MIN_TIMER milliseconds."""
     return len(__dispatchers)
+
+def dispatcher_pending_count():
+    """Returns the number of event driven dispatchers that are pending."""
+    return len(__pending)
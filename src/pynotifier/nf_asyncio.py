@@ -0,0 +1,329 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# notifier wrapper for asyncio
+#
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License version
+# 2.1 as published by the Free Software Foundation.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.	See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301 USA
+
+"""Notifier that runs on an asyncio event loop (or on trollius, the asyncio
+backport for Python 2).  Sockets are mapped onto loop.add_reader() and
+loop.add_writer(), timers onto loop.call_at(), so kaa and asyncio code share
+one loop in one thread.
+
+step() runs the asyncio loop until at least one notifier callback was
+invoked (or, if sleep is False, for exactly one loop iteration).  Callbacks
+of plain asyncio handles are executed as well but do not end the step.  As
+the asyncio loop is not reentrant, step() must not be called recursively.
+
+If the asyncio loop is driven by someone else (e.g. loop.run_forever()),
+notifier callbacks still work and dispatchers are called after each loop
+iteration in which a notifier callback was invoked.
+
+asyncio has no notion of exceptional conditions, so sockets can't be watched
+for IO_EXCEPT."""
+from __future__ import absolute_import
+
+try:
+	import asyncio
+except ImportError:
+	try:
+		import trollius as asyncio
+	except ImportError:
+		raise ImportError( 'the asyncio notifier requires asyncio or trollius' )
+
+import errno
+import sys
+
+from . import dispatch
+from . import log
+
+IO_READ = 1
+IO_WRITE = 2
+IO_EXCEPT = 4
+
+_options = {
+	'loop' : None,
+}
+
+__loop = None
+
+# map of sockets -> methods, per condition.  Sockets which can't be watched
+# by the loop (e.g. regular files with epoll) are always ready and are
+# polled in every loop iteration; their handles are kept in __ready.
+__sockets = {}
+__sockets[ IO_READ ] = {}
+__sockets[ IO_WRITE ] = {}
+__ready = {}
+__ready[ IO_READ ] = {}
+__ready[ IO_WRITE ] = {}
+
+# map of timer ids -> [ interval, method, slack, deadline, handle ]
+__timers = {}
+__timer_id = 0
+
+# True while step() runs the loop, and set to True by the first notifier
+# callback invoked during the step
+__in_step = False
+__stop = False
+# Older asyncio versions (and trollius) implement loop.stop() with a callback
+# that aborts the loop iteration it runs in, leaving selected events queued
+# which then get reported twice.  With these, step() runs single iterations
+# using the loop's _run_once() instead.
+__run_once = None
+# exception raised by a notifier callback during step()
+__exc_info = None
+# handle of the scheduled dispatcher run if the loop is driven externally
+__dispatch_handle = None
+# Receives timing samples if instrumentation is enabled, see stats_set().
+__stats = None
+
+def _callback_done():
+	"""Called after a notifier callback was invoked.  Ends the current step,
+	or schedules the dispatchers if the loop is not driven by step()."""
+	global __dispatch_handle
+	if __in_step:
+		_stop()
+	elif __dispatch_handle is None:
+		__dispatch_handle = __loop.call_soon( _dispatch )
+
+def _stop():
+	global __stop
+	if not __stop:
+		__stop = True
+		if not __run_once:
+			__loop.stop()
+
+def _dispatch():
+	global __dispatch_handle
+	__dispatch_handle = None
+	dispatch.dispatcher_run()
+
+def _invoke( method, *args ):
+	"""Invokes a notifier callback.  Exceptions are stored and reraised by
+	step() so they reach the caller like with the other notifiers.  Returns
+	(True, result) on success and (False, None) if an exception was
+	raised."""
+	global __exc_info
+	try:
+		return True, method( *args )
+	except BaseException:
+		if not __in_step:
+			raise
+		if __exc_info is None:
+			__exc_info = sys.exc_info()
+		return False, None
+	finally:
+		_callback_done()
+
+def _fileno( socket ):
+	if isinstance( socket, ( int, long ) ):
+		return socket
+	return socket.fileno()
+
+def socket_add( socket, method, condition = IO_READ ):
+	"""The first argument specifies a socket, the second argument has to be a
+	function that is called whenever there is data ready in the socket."""
+	if condition not in __sockets:
+		raise ValueError( 'asyncio loops can only watch sockets for IO_READ and IO_WRITE' )
+	if socket in __sockets[ condition ]:
+		socket_remove( socket, condition )
+	__sockets[ condition ][ socket ] = method
+	add = ( condition == IO_READ ) and __loop.add_reader or __loop.add_writer
+	try:
+		add( _fileno( socket ), _socket_callback, socket, condition )
+	except ( IOError, OSError ), e:
+		if e.errno != errno.EPERM:
+			del __sockets[ condition ][ socket ]
+			raise
+		# epoll rejects regular files, which are always ready
+		__ready[ condition ][ socket ] = __loop.call_soon( _socket_callback, socket, condition )
+
+def socket_remove( socket, condition = IO_READ ):
+	"""Removes the given socket from scheduler."""
+	if socket not in __sockets.get( condition, () ):
+		log.info( "socket '%s' not found" % socket )
+		return
+	del __sockets[ condition ][ socket ]
+	handle = __ready[ condition ].pop( socket, None )
+	if handle is not None:
+		handle.cancel()
+		return
+	try:
+		fd = _fileno( socket )
+	except ( IOError, OSError, ValueError ):
+		# socket is already closed
+		return
+	if condition == IO_READ:
+		__loop.remove_reader( fd )
+	else:
+		__loop.remove_writer( fd )
+
+def _socket_callback( socket, condition ):
+	method = __sockets[ condition ].get( socket )
+	if method is None:
+		return
+	handle = __ready[ condition ].get( socket )
+	ok, ret = _invoke( method, socket )
+	if __sockets[ condition ].get( socket ) is not method:
+		# removed (or replaced) by the callback
+		return
+	if ok and not ret:
+		socket_remove( socket, condition )
+	elif handle is not None and __ready[ condition ].get( socket ) is handle:
+		__ready[ condition ][ socket ] = __loop.call_soon( _socket_callback, socket, condition )
+
+def _coalesce( deadline, slack ):
+	"""Moves the deadline (in seconds) to the next multiple of slack, so
+	timers with similar deadlines expire in the same loop iteration."""
+	if slack <= 0:
+		return deadline
+	return ( int( deadline / slack ) + 1 ) * slack
+
+def timer_add( interval, method, slack = 0 ):
+	"""The first argument specifies an interval in milliseconds, the
+	second argument a function. This is function is called after
+	interval seconds. If it returns true it's called again after
+	interval seconds, otherwise it is removed from the scheduler. The
+	third (optional) argument is the allowed slack in milliseconds; the
+	timer may be delayed by up to slack milliseconds to expire together
+	with other timers. This function returns an unique identifer which
+	can be used to remove this timer"""
+	global __timer_id
+
+	try:
+		__timer_id += 1
+	except OverflowError:
+		__timer_id = 0
+
+	interval = interval / 1000.0
+	slack = slack / 1000.0
+	deadline = __loop.time() + interval
+	handle = __loop.call_at( _coalesce( deadline, slack ), _timer_callback, __timer_id )
+	__timers[ __timer_id ] = [ interval, method, slack, deadline, handle ]
+	return __timer_id
+
+def timer_remove( id ):
+	"""Removes the timer specified by id from the scheduler."""
+	timer = __timers.pop( id, None )
+	if timer is not None:
+		timer[ 4 ].cancel()
+
+def _timer_callback( id ):
+	timer = __timers.get( id )
+	if timer is None:
+		return
+	if __stats is not None:
+		__stats.add( 'lag', __loop.time() - _coalesce( timer[ 3 ], timer[ 2 ] ) )
+	ok, ret = _invoke( timer[ 1 ] )
+	if __timers.get( id ) is not timer:
+		# removed (or restarted) by the callback
+		return
+	if ok and not ret:
+		del __timers[ id ]
+		return
+	# Reschedule from the previous deadline to avoid drift, but don't try
+	# to catch up if we fell behind.
+	timer[ 3 ] = max( timer[ 3 ] + timer[ 0 ], __loop.time() )
+	timer[ 4 ] = __loop.call_at( _coalesce( timer[ 3 ], timer[ 2 ] ), _timer_callback, id )
+
+dispatcher_add = dispatch.dispatcher_add
+dispatcher_remove = dispatch.dispatcher_remove
+dispatcher_pending = dispatch.dispatcher_pending
+
+def stats_set( stats ):
+	"""Sets the object receiving timing samples, or None to disable the
+	instrumentation.  Its method add( name, seconds ) is called with the
+	name 'lag' for the delay between the scheduled and the actual expiration
+	of a timer.  The time spent waiting for events is not available."""
+	global __stats
+	__stats = stats
+
+def wakeup():
+	"""Ends the current step after this loop iteration.  Must be called from
+	the thread running the loop, e.g. by asyncio callbacks which changed
+	state the caller of step() might be waiting for."""
+	if __in_step:
+		_stop()
+
+def in_loop():
+	"""Returns True while the asyncio loop is running, e.g. when called from a
+	callback.  The loop is not reentrant, so step() must not be called
+	then."""
+	return __in_step or __loop.is_running()
+
+def step( sleep = True, external = True ):
+	"""Runs the asyncio loop until a notifier callback was invoked, then
+	calls the dispatchers."""
+	global __in_step, __stop, __exc_info
+
+	if in_loop():
+		raise RuntimeError( 'asyncio notifier does not support recursive steps' )
+
+	__in_step = True
+	__stop = False
+	timeout = None
+	if not sleep or dispatch.dispatcher_pending_count():
+		# poll once without blocking
+		_stop()
+		if __run_once:
+			__loop.call_soon( _nop )
+	elif dispatch.dispatcher_count():
+		# Polled dispatchers must be called at least every MIN_TIMER
+		# milliseconds.
+		timeout = __loop.call_later( dispatch.MIN_TIMER / 1000.0, _stop )
+
+	try:
+		if __run_once:
+			__run_once()
+			while not __stop:
+				__run_once()
+		else:
+			__loop.run_forever()
+	finally:
+		__in_step = False
+		if timeout is not None:
+			timeout.cancel()
+
+	if __exc_info is not None:
+		type, value, tb = __exc_info
+		__exc_info = None
+		raise type, value, tb
+
+	if external:
+		dispatch.dispatcher_run()
+
+def _nop():
+	pass
+
+def loop():
+	"""Execute main loop forever."""
+	while 1:
+		step()
+
+def _init():
+	global __loop, __run_once
+	__loop = _options[ 'loop' ]
+	if __loop is None:
+		try:
+			__loop = asyncio.get_event_loop()
+		except RuntimeError:
+			__loop = asyncio.new_event_loop()
+			asyncio.set_event_loop( __loop )
+	if not hasattr( __loop, '_stopping' ):
+		__run_once = getattr( __loop, '_run_once', None )
+
+def get_loop():
+	"""Returns the asyncio loop used by the notifier."""
+	return __loop
@@ -65,10 +65,12 @@
 from __future__ import absolute_import
 
 # python core packages
+import select as select_module
 from select import select
 from select import error as select_error
 from time import time, sleep as time_sleep
-import errno, os, sys
+from heapq import heappush, heappop, heapify
+import errno, math, os, sys
 
 import socket
 
@@ -79,28 +81,291 @@ from . import dispatch
 IO_READ = 1
 IO_WRITE = 2
 IO_EXCEPT = 4
-( INTERVAL, TIMESTAMP, CALLBACK ) = range( 3 )
+( INTERVAL, TIMESTAMP, CALLBACK, SLACK, DEADLINE ) = range( 5 )
 
 __sockets = {}
 __sockets[ IO_READ ] = {}
 __sockets[ IO_WRITE ] = {}
 __sockets[ IO_EXCEPT ] = {}
 __timers = {}
+# Priority queue of ( timestamp, id ) tuples ordered by the next expiration
+# of each timer.  Entries are never removed from the middle of the heap:
+# timer_remove() only deletes the timer from __timers, and a heap entry is
+# stale (and skipped when it reaches the top) if its id is no longer in
+# __timers or its timestamp no longer matches the timer.
+__timer_heap = []
+# Number of timer passes currently running in (possibly nested) steps.  The
+# heap is only compacted when this is 0, because a running pass holds heap
+# entries outside of the heap.
+__timer_passes = 0
 __timer_id = 0
-__min_timer = None
+# Number of timer deadlines that were served by a wakeup scheduled for a
+# different deadline because of timer slack.
+__timer_wakeups_saved = 0
+# Receives timing samples if instrumentation is enabled, see stats_set().
+__stats = None
 __in_step = False
 __step_depth = 0
 __step_depth_max = 0
 
 _options = {
 	'recursive_depth' : 2,
+	# One of 'select', 'poll' or 'epoll'.  If the requested poller is not
+	# supported on this platform, the next one in this list is used.
+	'poller' : 'select',
 }
 
+
+def _timeout_ms( timeout ):
+	"""Converts a timeout in seconds (None blocks) to milliseconds for poll(2)
+	and epoll_wait(2), rounding up so that we never wake up early and spin
+	until a timer is due."""
+	if timeout is None:
+		return -1
+	return int( math.ceil( timeout * 1000 ) )
+
+
+class SelectPoller( object ):
+	"""Waits for socket activity using select(2).  This is the traditional
+	pynotifier implementation: the descriptor sets are rebuilt from the
+	socket dicts on every call, which costs O(n) per step and is limited
+	to FD_SETSIZE descriptors."""
+
+	name = 'select'
+
+	def __init__( self, sockets ):
+		self._sockets = sockets
+
+	def register( self, id, condition ):
+		pass
+
+	def unregister( self, id, condition ):
+		pass
+
+	def poll( self, timeout ):
+		"""Waits at most timeout seconds (None blocks) and returns a
+		sequence of ( condition, ids ) tuples for all ready sockets."""
+		sockets = self._sockets
+		ready = select( sockets[ IO_READ ].keys(), sockets[ IO_WRITE ].keys(),
+		                sockets[ IO_EXCEPT ].keys(), timeout )
+		return zip( ( IO_READ, IO_WRITE, IO_EXCEPT ), ready )
+
+
+class PollPoller( SelectPoller ):
+	"""Waits for socket activity using poll(2).  Registrations are kept
+	across steps and descriptors are not limited by FD_SETSIZE, but the
+	kernel still scans all registered descriptors on every call."""
+
+	name = 'poll'
+
+	# Event mask requested from the kernel for each condition.
+	_request = {
+		IO_READ : getattr( select_module, 'POLLIN', 0 ),
+		IO_WRITE : getattr( select_module, 'POLLOUT', 0 ),
+		IO_EXCEPT : getattr( select_module, 'POLLPRI', 0 ),
+	}
+	# Reported events that make a condition ready.  Hangups and errors are
+	# reported as readable and writable, like select(2) does.
+	_error = getattr( select_module, 'POLLHUP', 0 ) | getattr( select_module, 'POLLERR', 0 )
+	_invalid = getattr( select_module, 'POLLNVAL', 0 )
+	_ready = {
+		IO_READ : _request[ IO_READ ] | _error,
+		IO_WRITE : _request[ IO_WRITE ] | _error,
+		IO_EXCEPT : _request[ IO_EXCEPT ],
+	}
+
+	def __init__( self, sockets ):
+		super( PollPoller, self ).__init__( sockets )
+		# fd -> { condition: id }
+		self.__fds = {}
+		# ( condition, id ) -> fd, needed because id may already be closed
+		# when it gets unregistered.
+		self.__ids = {}
+		# fds the kernel refuses to poll (e.g. regular files); like
+		# select(2) we consider them always ready.
+		self.__always = {}
+		self._create()
+
+	def _create( self ):
+		self._poll = select_module.poll()
+		self._wait = lambda timeout: self._poll.poll( _timeout_ms( timeout ) )
+
+	def _kernel_register( self, fd, mask, modify ):
+		if modify:
+			self._poll.modify( fd, mask )
+		else:
+			self._poll.register( fd, mask )
+
+	def _kernel_unregister( self, fd ):
+		self._poll.unregister( fd )
+
+	def __mask( self, conditions ):
+		mask = 0
+		for condition in conditions:
+			mask |= self._request[ condition ]
+		return mask
+
+	def register( self, id, condition ):
+		if isinstance( id, int ):
+			fd = id
+		else:
+			fd = id.fileno()
+		key = ( condition, id )
+		if self.__ids.get( key ) == fd:
+			return
+		if key in self.__ids:
+			# Same object but a different descriptor now, drop the old one.
+			self.unregister( id, condition )
+		conditions = self.__fds.get( fd )
+		modify = conditions is not None
+		if not modify:
+			conditions = self.__fds[ fd ] = {}
+		conditions[ condition ] = id
+		self.__ids[ key ] = fd
+		if fd in self.__always:
+			return
+		try:
+			self._kernel_register( fd, self.__mask( conditions ), modify )
+		except ( IOError, OSError ), e:
+			if e.errno == errno.EPERM:
+				self.__always[ fd ] = True
+			else:
+				del conditions[ condition ]
+				del self.__ids[ key ]
+				if not conditions:
+					del self.__fds[ fd ]
+				raise
+
+	def unregister( self, id, condition ):
+		fd = self.__ids.pop( ( condition, id ), None )
+		if fd is None:
+			return
+		conditions = self.__fds[ fd ]
+		del conditions[ condition ]
+		if fd in self.__always:
+			if not conditions:
+				del self.__fds[ fd ]
+				del self.__always[ fd ]
+			return
+		try:
+			if conditions:
+				self._kernel_register( fd, self.__mask( conditions ), True )
+			else:
+				del self.__fds[ fd ]
+				self._kernel_unregister( fd )
+		except ( IOError, OSError, KeyError, ValueError ):
+			# The descriptor was closed before it was unregistered; the
+			# kernel has already forgotten about it.
+			pass
+
+	def reset( self ):
+		"""Creates a new kernel object and registers all known descriptors
+		again.  Needed after fork(), where parent and child would otherwise
+		share the kernel side of the registrations."""
+		self._create()
+		fds, self.__fds, self.__ids, self.__always = self.__fds, {}, {}, {}
+		for conditions in fds.values():
+			for condition, id in conditions.items():
+				try:
+					self.register( id, condition )
+				except ( IOError, OSError, ValueError, socket.error ):
+					pass
+
+	def poll( self, timeout ):
+		if self.__always:
+			timeout = 0
+		ready = { IO_READ : [], IO_WRITE : [], IO_EXCEPT : [] }
+		fds = self.__fds
+		for fd, events in self._wait( timeout ):
+			conditions = fds.get( fd )
+			if not conditions:
+				continue
+			if events & self._invalid:
+				# fd was closed without being unregistered.  select(2) would
+				# fail with EBADF here; we just stop watching it.
+				for condition, id in conditions.items():
+					self._sockets[ condition ].pop( id, None )
+					self.unregister( id, condition )
+				continue
+			for condition, id in conditions.items():
+				if events & self._ready[ condition ]:
+					ready[ condition ].append( id )
+		for fd in self.__always:
+			for condition, id in fds[ fd ].items():
+				ready[ condition ].append( id )
+		return ready.items()
+
+
+class EpollPoller( PollPoller ):
+	"""Waits for socket activity using Linux epoll(7).  Registrations live
+	in the kernel and each step costs O(ready descriptors), independent of
+	the number of registered sockets."""
+
+	name = 'epoll'
+
+	_request = {
+		IO_READ : getattr( select_module, 'EPOLLIN', 0 ),
+		IO_WRITE : getattr( select_module, 'EPOLLOUT', 0 ),
+		IO_EXCEPT : getattr( select_module, 'EPOLLPRI', 0 ),
+	}
+	_error = getattr( select_module, 'EPOLLHUP', 0 ) | getattr( select_module, 'EPOLLERR', 0 )
+	_invalid = 0
+	_ready = {
+		IO_READ : _request[ IO_READ ] | _error,
+		IO_WRITE : _request[ IO_WRITE ] | _error,
+		IO_EXCEPT : _request[ IO_EXCEPT ],
+	}
+
+	def _create( self ):
+		if getattr( self, '_poll', None ):
+			self._poll.close()
+		self._poll = select_module.epoll()
+		self._pid = os.getpid()
+		self._wait = self._epoll_wait
+
+	def _epoll_wait( self, timeout ):
+		ms = _timeout_ms( timeout )
+		if ms < 0:
+			return self._poll.poll( -1 )
+		# epoll.poll() takes seconds and truncates them to milliseconds, so
+		# pass the middle of the millisecond we want.
+		return self._poll.poll( ( ms + 0.5 ) / 1000.0 )
+
+	def _kernel_register( self, fd, mask, modify ):
+		if modify:
+			try:
+				return self._poll.modify( fd, mask )
+			except ( IOError, OSError ), e:
+				# The kernel dropped the fd because it was closed, and the
+				# number has been reused since.
+				if e.errno != errno.ENOENT:
+					raise
+		self._poll.register( fd, mask )
+
+	def poll( self, timeout ):
+		if self._pid != os.getpid():
+			# We have been forked, don't share the epoll set with our parent.
+			self.reset()
+		return super( EpollPoller, self ).poll( timeout )
+
+
+def _create_poller( name ):
+	"""Returns a poller for the given name, falling back to poll(2) and
+	finally select(2) if the platform lacks support."""
+	if name == 'epoll' and hasattr( select_module, 'epoll' ):
+		return EpollPoller( __sockets )
+	if name in ( 'epoll', 'poll' ) and hasattr( select_module, 'poll' ):
+		return PollPoller( __sockets )
+	return SelectPoller( __sockets )
+
+__poller = SelectPoller( __sockets )
+
 def socket_add( id, method, condition = IO_READ ):
 	"""The first argument specifies a socket, the second argument has to be a
 	function that is called whenever there is data ready in the socket.
 	The callback function gets the socket back as only argument."""
 	global __sockets
+	__poller.register( id, condition )
 	__sockets[ condition ][ id ] = method
 
 def socket_remove( id, condition = IO_READ ):
@@ -109,15 +374,26 @@ def socket_remove( id, condition = IO_READ ):
 	global __sockets
 	if id in __sockets[ condition ]:
 		del __sockets[ condition ][ id ]
+		__poller.unregister( id, condition )
 
-def timer_add( interval, method ):
+def _coalesce( deadline, slack ):
+	"""Returns the time a timer with the given deadline and slack (both in
+	milliseconds) is scheduled for: the deadline rounded up to a multiple of
+	slack.  All timers with the same slack whose deadlines fall into the same
+	slack window therefore expire at the same time and are handled by a
+	single wakeup."""
+	if not slack:
+		return deadline
+	return -( -deadline // slack ) * slack
+
+def timer_add( interval, method, slack = 0 ):
 	"""The first argument specifies an interval in milliseconds, the second
 	argument a function. This is function is called after interval
 	seconds. If it returns true it's called again after interval
 	seconds, otherwise it is removed from the scheduler. The third
-	(optional) argument is a parameter given to the called
-	function. This function returns an unique identifer which can be
-	used to remove this timer"""
+	(optional) argument is the number of milliseconds the timer may be
+	delayed so it can expire together with other timers. This function
+	returns an unique identifer which can be used to remove this timer"""
 	global __timer_id
 
 	try:
@@ -125,8 +401,10 @@ def timer_add( interval, method ):
 	except OverflowError:
 		__timer_id = 0
 
-	__timers[ __timer_id ] = \
-	[ interval, int( time() * 1000 ) + interval, method ]
+	deadline = int( time() * 1000 ) + interval
+	timestamp = _coalesce( deadline, slack )
+	__timers[ __timer_id ] = [ interval, timestamp, method, slack, deadline ]
+	heappush( __timer_heap, ( timestamp, __timer_id ) )
 
 	return __timer_id
 
@@ -134,14 +412,103 @@ def timer_remove( id ):
 	"""Removes the timer identifed by the unique ID from the main loop."""
 	if id in __timers:
 		del __timers[ id ]
+		if not __timer_passes:
+			_timer_compact()
+
+def timer_wakeups_saved():
+	"""Returns the number of main loop wakeups saved so far by coalescing
+	timers that were added with slack."""
+	return __timer_wakeups_saved
+
+def stats_set( stats ):
+	"""Sets the object receiving timing samples, or None to disable the
+	instrumentation.  Its method add( name, seconds ) is called with the
+	name 'select' for the time spent waiting for events and 'lag' for the
+	delay between the scheduled and the actual expiration of a timer."""
+	global __stats
+	__stats = stats
 
-def dispatcher_add( method ):
-	global __min_timer
-	__min_timer = dispatch.MIN_TIMER
-	dispatch.dispatcher_add( method )
+def _timer_compact():
+	"""Rebuilds the timer heap if it has too many stale entries from removed
+	timers, so its size stays proportional to the number of timers."""
+	if len( __timer_heap ) > 2 * len( __timers ) + 64:
+		__timer_heap[ : ] = [ ( timer[ TIMESTAMP ], i ) for i, timer in __timers.items() if timer[ TIMESTAMP ] ]
+		heapify( __timer_heap )
 
+def _timer_next():
+	"""Returns the earliest valid ( timestamp, id ) entry of the timer heap,
+	dropping stale entries from the top, or None if there is none."""
+	heap = __timer_heap
+	while heap:
+		timestamp, id = heap[ 0 ]
+		timer = __timers.get( id )
+		if timer is not None and timer[ TIMESTAMP ] == timestamp:
+			return heap[ 0 ]
+		heappop( heap )
+	return None
+
+dispatcher_add = dispatch.dispatcher_add
 dispatcher_remove = dispatch.dispatcher_remove
+dispatcher_pending = dispatch.dispatcher_pending
+
 
+def _timer_run( deferred ):
+	"""Invokes the callbacks of all expired timers in order of expiration.
+	Costs O(k log n) for k expired timers.  Heap entries of timers that must
+	not fire again in this step are appended to deferred, the caller pushes
+	them back onto the heap afterwards."""
+	global __timer_wakeups_saved
+	heap = __timer_heap
+	# Distinct deadlines of the timers fired in this pass, and whether any
+	# of them has been delayed by its slack.
+	deadlines = set()
+	coalesced = False
+	now = int( time() * 1000 )
+	# Timers added by callbacks during this step, and timers with an
+	# interval of 0, must wait for the next step.
+	last_id = __timer_id
+	while heap:
+		next = _timer_next()
+		if next is None:
+			break
+		timestamp, i = next
+		if timestamp > now:
+			now = int( time() * 1000 )
+			if timestamp > now:
+				break
+		heappop( heap )
+		if i > last_id:
+			deferred.append( next )
+			continue
+		timer = __timers[ i ]
+		deadlines.add( timer[ DEADLINE ] )
+		if timer[ DEADLINE ] != timestamp:
+			coalesced = True
+		if __stats is not None:
+			__stats.add( 'lag', time() - timestamp / 1000.0 )
+		# Update timestamp on timer before calling the callback to
+		# prevent infinite recursion in case the callback calls
+		# step().
+		timer[ TIMESTAMP ] = 0
+		if not timer[ CALLBACK ]():
+			if i in __timers:
+				del __timers[ i ]
+		elif i in __timers:
+			# Find a moment in the future. If interval is 0, we
+			# just reuse the old timestamp, doesn't matter.
+			if timer[ INTERVAL ]:
+				now = int( time() * 1000 )
+				deadline = timer[ DEADLINE ] + timer[ INTERVAL ]
+				while deadline <= now:
+					deadline += timer[ INTERVAL ]
+				timer[ DEADLINE ] = deadline
+				timestamp = _coalesce( deadline, timer[ SLACK ] )
+				heappush( heap, ( timestamp, i ) )
+			else:
+				deferred.append( ( timestamp, i ) )
+			timer[ TIMESTAMP ] = timestamp
+	if coalesced:
+		__timer_wakeups_saved += len( deadlines ) - 1
 
 def step( sleep = True, external = True, simulate = False ):
 	"""Do one step forward in the main loop. First all timers are checked for
@@ -153,7 +520,7 @@ def step( sleep = True, external = True, simulate = False ):
 	invoked. As a final task in a notifier step all registered external
 	dispatcher functions are invoked."""
 
-	global __in_step, __step_depth, __step_depth_max
+	global __in_step, __step_depth, __step_depth_max, __timer_passes
 
 	__in_step = True
 	__step_depth += 1
@@ -165,75 +532,58 @@ def step( sleep = True, external = True, simulate = False ):
 
 		# get minInterval for max timeout
 		timeout = None
-		if not sleep:
+		if not sleep or dispatch.dispatcher_pending_count():
 			timeout = 0
 		else:
-			now = int( time() * 1000 )
-			for interval, timestamp, callback in __timers.values():
-				if not timestamp:
-					# timer is blocked (recursion), ignore it
-					continue
-				nextCall = timestamp - now
-				if timeout == None or nextCall < timeout:
-					if nextCall > 0:
-						timeout = nextCall
-					else:
-						timeout = 0
-						break
+			# Blocked timers (recursion) are not in the heap while their
+			# callback runs, so they are ignored here.
+			next = _timer_next()
+			if next is not None:
+				timeout = max( next[ 0 ] - int( time() * 1000 ), 0 )
 			if timeout == None:
-				if dispatch.dispatcher_count():
-					timeout = dispatch.MIN_TIMER
-				else:
-					# No timers and no dispatchers, timeout could be infinity.
-					timeout = 30000
-			if __min_timer and __min_timer < timeout: timeout = __min_timer
+				# No timers, timeout could be infinity.
+				timeout = 30000
+			if dispatch.dispatcher_count() and dispatch.MIN_TIMER < timeout:
+				# Polled dispatchers must be called at least every MIN_TIMER
+				# milliseconds.
+				timeout = dispatch.MIN_TIMER
 
 
 		# wait for event
+		stats = __stats
+		if stats is not None:
+			t0 = time()
 		sockets_ready = None
 		if __sockets[ IO_READ ] or __sockets[ IO_WRITE ] or __sockets[ IO_EXCEPT ]:
 			try:
-				sockets_ready = select( __sockets[ IO_READ ].keys(), __sockets[ IO_WRITE ].keys(),
-				                        __sockets[ IO_EXCEPT ].keys(), timeout / 1000.0 )
-			except select_error, e:
+				sockets_ready = __poller.poll( timeout / 1000.0 )
+			except ( select_error, IOError, OSError ), e:
 				if e.args[ 0 ] != errno.EINTR:
 					raise e
 		elif timeout:
 			time_sleep(timeout / 1000.0)
+		if stats is not None:
+			stats.add( 'select', time() - t0 )
 
 		if simulate:
 			# we only simulate
 			return
 		
 		# handle timers
-		for i, timer in __timers.items():
-			timestamp = timer[ TIMESTAMP ]
-			if not timestamp or i not in __timers:
-				# timer was unregistered by previous timer, or would
-				# recurse, ignore this timer
-				continue
-			now = int( time() * 1000 )
-			if timestamp <= now:
-				# Update timestamp on timer before calling the callback to
-				# prevent infinite recursion in case the callback calls
-				# step().
-				timer[ TIMESTAMP ] = 0
-				if not timer[ CALLBACK ]():
-					if i in __timers:
-						del __timers[ i ]
-				else:
-					# Find a moment in the future. If interval is 0, we
-					# just reuse the old timestamp, doesn't matter.
-					if timer[ INTERVAL ]:
-						now = int( time() * 1000 )
-						timestamp += timer[ INTERVAL ]
-						while timestamp <= now:
-							timestamp += timer[ INTERVAL ]
-					timer[ TIMESTAMP ] = timestamp
+		deferred = []
+		__timer_passes += 1
+		try:
+			_timer_run( deferred )
+		finally:
+			__timer_passes -= 1
+			for entry in deferred:
+				heappush( __timer_heap, entry )
+		if not __timer_passes:
+			_timer_compact()
 
 		# handle sockets
 		if sockets_ready:
-			for condition, sockets in zip((IO_READ, IO_WRITE, IO_EXCEPT), sockets_ready):
+			for condition, sockets in sockets_ready:
 				for sock in sockets:
 					# XXX: Not quite sure why these checks are done, since select()
 					# would have raised on these first.
@@ -268,6 +618,12 @@ def loop():
 		step()
 
 def _init():
-	global __step_depth_max
+	global __step_depth_max, __poller
 
 	__step_depth_max = _options[ 'recursive_depth' ]
+	if _options[ 'poller' ] != __poller.name:
+		poller = _create_poller( _options[ 'poller' ] )
+		for condition, sockets in __sockets.items():
+			for id in sockets:
+				poller.register( id, condition )
+		__poller = poller
@@ -73,13 +73,13 @@ def socket_remove( socket, condition = IO_READ ):
 	else:
 		log.info( "socket '%s' not found" % socket )
 
-def timer_add( interval, method ):
+def timer_add( interval, method, slack = 0 ):
 	"""The first argument specifies an interval in milliseconds, the
 	second argument a function. This is function is called after
 	interval seconds. If it returns true it's called again after
 	interval seconds, otherwise it is removed from the scheduler. The
-	third (optional) argument is a parameter given to the called
-	function."""
+	third (optional) argument is the allowed slack in milliseconds,
+	which is ignored by the gtk notifier."""
 	return gobject.timeout_add( interval, method )
 
 def timer_remove( id ):
@@ -88,6 +88,7 @@ def timer_remove( id ):
 
 dispatcher_add = dispatch.dispatcher_add
 dispatcher_remove = dispatch.dispatcher_remove
+dispatcher_pending = dispatch.dispatcher_pending
 
 _mainloop = None
 _step = None
@@ -175,15 +175,15 @@ def socket_remove(id, condition=IO_READ):
         del __sockobjs[condition][id]
 
 
-def timer_add(interval, method):
+def timer_add(interval, method, slack=0):
     """
     The first argument specifies an interval in milliseconds, the second
     argument a function. This is function is called after interval
     seconds. If it returns true it's called again after interval
     seconds, otherwise it is removed from the scheduler. The third
-    (optional) argument is a parameter given to the called
-    function. This function returns an unique identifer which can be
-    used to remove this timer
+    (optional) argument is the allowed slack in milliseconds, which is
+    ignored by the twisted notifier. This function returns an unique
+    identifer which can be used to remove this timer
     """
     global __timer_id
 
@@ -209,10 +209,11 @@ def timer_remove(id):
         del __timers[id]
 
 
-def dispatcher_add(method):
-    dispatch.dispatcher_add(method)
+def dispatcher_add(method, event_driven=False):
+    dispatch.dispatcher_add(method, event_driven)
 
 dispatcher_remove = dispatch.dispatcher_remove
+dispatcher_pending = dispatch.dispatcher_pending
 
 
 def step(sleep = True, external = True):
@@ -92,7 +92,7 @@
 # -----------------------------------------------------------------------------
 from __future__ import absolute_import
 
-__all__ = [ 'Server', 'Client', 'expose' ]
+__all__ = [ 'Server', 'Client', 'expose', 'register_serializer' ]
 
 # python imports
 import types
@@ -100,12 +100,17 @@ import socket
 import logging
 import cPickle
 import pickle
+import marshal
+import json
 import struct
 import sys
 import hashlib
 import time
 import traceback
 import os
+import cStringIO
+import collections
+import weakref
 
 # kaa imports
 import kaa
@@ -114,6 +119,8 @@ from .strutils import py3_b, bl
 from .core import Object, CoreThreading
 from .errors import make_exception_class, AsyncExceptionBase
 from .main import is_shutting_down
+from .io import _ReadQueue
+from .generator import Generator
 
 # get logging object
 log = logging.getLogger('kaa.base.rpc')
@@ -123,6 +130,93 @@ RPC_PACKET_HEADER_SIZE = struct.calcsize("I4sI")
 # Protocol compatible between Python 2 and 3.  (Well, quasi-compatible, there
 # are some issues due to the str/unicode changes in 3.)
 PICKLE_PROTOCOL = 2
+# Number of streamed items the peer may send before we acknowledge them,
+# and the maximum number of items sent in one packet.
+STREAM_WINDOW = 1024
+STREAM_CHUNK = 64
+# Results of exposed callables which are streamed instead of returned.
+_stream_types = (types.GeneratorType, Generator)
+
+
+def _loads(payload):
+    """
+    Unpickles a payload given as a memoryview, without copying it to a
+    string first.
+    """
+    return cPickle.load(cStringIO.StringIO(payload))
+
+
+# Flags in the seq field of the AUTH and RESP packets used to negotiate the
+# serializer during authentication.  Older peers send AUTH with seq 0 and
+# echo the seq of AUTH in their RESP, so neither flag is ever set by them.
+SERIALIZER_OFFER = 0x80000000
+SERIALIZER_ANSWER = 0x40000000
+# The remaining bits hold a bitmask of serializer ids in an offer, or the
+# chosen id in an answer.
+SERIALIZER_ID_MASK = 0x3fffffff
+
+# Registered serializers by name and by id.
+_serializers = {}
+_serializers_by_id = {}
+
+class _Serializer(object):
+    """
+    Encodes and decodes the payload of CALL and RETN packets.
+    """
+    def __init__(self, name, id, dumps, loads):
+        self.name = name
+        self.id = id
+        self.dumps = dumps
+        self.loads = loads
+
+
+def register_serializer(name, id, dumps, loads):
+    """
+    Registers a serializer for the payload of RPC calls and their results.
+
+    :param name: the name used to refer to the serializer in the
+                 *serializers* argument of :class:`~kaa.rpc.Server` and
+                 :class:`~kaa.rpc.Client`
+    :type name: str
+    :param id: a number between 0 and 29 which identifies the serializer
+               on the wire, and which both peers must agree on
+    :type id: int
+    :param dumps: a callable taking an object and returning a string
+    :param loads: a callable taking a buffer (a memoryview) and returning the
+                  object
+
+    The serializers pickle (at the highest protocol), marshal and json are
+    registered by default, as is pickle2, which uses protocol 2 and is what
+    peers unaware of serializer negotiation use.  Exceptions are always sent
+    with pickle2, regardless of the serializer in use.
+    """
+    if name in _serializers:
+        raise ValueError('A registered serializer already exists with name "%s"' % name)
+    if not 0 <= id < 30 or id in _serializers_by_id:
+        raise ValueError('Serializer id %s is invalid or already in use' % id)
+    _serializers[name] = _serializers_by_id[id] = _Serializer(name, id, dumps, loads)
+
+
+register_serializer('pickle2', 0, lambda obj: cPickle.dumps(obj, PICKLE_PROTOCOL), _loads)
+register_serializer('pickle', 1, lambda obj: cPickle.dumps(obj, cPickle.HIGHEST_PROTOCOL), _loads)
+register_serializer('marshal', 2, marshal.dumps, lambda payload: marshal.loads(payload.tobytes()))
+register_serializer('json', 3, lambda obj: json.dumps(obj, separators=(',', ':')),
+                    lambda payload: json.loads(payload.tobytes()))
+
+# Used when no serializers are given; marshal and json can't encode
+# arbitrary objects, so they are only used when asked for.
+DEFAULT_SERIALIZERS = ('pickle',)
+
+
+def _get_serializers(names):
+    """
+    Returns the serializers for the given names, or the default ones if
+    names is None.
+    """
+    try:
+        return [ _serializers[name] for name in names or DEFAULT_SERIALIZERS ]
+    except KeyError, e:
+        raise ValueError('Unknown serializer %s' % e)
 
 
 class RemoteException(AsyncExceptionBase):
@@ -149,6 +243,219 @@ class NotConnectedError(Exception):
     pass
 
 
+class Batch(object):
+    """
+    Collects RPC calls to be sent to the peer at once.  See
+    :meth:`~kaa.rpc.Channel.batch`.
+    """
+    def __init__(self, channel):
+        self._channel = channel
+        self._calls = []
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, type, value, tb):
+        self.send()
+        return False
+
+
+    def rpc(self, cmd, *args, **kwargs):
+        """
+        Adds a call of the remote command to the batch and returns an
+        InProgress for its result.
+        """
+        if not self._channel.connected:
+            raise NotConnectedError()
+        callback = kaa.InProgress()
+        self._calls.append((callback, cmd, args, kwargs))
+        return callback
+
+
+    def notify(self, cmd, *args, **kwargs):
+        """
+        Adds a notification of the remote command to the batch.  See
+        :meth:`~kaa.rpc.Channel.notify`.
+        """
+        if not self._channel.connected:
+            raise NotConnectedError()
+        self._calls.append((None, cmd, args, kwargs))
+
+
+    def send(self):
+        """
+        Sends the calls added since the last send.
+
+        If the channel was closed in the meantime, NotConnectedError is
+        thrown to the InProgress objects of the calls, and raised.  When
+        called from a thread, this waits until the main thread has sent
+        the calls.
+        """
+        calls, self._calls = self._calls, []
+        if not calls:
+            return
+        if not CoreThreading.is_mainthread():
+            kaa.MainThreadCallable(self._channel._send_calls)(calls).wait()
+        else:
+            self._channel._send_calls(calls)
+
+
+class RemoteGenerator(object):
+    """
+    Items streamed by a generator returned from a remote exposed callable.
+    It is iterated like a :class:`~kaa.Generator`::
+
+        rows = yield client.rpc('query')
+        for row in rows:
+            row = yield row
+
+    Or, with less overhead per item, with :meth:`read`.  At most
+    STREAM_WINDOW items are buffered; the remote generator is suspended
+    until the items are consumed.
+
+    The remote generator is stopped by :meth:`close`, which is also done
+    when the iteration above is left early (e.g. with break), or when the
+    RemoteGenerator is no longer referenced.  Otherwise it stays suspended
+    until the channel is closed.
+    """
+    def __init__(self, channel, seq, cmd):
+        self._channel = channel
+        self._seq = seq
+        self._cmd = cmd
+        self._items = collections.deque()
+        self._waiting = None
+        self._reading = None
+        self._consumed = 0
+        self._finished = False
+        self._exc_info = None
+
+
+    def _add(self, items):
+        """
+        Adds items received from the remote generator.
+        """
+        self._items.extend(items)
+        self._wakeup()
+
+
+    def _finish(self, exc_info=None):
+        """
+        Ends the stream, optionally with an exception for the consumer.
+        """
+        self._finished = True
+        self._exc_info = exc_info
+        self._wakeup()
+
+
+    def _wakeup(self):
+        """
+        Finishes the InProgress handed out for the last item, now that it is
+        known whether more items follow.
+        """
+        self._channel._streams_waiting.pop(self._seq, None)
+        if self._waiting:
+            waiting, self._waiting = self._waiting, None
+            waiting.finish(self._pop())
+        if self._reading:
+            reading, self._reading = self._reading, None
+            self._read(reading)
+
+
+    def _consume(self, count):
+        """
+        Acknowledges consumed items to the remote end once half the window
+        has been used.
+        """
+        self._consumed += count
+        if self._consumed >= STREAM_WINDOW / 2 and not self._finished:
+            self._channel._send_packet(self._seq, 'MORE', struct.pack("I", self._consumed))
+            self._consumed = 0
+
+
+    def _pop(self):
+        """
+        Returns the next item.
+        """
+        self._consume(1)
+        return self._items.popleft()
+
+
+    def _read(self, ip):
+        """
+        Finishes the InProgress returned by read() with all items received.
+        """
+        items = list(self._items)
+        self._items.clear()
+        self._consume(len(items))
+        if not items and self._exc_info:
+            ip.throw(*self._exc_info)
+        else:
+            ip.finish(items)
+
+
+    def read(self):
+        """
+        Reads all items received so far, waiting for at least one.
+
+        :returns: InProgress finished with a list of items, which is empty
+                  at the end of the stream
+        """
+        ip = kaa.InProgress()
+        if self._items or self._finished:
+            self._read(ip)
+        else:
+            self._reading = ip
+            self._wait()
+        return ip
+
+
+    def _wait(self):
+        """
+        Keeps us alive while the consumer waits for items.  The consumer may
+        only be referenced by the InProgress it waits for, which only we
+        reference.
+        """
+        self._channel._streams_waiting[self._seq] = self
+
+
+    def close(self):
+        """
+        Stops the remote generator.  Items that have been received already
+        are still iterated.
+        """
+        if not self._finished:
+            self._channel._send_packet(self._seq, 'STOP', '')
+            self._channel._streams.pop(self._seq, None)
+            self._finish()
+
+
+    def __iter__(self):
+        try:
+            while True:
+                if len(self._items) > 1 or (self._items and self._finished):
+                    ip = kaa.InProgress()
+                    ip.finish(self._pop())
+                    yield ip
+                elif self._items:
+                    # Hand out the last item only once it is known whether
+                    # more follow, so the iteration can stop in time.
+                    self._waiting = kaa.InProgress()
+                    self._wait()
+                    yield self._waiting
+                elif self._exc_info:
+                    ip = kaa.InProgress()
+                    ip.throw(*self._exc_info)
+                    yield ip
+                    return
+                else:
+                    return
+        finally:
+            # Iteration left early, stop the remote generator.
+            self.close()
+
+
 class Server(Object):
     """
     RPC server class.  RPC servers accept incoming connections from client,
@@ -158,6 +465,11 @@ class Server(Object):
     must correspond to the ``bind_info`` argument of :meth:`kaa.Socket.listen`.
 
     See kaa.Socket.buffer_size docstring for information on buffer_size.
+
+    serializers is a list of names of serializers (see
+    :func:`~kaa.rpc.register_serializer`) clients may choose from.  If None,
+    only pickle is offered.  Clients which don't support any of them, or
+    which predate serializer negotiation, use pickle2.
     """
     __kaasignals__ = {
         'client-connected':
@@ -171,9 +483,12 @@ class Server(Object):
 
             '''
     }
-    def __init__(self, address, auth_secret = '', buffer_size=None):
+    def __init__(self, address, auth_secret = '', buffer_size=None, serializers=None):
         super(Server, self).__init__()
         self._auth_secret = py3_b(auth_secret)
+        self._serializers = serializers
+        # Fail early on unknown serializers.
+        _get_serializers(serializers)
         self._socket = kaa.Socket(buffer_size=buffer_size)
         self._socket.listen(address)
         self._socket.signals['new-client'].connect_weak(self._new_connection)
@@ -186,7 +501,8 @@ class Server(Object):
         """
         log.debug("New connection %s", client_sock)
         client_sock.buffer_size = self._socket.buffer_size
-        client = Channel(sock = client_sock, auth_secret = self._auth_secret)
+        client = Channel(sock = client_sock, auth_secret = self._auth_secret,
+                         serializers = self._serializers)
         for obj in self.objects:
             client.register(obj)
         client._send_auth_challenge()
@@ -247,7 +563,7 @@ class Channel(Object):
 
     channel_type = 'server'
 
-    def __init__(self, sock, auth_secret):
+    def __init__(self, sock, auth_secret, serializers=None):
         super(Channel, self).__init__()
         self._socket = sock
         self._authenticated = False
@@ -257,12 +573,26 @@ class Channel(Object):
         self._socket.chunk_size = 1024
         # Buffer containing packets deferred until after authentication.
         self._write_buffer_deferred = []
-        self._read_buffer = []
+        self._read_queue = _ReadQueue()
         self._callbacks = {}
         self._next_seq = 1
         self._rpc_in_progress = {}
         self._auth_secret = py3_b(auth_secret)
         self._pending_challenge = None
+        # Serializers we support in order of preference, and the one
+        # negotiated with the peer during authentication.
+        self._serializers = _get_serializers(serializers)
+        self._serializer = _serializers['pickle2']
+        # Whether the peer took part in negotiating the serializer, and so
+        # also understands the NOTE, MCAL, MRET and stream packets.
+        self._negotiated = False
+        # Streams from the peer's generators by seq, as weak references so
+        # that abandoned streams are stopped, and the ones a consumer waits
+        # for.  The remaining credit and the InProgress waiting for more of
+        # our own streams.
+        self._streams = {}
+        self._streams_waiting = {}
+        self._stream_credit = {}
 
         # Creates a circular reference so that RPC channels survive even when
         # there is no reference to them.  (Servers may not hold references to
@@ -277,6 +607,16 @@ class Channel(Object):
         return self._socket.connected and self._connect_inprogress.finished
 
 
+    @property
+    def serializer(self):
+        """
+        The name of the serializer used for calls and results on this channel.
+
+        This is only meaningful once the channel is connected.
+        """
+        return self._serializer.name
+
+
     def register(self, obj):
         """
         Registers one or more previously exposed callables to the peer
@@ -316,13 +656,93 @@ class Channel(Object):
         self._next_seq += 1
         # create InProgress object
         callback = kwargs.pop('_kaa_rpc_callback', kaa.InProgress())
-        payload = cPickle.dumps((cmd, args, kwargs), PICKLE_PROTOCOL)
+        payload = self._serializer.dumps((cmd, args, kwargs))
         self._send_packet(seq, 'CALL', payload)
         # callback with error handler
         self._rpc_in_progress[seq] = (callback, cmd)
         return callback
 
 
+    def notify(self, cmd, *args, **kwargs):
+        """
+        Call the remote command without waiting for a result.
+
+        The peer doesn't send a reply, and exceptions raised by the command
+        are only logged on the remote end.  Peers that don't support this
+        get a normal call whose reply is ignored.
+        """
+        if not CoreThreading.is_mainthread():
+            return kaa.MainThreadCallable(self.notify)(cmd, *args, **kwargs)
+
+        if not self.connected:
+            raise NotConnectedError()
+
+        payload = self._serializer.dumps((cmd, args, kwargs))
+        if self._negotiated:
+            self._send_packet(0, 'NOTE', payload)
+        else:
+            # Calls with seq 0 are never answered by us, and we ignore the
+            # answer from older peers.
+            self._send_packet(0, 'CALL', payload)
+
+
+    def batch(self):
+        """
+        Returns a :class:`~kaa.rpc.Batch` to issue many calls at once::
+
+            with client.batch() as batch:
+                a = batch.rpc('do_something', 6)
+                b = batch.rpc('do_something', foo=4)
+
+        Notifications can be added with ``batch.notify()`` as well.
+
+        Each call gets its own InProgress as with :meth:`rpc`, but all calls
+        are sent when the with block is left (or when ``batch.send()`` is
+        called) in a single packet, and the peer answers the calls that
+        don't return an InProgress in a single packet too.  With peers that
+        don't support this, the calls are sent as separate packets, but
+        still written at once.
+        """
+        return Batch(self)
+
+
+    def _send_calls(self, calls):
+        """
+        Sends calls collected by a Batch, given as (callback, cmd, args,
+        kwargs) tuples.  Notifications have no callback, and are sent with
+        seq 0.
+        """
+        if not self.connected:
+            # The channel was closed after the calls were added, so they
+            # will never be answered.
+            exc = NotConnectedError()
+            for callback, cmd, args, kwargs in calls:
+                if callback is not None:
+                    callback.throw(NotConnectedError, exc, None)
+            raise exc
+        packet = []
+        for callback, cmd, args, kwargs in calls:
+            if callback is None:
+                packet.append((0, cmd, args, kwargs))
+                continue
+            packet.append((self._next_seq, cmd, args, kwargs))
+            self._next_seq += 1
+        if self._negotiated:
+            self._send_packet(0, 'MCAL', self._serializer.dumps(packet))
+        else:
+            # The peer doesn't know MCAL, so send separate CALL packets in
+            # a single write.
+            data = []
+            for seq, cmd, args, kwargs in packet:
+                payload = self._serializer.dumps((cmd, args, kwargs))
+                data.append(struct.pack("I4sI", seq, 'CALL', len(payload)) + payload)
+            self._write(bl('').join(data))
+        for (callback, cmd, args, kwargs), call in zip(calls, packet):
+            seq = call[0]
+            if seq:
+                self._rpc_in_progress[seq] = (callback, cmd)
+
+
     def close(self):
         """
         Forcefully close the RPC channel.
@@ -338,7 +758,9 @@ class Channel(Object):
         """
         Writes data to the channel.
         """
-        cb = self._socket.write(data).exception.connect_weak(self._handle_close, False, write_failed=True)
+        # With wait=True, packets bigger than the socket's queue size are
+        # accepted, and subject to flow control instead.
+        cb = self._socket.write(data, wait=True).exception.connect_weak(self._handle_close, False, write_failed=True)
         cb.ignore_caller_args = True
 
 
@@ -370,6 +792,15 @@ class Channel(Object):
                 # Raise an error if this happens during runtime or if
                 # someone wants to get the result or exception.
                 callback.throw(IOError, IOError('kaa.rpc channel closed'), None)
+        while self._streams:
+            stream = self._streams.popitem()[1]()
+            if stream:
+                stream._finish((IOError, IOError('kaa.rpc channel closed'), None))
+        while self._stream_credit:
+            # Wake up suspended generators, so they stop.
+            waiting = self._stream_credit.popitem()[1][1]
+            if waiting and not waiting.finished:
+                waiting.finish(None)
 
         # Return False for reason explained above.
         return False
@@ -380,16 +811,9 @@ class Channel(Object):
         Invoked when a new chunk is read from the socket.  When not authenticated,
         chunk size is 1k; when authenticated it is 1M.
         """
-        self._read_buffer.append(data)
-        # Before we start into the loop, make sure we have enough data for
-        # a full packet.  For very large packets (if we just received a huge
-        # pickled object), this saves the string.join() which can be very
-        # expensive.  (This is the reason we use a list for our read buffer.)
-        buflen = sum(len(x) for x in self._read_buffer)
-        if buflen < RPC_PACKET_HEADER_SIZE:
-            return
-
-        if not self._authenticated and buflen > 1024:
+        queue = self._read_queue
+        queue.write(data)
+        if not self._authenticated and len(queue) > 1024:
             # Because we are not authenticated, we shouldn't have more than 1k
             # in the buffer.  If we do it's because the remote has sent a
             # large amount of data before completing authentication.
@@ -397,47 +821,35 @@ class Channel(Object):
             self.close()
             return
 
-        # Ensure the first block in the read buffer is big enough for a full
-        # packet header.  If it isn't, then we must have more than 1 block in
-        # the buffer, so keep merging blocks until we have a block big enough
-        # to be a header.  If we're here, it means that buflen >=
-        # RPC_PACKET_HEADER_SIZE, so we can safely loop.
-        while len(self._read_buffer[0]) < RPC_PACKET_HEADER_SIZE:
-            self._read_buffer[0] += self._read_buffer.pop(1)
-
-        # Make sure the the buffer holds enough data as indicated by the
-        # payload size in the header.
-        header = self._read_buffer[0][:RPC_PACKET_HEADER_SIZE]
-        payload_len = struct.unpack("I4sI", header)[2]
-        if buflen < payload_len + RPC_PACKET_HEADER_SIZE:
-            return
-
-        # At this point we know we have enough data in the buffer for the
-        # packet, so we merge the array into a single buffer.
-        strbuf = bl('').join(self._read_buffer)
-        self._read_buffer = []
-        while True:
-            if len(strbuf) <= RPC_PACKET_HEADER_SIZE:
-                if len(strbuf) > 0:
-                    self._read_buffer.append(py3_b(strbuf))
-                break
-            header = strbuf[:RPC_PACKET_HEADER_SIZE]
-            seq, packet_type, payload_len = struct.unpack("I4sI", header)
-            if len(strbuf) < payload_len + RPC_PACKET_HEADER_SIZE:
-                # We've also received portion of another packet that we
-                # haven't fully received yet.  Put back to the buffer what
-                # we have so far, and we can exit the loop.
-                self._read_buffer.append(strbuf)
+        while len(queue) >= RPC_PACKET_HEADER_SIZE:
+            seq, packet_type, payload_len = struct.unpack_from("I4sI", queue.peek(RPC_PACKET_HEADER_SIZE))
+            if not self._authenticated and payload_len != 60:
+                # Only auth packets with their 60 byte payload are allowed
+                # before authentication.  Don't wait for (or make room for)
+                # anything else.
+                log.warning("Unexpected packet from remote end before authentication; disconnecting")
+                self.close()
+                return
+            size = RPC_PACKET_HEADER_SIZE + payload_len
+            if len(queue) < size:
+                if self._authenticated:
+                    # Make room for the rest of the packet now, so that the
+                    # queue doesn't need to grow repeatedly while it arrives.
+                    queue.reserve(size - len(queue))
                 break
 
-            # Grab the payload for this packet, and shuffle strbuf to the
-            # next packet.
-            payload = strbuf[RPC_PACKET_HEADER_SIZE:RPC_PACKET_HEADER_SIZE + payload_len]
-            strbuf = strbuf[RPC_PACKET_HEADER_SIZE + payload_len:]
+            # The payload is a view into the read queue, which is only valid
+            # until the queue is written to again.  The packet handlers
+            # decode it before anything else can happen.
+            payload = queue.peek(size)[RPC_PACKET_HEADER_SIZE:]
+            queue.skip(size)
             if not self._authenticated:
                 self._handle_packet_before_auth(seq, packet_type, payload)
             else:
                 self._handle_packet_after_auth(seq, packet_type, payload)
+            if size > self._socket.chunk_size and not len(queue):
+                # Don't hold on to the memory needed for a large packet.
+                queue.clear(release=True)
 
 
     def _send_packet(self, seq, packet_type, payload):
@@ -450,6 +862,10 @@ class Channel(Object):
         if not self._authenticated and bl(packet_type) not in (bl('RESP'), bl('AUTH')):
             log.debug('delay packet %s', packet_type)
             self._write_buffer_deferred.append(header + payload)
+        elif len(payload) > 65536:
+            # Written separately to avoid copying a large payload.
+            self._write(header)
+            self._write(payload)
         else:
             self._write(header + payload)
 
@@ -458,7 +874,15 @@ class Channel(Object):
         """
         Send delayed answer when callback returns InProgress.
         """
-        payload = cPickle.dumps(answer, PICKLE_PROTOCOL)
+        if isinstance(answer, _stream_types):
+            self._send_stream(seq, answer)
+            return
+        try:
+            payload = self._serializer.dumps(answer)
+        except Exception:
+            # The result can't be encoded with the negotiated serializer,
+            # so let the caller know.
+            return self._send_exception(*sys.exc_info() + (seq,))
         self._send_packet(seq, 'RETN', payload)
 
 
@@ -474,50 +898,195 @@ class Channel(Object):
         self._send_packet(seq, 'EXCP', payload)
 
 
-    def _handle_packet_after_auth(self, seq, packet_type, payload):
+    @kaa.coroutine()
+    def _send_stream(self, seq, items):
         """
-        Handle incoming packet (called from _handle_write) after
-        authentication has been completed.
+        Sends the items of a generator returned by an exposed callable in
+        ITEM packets, followed by a DONE packet.  The generator is suspended
+        while the peer has STREAM_WINDOW items it hasn't consumed, and while
+        the socket's write queue is above its high watermark.
         """
-        if packet_type == bl('CALL'):
-            # Remote function call, send answer
-            function, args, kwargs = cPickle.loads(payload)
+        generator = isinstance(items, Generator)
+        if not self._negotiated:
+            # The peer doesn't know about streams, so send all items at once.
+            result = []
             try:
-                if self._callbacks[function]._kaa_rpc_param[0]:
-                    args = [ self ] + list(args)
-                result = self._callbacks[function](*args, **kwargs)
-            except Exception, e:
-                #log.exception('Exception in rpc function "%s"', function)
-                if not function in self._callbacks:
-                    log.error('%s - %s', function, self._callbacks.keys())
+                for item in items:
+                    result.append((yield item) if generator else item)
+            except Exception:
                 self._send_exception(*sys.exc_info() + (seq,))
-                return True
+            else:
+                self._send_answer(result, seq)
+            return
+
+        credit = self._stream_credit[seq] = [STREAM_WINDOW, None]
+        chunk = []
+        try:
+            for item in items:
+                if generator:
+                    if chunk and not item.finished:
+                        # Don't hold back items while the next one is produced.
+                        self._send_items(seq, chunk, credit)
+                    item = yield item
+                chunk.append(item)
+                if len(chunk) < STREAM_CHUNK and len(chunk) < credit[0]:
+                    continue
+                self._send_items(seq, chunk, credit)
+                while credit[0] <= 0 and seq in self._stream_credit:
+                    credit[1] = kaa.InProgress()
+                    yield credit[1]
+                if self._socket.write_queue_used > self._socket.write_watermarks[0]:
+                    yield self._socket.signals.subset('writable', 'closed').any()
+                if seq not in self._stream_credit:
+                    # Channel closed, or the peer stopped the stream.
+                    return
+            if chunk:
+                self._send_items(seq, chunk, credit)
+            self._send_packet(seq, 'DONE', '')
+        except Exception:
+            exc_info = sys.exc_info()
+            try:
+                # Items produced before the exception are still sent.
+                if chunk:
+                    self._send_items(seq, chunk, credit)
+            except Exception:
+                pass
+            self._send_exception(*exc_info + (seq,))
+        finally:
+            self._stream_credit.pop(seq, None)
+            if not generator:
+                items.close()
 
-            if isinstance(result, kaa.InProgress):
+
+    def _send_items(self, seq, chunk, credit):
+        """
+        Sends and empties a chunk of streamed items.
+        """
+        self._send_packet(seq, 'ITEM', self._serializer.dumps(chunk))
+        credit[0] -= len(chunk)
+        del chunk[:]
+
+
+    def _stream_abandoned(self, seq):
+        """
+        Invoked when a RemoteGenerator is no longer referenced before its
+        stream ended.  Stops the remote generator.
+        """
+        if not CoreThreading.is_mainthread():
+            return kaa.MainThreadCallable(self._stream_abandoned)(seq)
+        if self._streams.pop(seq, None) is not None:
+            self._send_packet(seq, 'STOP', '')
+
+
+    def _handle_call(self, seq, function, args, kwargs, results=None):
+        """
+        Invokes the exposed callable for a remote call and sends the answer.
+        If results is a list, a result that is available right away is
+        appended to it as (seq, result) instead.  Notifications have seq 0
+        and are not answered.
+        """
+        try:
+            if self._callbacks[function]._kaa_rpc_param[0]:
+                args = [ self ] + list(args)
+            result = self._callbacks[function](*args, **kwargs)
+        except Exception, e:
+            #log.exception('Exception in rpc function "%s"', function)
+            if not function in self._callbacks:
+                log.error('%s - %s', function, self._callbacks.keys())
+            if not seq:
+                log.exception('Exception in rpc notification "%s"', function)
+                return
+            self._send_exception(*sys.exc_info() + (seq,))
+            return
+
+        if not seq:
+            return
+
+        if isinstance(result, kaa.InProgress):
+            if results is None or not result.finished or result.failed:
                 result.connect(self._send_answer, seq)
                 result.exception.connect(self._send_exception, seq)
-            else:
-                self._send_answer(result, seq)
+                return
+            result = result.result
+
+        if results is None or isinstance(result, _stream_types):
+            self._send_answer(result, seq)
+        else:
+            results.append((seq, result))
+
 
+    def _handle_return(self, seq, result):
+        """
+        Finishes the InProgress of a call with the result sent by the peer.
+        """
+        callback, cmd = self._rpc_in_progress.get(seq, (None, None))
+        if callback is None:
+            return
+        del self._rpc_in_progress[seq]
+        callback.finish(result)
+
+
+    def _handle_packet_after_auth(self, seq, packet_type, payload):
+        """
+        Handle incoming packet (called from _handle_write) after
+        authentication has been completed.
+        """
+        if packet_type == bl('CALL'):
+            # Remote function call, send answer
+            function, args, kwargs = self._serializer.loads(payload)
+            self._handle_call(seq, function, args, kwargs)
             return True
 
         if packet_type == bl('RETN'):
             # RPC return
-            payload = cPickle.loads(payload)
-            callback, cmd = self._rpc_in_progress.get(seq)
-            if callback is None:
-                return True
-            del self._rpc_in_progress[seq]
-            callback.finish(payload)
+            self._handle_return(seq, self._serializer.loads(payload))
+            return True
+
+        if packet_type == bl('NOTE'):
+            # Remote function call without answer
+            function, args, kwargs = self._serializer.loads(payload)
+            self._handle_call(0, function, args, kwargs)
+            return True
+
+        if packet_type == bl('MCAL'):
+            # Many remote function calls.  Results available right away are
+            # sent back together, the others as they finish.
+            results = []
+            for seq, function, args, kwargs in self._serializer.loads(payload):
+                self._handle_call(seq, function, args, kwargs, results)
+            if results:
+                try:
+                    payload = self._serializer.dumps(results)
+                except Exception:
+                    # Some result can't be encoded; _send_answer() takes
+                    # care of reporting that to the caller.
+                    for seq, result in results:
+                        self._send_answer(result, seq)
+                else:
+                    self._send_packet(0, 'MRET', payload)
+            return True
+
+        if packet_type == bl('MRET'):
+            # Returns of many RPCs
+            for seq, result in self._serializer.loads(payload):
+                self._handle_return(seq, result)
             return True
 
         if packet_type == bl('EXCP'):
             # Exception for remote call
             try:
-                exc_value, stack = cPickle.loads(payload)
+                exc_value, stack = _loads(payload)
             except Exception, e:
                 exc_value, stack = e, ''
-            callback, cmd = self._rpc_in_progress.get(seq)
+            if seq in self._streams:
+                # Raised by a remote generator after it started streaming.
+                stream = self._streams.pop(seq)()
+                if stream is None:
+                    return True
+                remote_exc = RemoteException(exc_value, stack, stream._cmd)
+                stream._finish((remote_exc.__class__, remote_exc, None))
+                return True
+            callback, cmd = self._rpc_in_progress.get(seq, (None, None))
             if callback is None:
                 return True
             del self._rpc_in_progress[seq]
@@ -525,6 +1094,40 @@ class Channel(Object):
             callback.throw(remote_exc.__class__, remote_exc, None)
             return True
 
+        if packet_type in (bl('ITEM'), bl('DONE')):
+            # Items streamed by a remote generator, or its end.  The first
+            # of these packets finishes the call with a RemoteGenerator.
+            ref = self._streams.get(seq)
+            stream = ref and ref()
+            callback = None
+            if stream is None:
+                callback, cmd = self._rpc_in_progress.pop(seq, (None, None))
+                if callback is None:
+                    return True
+                stream = RemoteGenerator(self, seq, cmd)
+                self._streams[seq] = weakref.ref(stream, lambda ref: self._stream_abandoned(seq))
+            if packet_type == bl('ITEM'):
+                stream._add(self._serializer.loads(payload))
+            else:
+                del self._streams[seq]
+                stream._finish()
+            if callback:
+                callback.finish(stream)
+            return True
+
+        if packet_type in (bl('MORE'), bl('STOP')):
+            # The peer consumed items of, or stopped, one of our streams.
+            credit = self._stream_credit.get(seq)
+            if credit is None:
+                return True
+            if packet_type == bl('MORE'):
+                credit[0] += struct.unpack("I", payload)[0]
+            else:
+                del self._stream_credit[seq]
+            if credit[1] and not credit[1].finished:
+                credit[1].finish(None)
+            return True
+
         log.error('unknown packet type %s', packet_type)
         return True
 
@@ -580,6 +1183,15 @@ class Channel(Object):
         Step 1 happens when a new connection is initiated.  Steps 2-4 happen in
         this function.  3 packets are sent in this handshake (steps 1-3).
 
+        The serializer for calls and results is negotiated along the way,
+        using the seq field of the auth packets.  In step 1, the server sets
+        SERIALIZER_OFFER and the bits of the ids of the serializers it
+        supports.  In step 2, the client picks the first of its own
+        serializers the server offered (or pickle2 if there is none), and
+        replies with SERIALIZER_ANSWER and the id of its choice, which the
+        server checks in step 3.  Peers predating this send AUTH with a seq
+        of 0 and echo that seq in their RESP, and so get pickle2.
+
         WARNING: once authentication succeeds, there is implicit full trust.
         There is no security after that point, and it should be assumed that
         the client can invoke arbitrary calls on the server, and vice versa,
@@ -640,6 +1252,15 @@ class Channel(Object):
                 self.close()
                 return
 
+            if seq & SERIALIZER_OFFER:
+                # Choose the serializer we prefer among those offered.
+                for serializer in self._serializers + [_serializers['pickle2']]:
+                    if seq & (1 << serializer.id):
+                        break
+                self._serializer = serializer
+                self._negotiated = True
+                seq = SERIALIZER_ANSWER | serializer.id
+
             # Otherwise send the response, plus a challenge of our own.
             response, salt = self._get_challenge_response(challenge)
             self._pending_challenge = self._get_rand_value()
@@ -669,6 +1290,18 @@ class Channel(Object):
             if response != expected_response:
                 return panic(IOError('Peer failed authentication.'))
 
+            if len(challenge.strip(bl('\x00'))) != 0:
+                # Step 3: a reply to the offer of serializers is expected.
+                if seq & SERIALIZER_ANSWER:
+                    serializer = _serializers_by_id.get(seq & SERIALIZER_ID_MASK)
+                    if serializer not in self._serializers + [_serializers['pickle2']]:
+                        return panic(IOError('Peer chose a serializer that was not offered.'))
+                    self._serializer = serializer
+                    self._negotiated = True
+                else:
+                    # The peer doesn't know about serializer negotiation.
+                    self._serializer = _serializers['pickle2']
+
             # Challenge response was good, so the remote is considered
             # authenticated now.  We increase the chunk size on the socket
             # so we read more at once.
@@ -721,7 +1354,10 @@ class Channel(Object):
         """
         self._pending_challenge = self._get_rand_value()
         payload = struct.pack("20s20s20s", self._pending_challenge, '', '')
-        self._send_packet(0, 'AUTH', payload)
+        offer = SERIALIZER_OFFER
+        for serializer in self._serializers:
+            offer |= 1 << serializer.id
+        self._send_packet(offer, 'AUTH', payload)
 
 
     def _get_challenge_response(self, challenge, salt = None):
@@ -779,12 +1415,17 @@ CONNECTED = 'CONNECTED'
 class Client(Channel):
     """
     RPC client to be connected to a server.
+
+    serializers is a list of names of serializers (see
+    :func:`~kaa.rpc.register_serializer`) in order of preference.  The
+    first one the server also supports is used.  If None, pickle is used
+    if the server supports it, otherwise pickle2.
     """
 
     channel_type = 'client'
 
-    def __init__(self, address, auth_secret = '', buffer_size = None, retry = None):
-        super(Client, self).__init__(kaa.Socket(buffer_size), auth_secret)
+    def __init__(self, address, auth_secret = '', buffer_size = None, retry = None, serializers = None):
+        super(Client, self).__init__(kaa.Socket(buffer_size), auth_secret, serializers)
         self._socket.connect(address).exception.connect(self._handle_refused)
         self.monitoring = False
         if retry is not None:
@@ -832,7 +1473,9 @@ class Client(Channel):
             # reset variables
             self._authenticated = False
             self._pending_challenge = None
-            self._read_buffer = []
+            self._serializer = _serializers['pickle2']
+            self._negotiated = False
+            self._read_queue = _ReadQueue()
             self.status = CONNECTING
             self._socket = kaa.Socket(buffer_size)
             self._socket.chunk_size = 1024
@@ -849,6 +1492,10 @@ def expose(command=None, add_client=False, coroutine=False):
     """
     Decorator to expose a function. If add_client is True, the client
     object will be added to the command list as first argument.
+
+    If the function returns a generator or a :class:`~kaa.Generator` (e.g.
+    with :func:`kaa.generator`), its items are streamed to the caller, who
+    gets a :class:`~kaa.rpc.RemoteGenerator`.
     """
     def decorator(func):
         if coroutine:
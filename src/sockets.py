@@ -482,7 +482,7 @@ class Socket(IOChannel):
         # Note: this property is used in superclass's _update_read_monitor()
         # Unroll these properties: alive or super(readable)
         return (self._channel != None and not self._close_inprogress) or \
-               self._connecting or self._read_queue.tell() > 0
+               self._connecting or len(self._read_queue) > 0
 
 
     @property
@@ -699,10 +699,32 @@ class Socket(IOChannel):
         return self._channel.recv(size)
 
 
+    def _read_into(self, queue, size):
+        if type(self)._read != Socket._read:
+            # The subclass transforms what is read (e.g. TLSSocket), so this
+            # must go through _read().
+            return super(Socket, self)._read_into(queue, size)
+        nbytes = self._channel.recv_into(queue.reserve(size), size)
+        queue.commit(nbytes)
+        return nbytes
+
+
     def _write(self, data):
         return self._channel.send(data)
 
 
+    def _sendfile(self, fd, offset, count):
+        if not hasattr(os, 'sendfile') or type(self)._write != Socket._write:
+            return None
+        return os.sendfile(self.fileno, fd, offset, count)
+
+
+    def _writev(self, buffers):
+        if len(buffers) > 1 and hasattr(self._channel, 'sendmsg') and type(self)._write == Socket._write:
+            return self._channel.sendmsg(buffers)
+        return super(Socket, self)._writev(buffers)
+
+
     def _accept(self):
         """
         Accept a new connection and return a new Socket object.
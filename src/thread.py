@@ -40,6 +40,9 @@ import errno
 import types
 import time
 import ctypes
+import heapq
+import itertools
+import collections
 from thread import LockType
 
 # kaa imports
@@ -128,13 +131,38 @@ class MainThreadCallable(Callable):
 
             return in_progress
 
-        CoreThreading.queue_callback(self, args, kwargs, in_progress)
+        # Queue the wrapped callable itself; queueing self would create a
+        # second InProgress in the main thread just to chain it to this one.
+        CoreThreading.queue_callback(super(MainThreadCallable, self).__call__, args, kwargs, in_progress)
 
         # Return an InProgress object which the caller can connect to
         # or wait on.
         return in_progress
 
 
+    def batch(self, arglist):
+        """
+        Invokes the callable once for each item of arglist from the main thread.
+
+        :param arglist: a sequence of argument tuples, one for each invocation
+        :returns: a list of :class:`~kaa.InProgress` objects, one for each
+                  invocation, in the order of arglist
+
+        All invocations are queued together and cost a single wakeup of the
+        main loop, which makes this considerably cheaper than calling the
+        MainThreadCallable in a loop when a thread produces many results::
+
+            update = kaa.MainThreadCallable(model.update)
+            update.batch([(row,) for row in rows])
+        """
+        if CoreThreading.is_mainthread():
+            return [self(*args) for args in arglist]
+        invoke = super(MainThreadCallable, self).__call__
+        callbacks = [(invoke, tuple(args), {}, InProgress()) for args in arglist]
+        CoreThreading.queue_callbacks(callbacks)
+        return [in_progress for callback, args, kwargs, in_progress in callbacks]
+
+
 class ThreadInProgress(InProgress):
     """
     An :class:`~kaa.InProgress` class that represents threaded tasks.  You will
@@ -474,32 +502,42 @@ class _ThreadPoolMember(threading.Thread):
         """
         Thread main function.
         """
+        pool = self.pool
         while not self.stopped:
             # get a new job to process
-            self.pool._condition.acquire()
+            pool._condition.acquire()
             t0 = time.time()
-            while not self.pool._queue and not self.stopped:
+            while not pool._queued and not self.stopped:
                 # nothing to do, wait
-                self.pool._condition.wait(self.pool._timeout - (time.time() - t0))
-                if time.time() - t0 >= self.pool._timeout:
+                pool._condition.wait(pool._timeout - (time.time() - t0))
+                if time.time() - t0 >= pool._timeout:
                     # Timeout waiting for a job, exit.
-                    self.pool._condition.release()
+                    pool._condition.release()
                     return self._exit()
 
             if self.stopped:
-                self.pool._condition.release()
+                pool._condition.release()
                 return self._exit()
 
-            job = self.pool._queue.pop(0)
-            self.pool._busy += 1
-            self.pool._condition.release()
-            job()
-            self.pool._busy -= 1
+            job = pool._pop()
+            t1 = time.time()
+            pool._wait_time += t1 - job._enqueued
+            pool._busy += 1
+            pool._condition.release()
+            pool._notify()
+            try:
+                job()
+            finally:
+                pool._condition.acquire()
+                pool._busy -= 1
+                pool._completed += 1
+                pool._run_time += time.time() - t1
+                pool._condition.release()
 
         self._exit()
 
 
-class ThreadPool(object):
+class ThreadPool(Object):
     """
     Manages a pool of one or more threads for use with the
     :func:`@kaa.threaded() <kaa.threaded>` decorator, or
@@ -508,25 +546,101 @@ class ThreadPool(object):
     ThreadPool objects may be assigned a name by calling
     :func:`kaa.register_thread_pool`.  When done, the name can be referenced
     instead of passing the ThreadPool object.
+
+    By default the work queue is unbounded.  If ``max_queued`` is given,
+    :meth:`enqueue` blocks while the queue is full, and :meth:`submit` offers
+    asynchronous backpressure::
+
+        @kaa.coroutine()
+        def produce(pool, items):
+            for item in items:
+                # Resumes once the job is queued.
+                yield pool.submit(kaa.Callable(process, item))
     """
-    def __init__(self, size=1):
+    __kaasignals__ = {
+        'high-watermark':
+            """
+            Emitted when the number of queued jobs reaches the high watermark.
+
+            .. describe:: def callback()
+
+               The callback takes no arguments.
+
+            Producers can connect to this signal to stop adding jobs until
+            the :attr:`~ThreadPool.signals.low-watermark` signal is emitted.
+            This signal is always emitted from the main thread.
+            """,
+
+        'low-watermark':
+            """
+            Emitted when the number of queued jobs has dropped to the low
+            watermark after the high watermark was reached.
+
+            .. describe:: def callback()
+
+               The callback takes no arguments.
+
+            This signal is always emitted from the main thread.
+            """
+    }
+
+    def __init__(self, size=1, max_queued=0, high_watermark=None, low_watermark=None):
         """
         :param size: maximum number of threads this thread pool will grow to.
         :type size: int
+        :param max_queued: maximum number of jobs waiting in the queue, or 0
+                           for no limit.
+        :type max_queued: int
+        :param high_watermark: number of queued jobs at which the
+                               :attr:`~ThreadPool.signals.high-watermark`
+                               signal is emitted; defaults to ``max_queued``.
+        :type high_watermark: int
+        :param low_watermark: number of queued jobs at which the
+                              :attr:`~ThreadPool.signals.low-watermark` signal is
+                              emitted; defaults to half the high watermark.
+        :type low_watermark: int
         """
+        super(ThreadPool, self).__init__()
         self._size = size
         # List of ThreadPoolMember objects for this thread pool.
         self._members = []
-        # Shared condition for all pool members
-        self._condition = threading.Condition()
-        # Shared work queue of 2-tuples (callback, priority)
+        # Shared condition for all pool members, and a condition on the same
+        # lock for threads blocked in enqueue() because the queue is full.
+        lock = threading.RLock()
+        self._condition = threading.Condition(lock)
+        self._not_full = threading.Condition(lock)
+        # Shared work queue: a heap of (-priority, sequence, job).  The
+        # sequence keeps FIFO order for jobs with the same priority.  Jobs
+        # removed by dequeue() stay in the heap until they are popped, so
+        # _queued is the number of jobs actually waiting.
         self._queue = []
+        self._sequence = itertools.count()
+        self._queued = 0
         # Shared thread timeout.
         self._timeout = 30
         # Thread pool name.  Set using register_thread_pool()
         self._name = None
         # Number of pool members that are busy.
         self._busy = 0
+        # Counters for the counters property.
+        self._completed = 0
+        self._cancelled = 0
+        self._wait_time = 0.0
+        self._run_time = 0.0
+        # Queue limit and watermarks.  _above_high is True between the
+        # emission of the high-watermark and the low-watermark signals.
+        self._max_queued = max_queued
+        self._high_watermark = high_watermark or max_queued
+        if low_watermark is None:
+            low_watermark = self._high_watermark // 2
+        self._low_watermark = low_watermark
+        self._above_high = False
+        # Jobs from submit() waiting for space in the queue, as 3-tuples
+        # (submission, job, priority)
+        self._waiting = collections.deque()
+        # Callbacks to invoke from the main thread once the condition is
+        # released, see _notify()
+        self._notifications = []
 
 
     def __repr__(self):
@@ -541,7 +655,7 @@ class ThreadPool(object):
         Grows or shrinks pool members based on current number of jobs and
         size limits.
         """
-        while len(self._members) - self._busy < len(self._queue) and len(self._members) < self._size:
+        while len(self._members) - self._busy < self._queued and len(self._members) < self._size:
             # We have jobs waiting and slots free, so spawn new members.
             member = _ThreadPoolMember(self, '%s#%d' % (self._name, len(self._members)+1))
             self._members.append(member)
@@ -553,6 +667,70 @@ class ThreadPool(object):
             self._members.pop().stop()
 
 
+    def _prepare(self, callback, priority):
+        if not isinstance(callback, ThreadInProgress):
+            callback = ThreadInProgress(callback)
+
+        callback.priority = priority
+        # Aborting a job that is still queued removes it from the queue.
+        callback.signals['abort'].connect(lambda exc: self._cancel(callback))
+        return callback
+
+
+    def _full(self):
+        return self._max_queued and self._queued >= self._max_queued
+
+
+    def _push(self, job, priority):
+        """
+        Adds the job to the queue.  Must be called with the condition held.
+        """
+        job._enqueued = time.time()
+        job._queued_in = self
+        heapq.heappush(self._queue, (-priority, next(self._sequence), job))
+        self._queued += 1
+        if self._high_watermark and not self._above_high and self._queued >= self._high_watermark:
+            self._above_high = True
+            self._notifications.append((self.signals['high-watermark'].emit,))
+        self._resize()
+        self._condition.notify()
+
+
+    def _freed(self):
+        """
+        Called with the condition held whenever the number of queued jobs has
+        decreased.
+        """
+        while self._waiting and not self._full():
+            submission, job, priority = self._waiting.popleft()
+            self._push(job, priority)
+            self._notifications.append((submission.finish, None))
+        if not self._full() and not self._waiting:
+            self._not_full.notifyAll()
+        if self._above_high and self._queued <= self._low_watermark:
+            self._above_high = False
+            self._notifications.append((self.signals['low-watermark'].emit,))
+
+
+    def _notify(self):
+        """
+        Invokes the callbacks collected by _push() and _freed() from the main
+        thread.  Must be called without holding the condition.
+        """
+        if self._notifications:
+            MainThreadCallable(self._emit_notifications)()
+
+
+    def _emit_notifications(self):
+        # As only the main thread takes the notifications, they are emitted
+        # in the order they were collected, whichever thread calls _notify().
+        self._condition.acquire()
+        notifications, self._notifications = self._notifications, []
+        self._condition.release()
+        for notification in notifications:
+            notification[0](*notification[1:])
+
+
     def enqueue(self, callback, priority=0):
         """
         Creates a job from the given callback and adds it to the thread pool
@@ -566,22 +744,75 @@ class ThreadPool(object):
         :type priority: int
         :returns: a :class:`~kaa.ThreadInProgress` object for this job.
 
+        If the queue is full (see :attr:`max_queued`), this method blocks the
+        calling thread until there is space in the queue.  Use :meth:`submit`
+        instead to avoid blocking the main loop.
+
         It should generally not be necessary to call this method directly.
         It is called implicitly when using the :func:`@kaa.threaded() <kaa.threaded>`
         decorator, or :class:`~kaa.ThreadPoolCallable` objects.
         """
-        if not isinstance(callback, ThreadInProgress):
-            callback = ThreadInProgress(callback)
+        callback = self._prepare(callback, priority)
+        self._condition.acquire()
+        try:
+            while self._full() or self._waiting:
+                self._not_full.wait()
+            self._push(callback, priority)
+        finally:
+            self._condition.release()
+        self._notify()
+        return callback
 
-        callback.priority = priority
 
+    def submit(self, callback, priority=0):
+        """
+        Adds a job to the work queue once there is space in the queue.
+
+        :param callback: a callable which will be invoked inside one of the
+                         pool threads.
+        :type callback: callable
+        :param priority: determines the relative priority of the job; higher
+                         values are higher priority.
+        :type priority: int
+        :returns: an :class:`~kaa.InProgress` finished (with None) when the job
+                  has been added to the queue.  The :class:`~kaa.ThreadInProgress`
+                  for the job itself is available as the ``job`` attribute.
+
+        Jobs waiting for space are queued in the order they were submitted.
+        Aborting the returned InProgress withdraws the job if it is still
+        waiting for space.
+        """
+        job = self._prepare(callback, priority)
+        submission = InProgress(abortable=True)
+        submission.job = job
+        entry = submission, job, priority
         self._condition.acquire()
-        self._queue.append(callback)
-        self._queue.sort(key=lambda job: job.priority, reverse=True)
-        self._resize()
-        self._condition.notify()
-        self._condition.release()
-        return callback
+        try:
+            queued = not self._full() and not self._waiting
+            if queued:
+                self._push(job, priority)
+            else:
+                self._waiting.append(entry)
+        finally:
+            self._condition.release()
+        self._notify()
+        if queued:
+            submission.finish(None)
+        else:
+            submission.signals['abort'].connect(lambda exc: self._withdraw(entry))
+        return submission
+
+
+    def _withdraw(self, entry):
+        # Abort handler for jobs waiting in submit().
+        self._condition.acquire()
+        try:
+            self._waiting.remove(entry)
+            self._cancelled += 1
+        except ValueError:
+            pass
+        finally:
+            self._condition.release()
 
 
     def dequeue(self, job):
@@ -595,13 +826,102 @@ class ThreadPool(object):
         """
         self._condition.acquire()
         try:
-            self._queue.remove(job)
-        except ValueError:
-            found = False
-        else:
-            found = True
+            if getattr(job, '_queued_in', None) is not self:
+                return False
+            # The heap entry is discarded by _pop(), unless cancelled jobs
+            # make up most of the heap.
+            job._queued_in = None
+            self._queued -= 1
+            self._cancelled += 1
+            if len(self._queue) > 2 * self._queued + 64:
+                self._queue = [entry for entry in self._queue if entry[2]._queued_in is self]
+                heapq.heapify(self._queue)
+            self._freed()
+            return True
+        finally:
+            self._condition.release()
+            self._notify()
+
+
+    def _cancel(self, job):
+        # Abort handler for queued jobs.  Must not return False, which would
+        # prevent the abort.
+        self.dequeue(job)
+
+
+    def _pop(self):
+        """
+        Removes and returns the job with the highest priority.  Must be
+        called with the condition held, and only if _queued is non-zero.
+        """
+        while True:
+            job = heapq.heappop(self._queue)[2]
+            if job._queued_in is self:
+                job._queued_in = None
+                self._queued -= 1
+                self._freed()
+                return job
+
+
+    @property
+    def queued(self):
+        """
+        The number of jobs waiting to be processed.
+        """
+        return self._queued
+
+
+    @property
+    def running(self):
+        """
+        The number of jobs currently being processed.
+        """
+        return self._busy
+
+
+    @property
+    def max_queued(self):
+        """
+        The maximum number of jobs waiting in the queue, or 0 for no limit.
+
+        When the queue is full, :meth:`enqueue` blocks and jobs added with
+        :meth:`submit` wait for space.
+        """
+        return self._max_queued
+
+    @max_queued.setter
+    def max_queued(self, value):
+        self._condition.acquire()
+        self._max_queued = value
+        self._freed()
         self._condition.release()
-        return found
+        self._notify()
+
+
+    @property
+    def counters(self):
+        """
+        A dict of counters for the jobs of this pool:
+
+          * ``queued``: number of jobs waiting to be processed
+          * ``waiting``: number of jobs from :meth:`submit` waiting for space
+            in the queue
+          * ``running``: number of jobs currently being processed
+          * ``completed``: number of jobs processed so far
+          * ``cancelled``: number of jobs removed from the queue before they
+            were processed (via :meth:`dequeue` or by aborting the job)
+          * ``wait_time``: total time in seconds the processed jobs had to
+            wait in the queue
+          * ``run_time``: total time in seconds spent processing jobs
+        """
+        self._condition.acquire()
+        try:
+            return dict(queued=self._queued, waiting=len(self._waiting),
+                        running=self._busy, completed=self._completed,
+                        cancelled=self._cancelled, wait_time=self._wait_time,
+                        run_time=self._run_time)
+        finally:
+            self._condition.release()
 
 
     @property
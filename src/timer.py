@@ -25,8 +25,8 @@
 from __future__ import absolute_import
 
 __all__ = [ 'timed', 'Timer', 'WeakTimer', 'OneShotTimer', 'WeakOneShotTimer',
-            'AtTimer', 'OneShotAtTimer', 'delay', 'POLICY_ONCE', 'POLICY_MANY',
-            'POLICY_RESTART' ]
+            'AtTimer', 'OneShotAtTimer', 'delay', 'wakeups_saved', 'POLICY_ONCE',
+            'POLICY_MANY', 'POLICY_RESTART' ]
 
 import logging
 import datetime
@@ -48,7 +48,7 @@ POLICY_RESTART = 'restart'
 log = logging.getLogger('kaa.base.core.timer')
 
 
-def timed(interval, timer=None, policy=POLICY_MANY):
+def timed(interval, timer=None, policy=POLICY_MANY, slack=0):
     """
     Decorator to call the decorated function in a Timer. When calling the
     function, a timer will be started with the given interval calling that
@@ -71,6 +71,10 @@ def timed(interval, timer=None, policy=POLICY_MANY):
     Note that in the case of POLICY_ONCE or POLICY_RESTART, if the timer is
     currently running, any arguments passed to the decorated function on
     subsequent calls will be discarded.
+
+    The slack parameter is passed to :meth:`~kaa.Timer.start` and allows
+    the notifier to delay the timer by up to that many seconds so it can fire
+    together with other timers.
     """
     if not policy in (POLICY_MANY, POLICY_ONCE, POLICY_RESTART):
         raise ValueError('Invalid @kaa.timed policy %s' % policy)
@@ -81,7 +85,7 @@ def timed(interval, timer=None, policy=POLICY_MANY):
             if policy == POLICY_MANY:
                 # just start the timer
                 t = (timer or Timer)(func, *args, **kwargs)
-                t.start(interval)
+                t.start(interval, slack=slack)
                 return True
             store = DecoratorDataStore(func, newfunc, args)
             # check current timer
@@ -94,13 +98,25 @@ def timed(interval, timer=None, policy=POLICY_MANY):
             # create new timer, store it in the object and start it
             t = (timer or Timer)(func, *args, **kwargs)
             store.timer = weakref(t)
-            t.start(interval)
+            t.start(interval, slack=slack)
             return True
         return newfunc
 
     return decorator
 
 
+def wakeups_saved():
+    """
+    Returns the number of main loop wakeups saved so far by coalescing timers
+    started with slack.
+
+    Each timer deadline that was handled by a wakeup scheduled for a different
+    deadline counts as one saved wakeup.  Only the generic notifier coalesces
+    timers; for other notifiers this is always 0.
+    """
+    return notifier.timer_wakeups_saved()
+
+
 def delay(seconds):
     """
     Returns an InProgress that finishes after the given time in seconds.
@@ -130,8 +146,10 @@ class Timer(notifier.NotifierCallback):
     If it returns any other value (including None), the timer will continue
     to fire.
     """
+    _stats_name = 'timer'
 
     __interval = None
+    __slack = 0
 
     def __init__(self, callback, *args, **kwargs):
         """
@@ -144,7 +162,7 @@ class Timer(notifier.NotifierCallback):
 
 
     @thread.threaded(thread.MAINTHREAD)
-    def start(self, interval, now=False):
+    def start(self, interval, now=False, slack=0):
         """
         Start the timer, invoking the callback every *interval* seconds.
 
@@ -153,6 +171,10 @@ class Timer(notifier.NotifierCallback):
         :param now: if True, invoke the callback once immediately before starting
                     the timer.
         :type now: bool
+        :param slack: number of seconds the timer may fire late, so that the
+                      notifier can fire it together with other timers in a single
+                      wakeup of the main loop.
+        :type slack: float
 
         If the timer is already running, it is stopped and restarted with
         the given interval.  The timer's precision is at the mercy of other
@@ -162,6 +184,10 @@ class Timer(notifier.NotifierCallback):
 
         This method may safely be called from a thread, however the timer
         callback will be invoked from the main thread.
+
+        Timers for housekeeping tasks that do not need millisecond precision
+        should pass a *slack* so that they cause fewer wakeups of the main loop.
+        See :func:`kaa.timer.wakeups_saved`.
         """
         if self.active:
             if not self.restart_when_active:
@@ -169,8 +195,12 @@ class Timer(notifier.NotifierCallback):
             self.unregister()
         if now:
             self()
-        self._id = notifier.timer_add(int(interval * 1000), self)
+        if slack:
+            self._id = notifier.timer_add(int(interval * 1000), self, int(slack * 1000))
+        else:
+            self._id = notifier.timer_add(int(interval * 1000), self)
         self.__interval = interval
+        self.__slack = slack
 
 
     @property
@@ -183,6 +213,15 @@ class Timer(notifier.NotifierCallback):
         return self.__interval
 
 
+    @property
+    def slack(self):
+        """
+        Number of seconds the timer may fire late in favor of fewer main loop
+        wakeups, as passed to :meth:`~kaa.Timer.start`.
+        """
+        return self.__slack
+
+
     @thread.threaded(thread.MAINTHREAD)
     def stop(self):
         """
@@ -0,0 +1,49 @@
+import os
+import sys
+
+import kaa
+from kaa.base.io import IO_EXCEPT
+
+try:
+    import asyncio
+except ImportError:
+    try:
+        import trollius as asyncio
+    except ImportError:
+        asyncio = None
+
+if asyncio is None:
+    # Selecting the notifier fails right away.
+    try:
+        kaa.main.init('asyncio')
+    except ImportError, e:
+        print 'asyncio notifier unavailable: %s' % e
+        sys.exit(0)
+    raise AssertionError('asyncio notifier selected without asyncio')
+
+kaa.main.init('asyncio')
+
+# asyncio can't watch for exceptional conditions.
+r, w = os.pipe()
+try:
+    kaa.IOMonitor(lambda: None).register(r, IO_EXCEPT)
+except ValueError, e:
+    print 'IO_EXCEPT: %s' % e
+else:
+    raise AssertionError('IO_EXCEPT registered')
+
+# The loop is not reentrant, so wait() fails in callbacks, even if an
+# exception handler keeps the main loop alive.
+kaa.main.signals['exception'].connect(lambda tp, value, tb: not issubclass(tp, RuntimeError))
+
+def callback():
+    try:
+        kaa.delay(0.1).wait()
+    except RuntimeError, e:
+        print 'wait(): %s' % e
+    else:
+        raise AssertionError('wait() in callback succeeded')
+    kaa.main.stop()
+
+kaa.OneShotTimer(callback).start(0)
+kaa.main.run()
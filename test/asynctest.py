@@ -111,6 +111,18 @@ def foo():
     # just break here and return again in the next mainloop iteration
     yield kaa.NotFinished
 
+    # InProgressAny passes on an exception as it was thrown
+    def fail(ip):
+        try:
+            raise ValueError('failed')
+        except ValueError:
+            ip.throw(*sys.exc_info())
+    failed = kaa.InProgress()
+    kaa.OneShotTimer(fail, failed).start(0.1)
+    n, (tp, exc, tb) = yield kaa.InProgressAny(kaa.delay(2), failed)
+    print 'InProgressAny returned:', n, tp.__name__, exc
+    assert(n == 1 and tp is ValueError and type(exc) is ValueError and tb is not None)
+
     # call some async function with different types of
     # results (given as parameter)
     
@@ -0,0 +1,89 @@
+import sys
+import time
+
+import kaa
+
+# Measures coroutine scheduling overhead: many coroutines yielding
+# kaa.NotFinished, coroutines waiting on each other, deeply nested coroutines,
+# and the latency of a timer while CPU-heavy coroutines are running.
+
+@kaa.coroutine()
+def spin(steps):
+    for i in xrange(steps):
+        yield kaa.NotFinished
+
+@kaa.coroutine()
+def consumer(channel, count):
+    for i in xrange(count):
+        channel[0] = kaa.InProgress()
+        yield channel[0]
+
+@kaa.coroutine()
+def producer(channel, count):
+    for i in xrange(count):
+        channel[0].finish(i)
+        yield kaa.NotFinished
+
+@kaa.coroutine()
+def nested(depth):
+    if depth:
+        yield nested(depth - 1)
+    else:
+        yield kaa.NotFinished
+
+@kaa.coroutine()
+def busy(steps):
+    for i in xrange(steps):
+        t0 = time.time()
+        while time.time() - t0 < 0.002:
+            pass
+        yield kaa.NotFinished
+
+def run(name, ips, count):
+    iterations = [0]
+    def step():
+        iterations[0] += 1
+    kaa.main.signals['step'].connect(step)
+    t0 = time.time()
+    kaa.InProgressAll(*ips).wait()
+    t1 = time.time()
+    kaa.main.signals['step'].disconnect(step)
+    print '%-40s %8d /s, %6d main loop iterations' % (name, count / (t1 - t0), iterations[0])
+
+kaa.main.init()
+
+t0 = time.time()
+ips = [spin(100) for i in xrange(1000)]
+print '%-40s %8d /s' % ('create 1000 coroutines', 1000 / (time.time() - t0))
+run('NotFinished steps (1000 coroutines)', ips, 100000)
+
+ips = []
+for i in xrange(100):
+    channel = [None]
+    ips.append(consumer(channel, 500))
+    ips.append(producer(channel, 500))
+run('InProgress handoffs (100 pairs)', ips, 50000)
+
+try:
+    run('nested coroutines (depth 120)', [nested(120)], 120)
+except RuntimeError, e:
+    print '%-40s failed: %s' % ('nested coroutines (depth 120)', e)
+
+latency = []
+def tick(last=[time.time()]):
+    now = time.time()
+    latency.append(now - last[0] - 0.01)
+    last[0] = now
+timer = kaa.Timer(tick)
+timer.start(0.01)
+run('busy steps (20 coroutines), 2ms each', [busy(25) for i in xrange(20)], 500)
+timer.stop()
+print '%-40s %8.1f ms' % ('mean latency of a 10ms timer', sum(latency) / len(latency) * 1000)
+
+if hasattr(kaa, 'CoroutineScheduler'):
+    kaa.CoroutineScheduler.time_slice = 0.01
+    latency = []
+    timer.start(0.01)
+    run('same, with a time slice of 10ms', [busy(25) for i in xrange(20)], 500)
+    timer.stop()
+    print '%-40s %8.1f ms' % ('mean latency of a 10ms timer', sum(latency) / len(latency) * 1000)
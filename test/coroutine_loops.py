@@ -0,0 +1,42 @@
+import sys
+import time
+
+import kaa
+
+# Coroutines in the run queue must keep being scheduled after a main loop
+# run or stepped from a callback (e.g. by InProgress.wait() or
+# kaa.main.step()) returns, also when they were first scheduled within that
+# loop.
+
+STEPS = 200
+count = { 'wait': 0, 'step': 0 }
+
+@kaa.coroutine()
+def spin(name, steps):
+    for i in range(steps):
+        time.sleep(0.002)
+        count[name] += 1
+        yield kaa.NotFinished
+
+def step():
+    # The coroutine is started by the first step.
+    kaa.OneShotTimer(spin, 'step', 3).start(0)
+    for i in range(10):
+        kaa.main.step(sleep=False)
+    print 'step(): %d/3 coroutine steps' % count['step']
+    kaa.OneShotTimer(wait).start(0)
+
+def wait():
+    # The coroutine is started in the nested main loop.
+    kaa.OneShotTimer(spin, 'wait', STEPS).start(0)
+    kaa.delay(0.05).wait()
+    kaa.OneShotTimer(check, time.time()).start(0.1)
+
+def check(t0):
+    if count['wait'] < STEPS and time.time() - t0 < 5:
+        return kaa.OneShotTimer(check, t0).start(0.1)
+    print 'wait(): %d/%d coroutine steps' % (count['wait'], STEPS)
+    sys.exit(0)
+
+kaa.OneShotTimer(step).start(0)
+kaa.main.run()
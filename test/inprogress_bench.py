@@ -0,0 +1,84 @@
+import gc
+import time
+import resource
+
+import kaa
+
+# Measures memory per InProgress instance and the throughput of creating and
+# finishing InProgress objects.
+
+N = 200000
+
+def rss():
+    # ru_maxrss is in kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def bench(name, func, n=N):
+    t0 = time.time()
+    for i in xrange(n):
+        func(i)
+    print '%-36s %8d /s' % (name, n / (time.time() - t0))
+
+def callback(result):
+    pass
+
+def create_finish_connect(i):
+    ip = kaa.InProgress()
+    ip.connect(callback)
+    ip.finish(i)
+
+def create_throw(i):
+    ip = kaa.InProgress()
+    ip.exception.connect(lambda *args: False)
+    try:
+        raise ValueError
+    except ValueError:
+        ip.throw()
+
+def create_abort(i):
+    ip = kaa.InProgress()
+    ip.signals['abort'].connect(callback)
+    try:
+        ip.abort()
+    except kaa.InProgressAborted:
+        pass
+
+gc.collect()
+before = rss()
+ips = [kaa.InProgress() for i in xrange(N)]
+print 'memory per unfinished InProgress: %d bytes' % ((rss() - before) * 1024 / N)
+del ips
+
+bench('InProgress()', lambda i: kaa.InProgress())
+bench('InProgress().finish()', lambda i: kaa.InProgress().finish(i))
+bench('connect() + finish()', create_finish_connect)
+bench('exception.connect() + throw()', create_throw, N / 10)
+bench('signals[abort].connect() + abort()', create_abort, N / 10)
+if hasattr(kaa, 'finished'):
+    bench('kaa.finished(None)', lambda i: kaa.finished(None))
+
+# Joining many InProgress objects.
+J = 50000
+
+def join(cls, n=J):
+    ips = [kaa.InProgress() for i in xrange(n)]
+    t0 = time.time()
+    ip = cls(ips)
+    ip.connect(callback)
+    t1 = time.time()
+    for child in ips:
+        if not child.finished:
+            child.finish(None)
+    print '%-36s %8.3fs connect %8.3fs finish' % ('%s of %d' % (cls.__name__, n), t1 - t0, time.time() - t1)
+
+join(kaa.InProgressAll)
+join(kaa.InProgressAny)
+if hasattr(kaa, 'as_completed'):
+    ips = [kaa.InProgress() for i in xrange(J)]
+    t0 = time.time()
+    completed = kaa.as_completed(ips)
+    for child in ips:
+        child.finish(None)
+    for ip in completed:
+        pass
+    print '%-36s %8.3fs' % ('as_completed() of %d' % J, time.time() - t0)
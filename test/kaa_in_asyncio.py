@@ -0,0 +1,48 @@
+import kaa
+import kaa.asyncio
+
+try:
+    import asyncio
+    from asyncio import From, Return
+except ImportError:
+    import trollius as asyncio
+    from trollius import From, Return
+
+# method can be either
+# 0: kaa.main.run() drives the shared loop
+# 1: the asyncio loop is run by asyncio
+method = 0
+
+kaa.main.init('asyncio')
+loop = kaa.asyncio.get_event_loop()
+
+@kaa.coroutine()
+def kaa_coroutine():
+    # kaa coroutines can yield asyncio futures
+    future = asyncio.Future(loop=loop)
+    loop.call_later(0.5, future.set_result, 'result from asyncio')
+    result = yield future
+    print 'kaa coroutine got', result, kaa.is_mainthread()
+    yield kaa.delay(0.5)
+    yield 'result from kaa'
+
+@asyncio.coroutine
+def asyncio_coroutine():
+    # asyncio coroutines can wait for InProgress objects
+    result = yield From(kaa.asyncio.to_future(kaa_coroutine()))
+    print 'asyncio coroutine got', result, kaa.is_mainthread()
+    raise Return(result)
+
+def kaa_callback():
+    print 'kaa timer', kaa.is_mainthread()
+
+kaa.Timer(kaa_callback).start(0.3)
+task = asyncio.ensure_future(asyncio_coroutine(), loop=loop)
+
+if method == 0:
+    kaa.asyncio.from_future(task).connect(lambda result: kaa.main.stop())
+    kaa.main.run()
+else:
+    loop.run_until_complete(task)
+
+print 'done'
@@ -0,0 +1,50 @@
+import sys
+import os
+import time
+import resource
+
+import kaa
+
+# Measures the time of one main loop step depending on the number of
+# registered IOMonitors.  Only one pipe is readable in each step, so an
+# O(ready fds) notifier should show constant step latency.
+#
+# usage: notifier_bench.py [generic|poll|epoll]
+
+module = sys.argv[1] if len(sys.argv) > 1 else 'epoll'
+counts = [ 10, 100, 500, 1000, 2000, 5000 ]
+steps = 2000
+
+soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+kaa.main.init(module)
+
+pipes = []
+monitors = []
+
+def readable(fd):
+    os.read(fd, 1)
+    os.write(pipes[0][1], 'x')
+
+print 'notifier %s: %d steps per measurement' % (module, steps)
+for count in counts:
+    if count * 2 + 20 > hard:
+        print '%6d monitors: not enough file descriptors' % count
+        break
+    if module == 'generic' and count * 2 + 20 > 1024:
+        print '%6d monitors: exceeds FD_SETSIZE for select()' % count
+        break
+    while len(pipes) < count:
+        pipe = os.pipe()
+        monitor = kaa.IOMonitor(readable, pipe[0])
+        monitor.register(pipe[0])
+        pipes.append(pipe)
+        monitors.append(monitor)
+    if count == len(pipes) and len(pipes) == counts[0]:
+        # Start ping-pong on the first pipe
+        os.write(pipes[0][1], 'x')
+    t0 = time.time()
+    for i in xrange(steps):
+        kaa.main.step()
+    t1 = time.time()
+    print '%6d monitors: %8.2f us per step' % (count, (t1 - t0) * 1000000 / steps)
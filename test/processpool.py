@@ -0,0 +1,87 @@
+import os
+import time
+import hashlib
+
+import kaa
+
+# Functions executed by the pool must be defined at module level.  As the
+# worker processes import this script, the main code must be protected by
+# the __name__ check at the bottom.
+
+@kaa.processed()
+def checksum(data, rounds):
+    digest = data
+    for i in xrange(rounds):
+        digest = hashlib.sha1(digest).digest()
+    return os.getpid(), hashlib.sha1(digest).hexdigest()
+
+@kaa.processed()
+def fail():
+    raise ValueError('raised in pid %d' % os.getpid())
+
+@kaa.processed()
+def sleep(seconds):
+    time.sleep(seconds)
+    return 'slept'
+
+@kaa.processed()
+def blob(size):
+    return 'x' * size
+
+@kaa.processed('resize')
+def pause(seconds):
+    time.sleep(seconds)
+    return os.getpid()
+
+@kaa.coroutine()
+def test():
+    t0 = time.time()
+    results = yield kaa.InProgressAll(checksum('test %d' % i, 200000) for i in range(8))
+    print 'process pool: %.2fs, pids %s' % (time.time() - t0, sorted(set(ip.result[0] for ip in results)))
+
+    t0 = time.time()
+    for i in range(8):
+        checksum.origfunc('test %d' % i, 200000)
+    print 'main process: %.2fs' % (time.time() - t0)
+
+    try:
+        yield fail()
+    except ValueError, e:
+        print 'exception:', e
+
+    # The worker executing the job is stopped.
+    ip = sleep(10)
+    kaa.OneShotTimer(ip.abort).start(0.5)
+    try:
+        yield ip
+    except kaa.InProgressAborted:
+        print 'aborted'
+    print (yield sleep(0.1))
+
+    # A busy main loop would delay this timer.
+    t0 = time.time()
+    yield kaa.InProgressAll(checksum('x', 100000), kaa.delay(0.1))
+    print 'timer while busy: %.2fs' % (time.time() - t0)
+
+    # Reading a large result should take time linear in its size.
+    for mb in (8, 32, 64):
+        t0 = time.time()
+        data = yield blob(mb * 1024 * 1024)
+        print '%d MB result: %.2fs' % (len(data) / 1024 / 1024, time.time() - t0)
+
+    # Busy workers are stopped once their job is complete if the pool was
+    # shrunk, and a dequeued job doesn't start a worker.
+    pool = kaa.register_process_pool('resize', kaa.ProcessPool(3))
+    jobs = [pause(0.5) for i in range(3)]
+    pool.size = 1
+    yield kaa.InProgressAll(jobs)
+    print 'shrunk to 1: %d workers' % len(pool._members)
+    job = pause(0.5)
+    pool.dequeue(pause(0))
+    pool.size = 2
+    yield job
+    print 'dequeued job: %d workers' % len(pool._members)
+
+if __name__ == '__main__':
+    test().connect_both(lambda *args: kaa.main.stop())
+    kaa.main.run()
@@ -0,0 +1,66 @@
+import sys
+import time
+import socket
+import threading
+
+import kaa
+
+# Measures the line throughput of IOChannel.readline() and the readline
+# signal on a line-oriented stream written to a socket by a thread.  The
+# amount of data in megabytes can be given on the command line.
+
+MB = int(sys.argv[1]) if len(sys.argv) > 1 else 1024
+
+def writer(sock, line, total):
+    chunk = line * max(1, 65536 / len(line))
+    sent = 0
+    while sent < total:
+        sock.sendall(chunk)
+        sent += len(chunk)
+    sock.close()
+
+def start(line):
+    a, b = socket.socketpair()
+    thread = threading.Thread(target=writer, args=(a, line, MB * 1024 * 1024))
+    thread.daemon = True
+    thread.start()
+    return kaa.Socket().wrap(b)
+
+def report(name, lines, nbytes, t0):
+    t = time.time() - t0
+    print '%-40s %8d lines/s %8.1f MB/s' % (name, lines / t, nbytes / t / 1024 / 1024)
+
+@kaa.coroutine()
+def readline_method(line):
+    sock = start(line)
+    t0 = time.time()
+    lines = nbytes = 0
+    while True:
+        data = yield sock.readline()
+        if not data:
+            break
+        lines += 1
+        nbytes += len(data)
+    report('readline(), %d byte lines' % len(line), lines, nbytes, t0)
+
+@kaa.coroutine()
+def readline_signal(line):
+    sock = start(line)
+    count = [0, 0]
+    def handle(data):
+        count[0] += 1
+        count[1] += len(data)
+    sock.signals['readline'].connect(handle)
+    t0 = time.time()
+    yield sock.signals.subset('closed').any()
+    report('readline signal, %d byte lines' % len(line), count[0], count[1], t0)
+
+@kaa.coroutine()
+def main():
+    yield readline_signal('x' * 99 + '\n')
+    yield readline_signal('x' * 65535 + '\n')
+    yield readline_method('x' * 99 + '\n')
+    yield readline_method('x' * 65535 + '\n')
+
+main().connect_both(lambda *args: kaa.main.stop())
+kaa.main.run()
@@ -0,0 +1,112 @@
+import os
+import sys
+import time
+
+import kaa
+import kaa.rpc
+
+# Measures kaa.rpc packet throughput between a server and client in the same
+# process: many tiny calls in flight at once, the same calls in a batch and
+# as notifications, a few calls with a huge reply, and rows returned as a
+# list compared to streamed from a generator, for each serializer.  The
+# number of tiny calls (and ten times as many rows) and the size of the huge
+# reply in megabytes can be given on the command line.
+
+CALLS = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+MB = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+class Service(object):
+    @kaa.rpc.expose()
+    def echo(self, value):
+        return value
+
+    @kaa.rpc.expose()
+    def ignore(self, value):
+        pass
+
+    @kaa.rpc.expose()
+    def blob(self, size):
+        return 'x' * size
+
+    @kaa.rpc.expose()
+    def rows(self, count):
+        for i in xrange(count):
+            yield (i, 'row %d' % i)
+
+    @kaa.rpc.expose()
+    def rows_list(self, count):
+        return list(self.rows(count))
+
+@kaa.coroutine()
+def bench(serializer):
+    address = '/tmp/kaa-rpc-bench-%d' % os.getpid()
+    server = kaa.rpc.Server(address, serializers=[serializer])
+    server.register(Service())
+    client = kaa.rpc.connect(address, serializers=[serializer])
+    yield kaa.inprogress(client)
+    print '%s:' % client.serializer
+
+    t0 = time.time()
+    yield kaa.InProgressAll(*[client.rpc('echo', i) for i in range(CALLS)])
+    t = time.time() - t0
+    print '  %d tiny calls: %.2fs, %d calls/s' % (CALLS, t, CALLS / t)
+
+    t0 = time.time()
+    with client.batch() as batch:
+        calls = [batch.rpc('echo', i) for i in range(CALLS)]
+    yield kaa.InProgressAll(*calls)
+    t = time.time() - t0
+    print '  %d batched calls: %.2fs, %d calls/s' % (CALLS, t, CALLS / t)
+
+    t0 = time.time()
+    for i in range(CALLS):
+        client.notify('ignore', i)
+    # Calls are handled in order, so all notifications have been handled
+    # when this returns.
+    yield client.rpc('echo', None)
+    t = time.time() - t0
+    print '  %d notifications: %.2fs, %d calls/s' % (CALLS, t, CALLS / t)
+
+    for i in range(3):
+        t0 = time.time()
+        data = yield client.rpc('blob', MB * 1024 * 1024)
+        t = time.time() - t0
+        print '  %d MB reply: %.2fs, %.1f MB/s' % (len(data) / 1024 / 1024, t, MB / t)
+
+    t0 = time.time()
+    rows = yield client.rpc('rows_list', CALLS * 10)
+    t = time.time() - t0
+    print '  %d rows as list: %.2fs, %d rows/s' % (len(rows), t, len(rows) / t)
+
+    t0 = time.time()
+    rows = yield client.rpc('rows', CALLS * 10)
+    first = time.time() - t0
+    count = 0
+    for row in rows:
+        yield row
+        count += 1
+    t = time.time() - t0
+    print '  %d rows streamed: %.2fs, %d rows/s, first after %.3fs' % (count, t, count / t, first)
+
+    t0 = time.time()
+    rows = yield client.rpc('rows', CALLS * 10)
+    count = 0
+    while True:
+        chunk = yield rows.read()
+        if not chunk:
+            break
+        count += len(chunk)
+    t = time.time() - t0
+    print '  %d rows streamed with read(): %.2fs, %d rows/s' % (count, t, count / t)
+
+    client.close()
+    server.close()
+    os.unlink(address)
+
+@kaa.coroutine()
+def main():
+    for serializer in ('pickle2', 'pickle', 'marshal', 'json'):
+        yield bench(serializer)
+
+main().connect_both(lambda *args: kaa.main.stop())
+kaa.main.run()
@@ -0,0 +1,47 @@
+import time
+
+import kaa
+
+# Measures Signal.emit() throughput for common connection types.
+
+class Receiver(object):
+    def method(self, *args):
+        pass
+
+def func(*args, **kwargs):
+    pass
+
+def bench(name, signal, n=200000):
+    emit = signal.emit
+    t0 = time.time()
+    for i in xrange(n):
+        emit(i)
+    t1 = time.time()
+    print '%-28s %10d emits/s' % (name, n / (t1 - t0))
+
+receiver = Receiver()
+
+s = kaa.Signal()
+s.connect(func)
+bench('1 callback', s)
+
+s = kaa.Signal()
+s.connect(func, 'data', key=1)
+bench('1 callback with args', s)
+
+s = kaa.Signal()
+for i in range(5):
+    s.connect(func)
+bench('5 callbacks', s)
+
+s = kaa.Signal()
+s.connect_weak(receiver.method)
+bench('1 weak method', s)
+
+s = kaa.Signal()
+bench('no callbacks', s)
+
+t0 = time.time()
+for i in xrange(100000):
+    kaa.InProgress().finish(i)
+print '%-28s %10d /s' % ('InProgress().finish()', 100000 / (time.time() - t0))
@@ -11,3 +11,16 @@ signals.emit('foo', 2)
 
 sig2 = kaa.Signals(signals, 'new')
 print sig2.keys()
+
+
+# Coalesced emission: 20 updates over 0.2s
+def update(n=[0]):
+    n[0] += 1
+    signals['foo'].emit_throttled(0.05, 'throttled %d' % n[0])
+    signals['bar'].emit_debounced(0.05, 'debounced %d' % n[0])
+    return n[0] < 20
+
+signals['bar'].connect(myfunc)
+kaa.Timer(update).start(0.01)
+kaa.OneShotTimer(kaa.main.stop).start(0.5)
+kaa.main.run()
@@ -0,0 +1,51 @@
+import sys
+import time
+import threading
+
+import kaa
+from kaa.core import CoreThreading
+
+# Measures the throughput of MainThreadCallable: worker threads post calls
+# into the main loop, either one at a time or using batch().
+#
+# usage: threadqueue_bench.py [threads] [calls per thread]
+
+nthreads = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+calls = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+batchsize = 100
+
+received = [0]
+
+def callback(value):
+    received[0] += 1
+
+def producer(use_batch):
+    mtc = kaa.MainThreadCallable(callback)
+    if use_batch:
+        for i in xrange(0, calls, batchsize):
+            mtc.batch([(n,) for n in xrange(i, min(i + batchsize, calls))])
+    else:
+        for i in xrange(calls):
+            mtc(i)
+
+def run(use_batch):
+    received[0] = 0
+    threads = [threading.Thread(target=producer, args=(use_batch,)) for i in range(nthreads)]
+    steps = 0
+    t0 = time.time()
+    for t in threads:
+        t.start()
+    while received[0] < nthreads * calls:
+        kaa.main.step()
+        steps += 1
+    t1 = time.time()
+    for t in threads:
+        t.join()
+    print '%-8s %8d calls/s, %6d main loop steps' % \
+          (use_batch and 'batch' or 'single', nthreads * calls / (t1 - t0), steps)
+
+kaa.main.init()
+print '%d threads, %d calls per thread, thread notifier fd %s' % \
+      (nthreads, calls, CoreThreading._pipe)
+run(False)
+run(True)
@@ -0,0 +1,43 @@
+import os
+import sys
+import threading
+
+import kaa
+from kaa.core import CoreThreading
+
+# Worker threads each call into the main loop and wait for the result before
+# making the next call, so every call depends on the main loop being woken
+# up.  A lost wakeup makes this hang.
+#
+# usage: threadqueue_stress.py [threads] [calls per thread]
+
+nthreads = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+calls = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+
+done = [0]
+lock = threading.Lock()
+
+def callback(event):
+    event.set()
+
+def producer():
+    mtc = kaa.MainThreadCallable(callback)
+    event = threading.Event()
+    for i in xrange(calls):
+        event.clear()
+        mtc(event)
+        if not event.wait(10):
+            print 'FAILED: no wakeup after %d calls, wakeup pending %s, %d queued' % \
+                  (i, CoreThreading._wakeup_pending, len(CoreThreading._queue))
+            os._exit(1)
+    with lock:
+        done[0] += 1
+        if done[0] == nthreads:
+            kaa.MainThreadCallable(kaa.main.stop)()
+
+threads = [threading.Thread(target=producer) for i in range(nthreads)]
+for t in threads:
+    t.daemon = True
+    t.start()
+kaa.main.run()
+print '%d threads made %d calls each' % (nthreads, calls)
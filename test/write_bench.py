@@ -0,0 +1,44 @@
+import sys
+import time
+import socket
+import threading
+
+import kaa
+
+# Measures how quickly many small IOChannel.write() calls are flushed to a
+# socket read by a thread.  The number of writes and their size can be given
+# on the command line.
+
+COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+SIZE = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+def reader(sock, received):
+    while True:
+        data = sock.recv(1024 * 1024)
+        if not data:
+            break
+        received[0] += len(data)
+
+@kaa.coroutine()
+def main():
+    a, b = socket.socketpair()
+    received = [0]
+    thread = threading.Thread(target=reader, args=(b, received))
+    thread.start()
+    sock = kaa.Socket().wrap(a)
+    sock.queue_size = COUNT * SIZE
+
+    t0 = time.time()
+    data = 'x' * SIZE
+    writes = [sock.write(data) for i in range(COUNT)]
+    t1 = time.time()
+    yield kaa.InProgressAll(*writes)
+    t2 = time.time()
+    sock.close()
+    thread.join()
+    assert received[0] == COUNT * SIZE
+    print '%d writes of %d bytes: queued in %.2fs, flushed in %.2fs (%d writes/s)' % \
+          (COUNT, SIZE, t1 - t0, t2 - t1, COUNT / (t2 - t0))
+
+main().connect_both(lambda *args: kaa.main.stop())
+kaa.main.run()